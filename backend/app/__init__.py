@@ -9,6 +9,8 @@ config = ConfigParser()
 config_file = '/Users/ednunes/dev/narratus/backend/config.ini'
 config.read(config_file)
 
+from backend.app.json_encoding import FastJSONEncoder
+
 # instantiate flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = config.get('flask', 'secret_key')
@@ -17,6 +19,8 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = config.get('flask', 'jwt_secret_key')
 app.config['JWT_BLACKLIST_ENABLED'] = True
 app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
+app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+app.json_encoder = FastJSONEncoder
 jwt = JWTManager(app)
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
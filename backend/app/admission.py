@@ -0,0 +1,239 @@
+import os
+import time
+import fcntl
+import threading
+from collections import deque
+from contextlib import contextmanager
+from backend.app import config
+
+# Each warehouse connection admits a limited number of concurrent queries; the rest wait in a bounded queue. The
+# limit adapts to the warehouse (AIMD): it grows by about one per limit's worth of fast queries and halves when
+# queries come back slower than the latency target, at most once per target interval
+CONCURRENCY_LIMIT = config.getint('flask', 'connection_concurrency_limit', fallback=4)
+MIN_CONCURRENCY_LIMIT = config.getint('flask', 'connection_min_concurrency_limit', fallback=1)
+MAX_CONCURRENCY_LIMIT = config.getint('flask', 'connection_max_concurrency_limit', fallback=16)
+ADMISSION_QUEUE_DEPTH = config.getint('flask', 'admission_queue_depth', fallback=16)
+ADMISSION_TIMEOUT_SECONDS = config.getfloat('flask', 'admission_timeout_seconds', fallback=30)
+LATENCY_TARGET_SECONDS = config.getfloat('flask', 'admission_latency_target_seconds', fallback=5)
+DECREASE_FACTOR = 0.5
+
+# Queries run as one of these workload classes, highest priority first. Within a process, queued interactive queries
+# are always admitted ahead of queued batch ones, and batch queries never take the last INTERACTIVE_RESERVED_SLOTS
+# slots. Batch work (snapshot refreshes, publications) mostly runs in command line processes, which never share a
+# limiter with the web workers, so batch queries on a connection also hold one of BATCH_SLOTS_PER_CONNECTION slot
+# files under ADMISSION_STATE_DIR. That caps what batch work takes from the warehouse however many processes run it
+WORKLOAD_CLASSES = ['interactive', 'batch']
+INTERACTIVE_RESERVED_SLOTS = config.getint('flask', 'interactive_reserved_slots', fallback=1)
+ADMISSION_STATE_DIR = config.get('flask', 'admission_state_dir', fallback='/tmp/narratus/admission')
+BATCH_SLOTS_PER_CONNECTION = config.getint('flask', 'batch_slots_per_connection'
+                                           , fallback=max(CONCURRENCY_LIMIT - INTERACTIVE_RESERVED_SLOTS, 1))
+BATCH_SLOT_TIMEOUT_SECONDS = config.getfloat('flask', 'batch_slot_timeout_seconds', fallback=300)
+BATCH_SLOT_POLL_SECONDS = 0.05
+METRICS_SAMPLE_SIZE = 1000
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_workload = threading.local()
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+# queries on this thread run as the given workload class until the block exits
+@contextmanager
+def workload_class(workload):
+    if workload not in WORKLOAD_CLASSES:
+        raise AssertionError('Workload class not recognized')
+    previous = getattr(_workload, 'name', None)
+    _workload.name = workload
+    try:
+        yield
+    finally:
+        _workload.name = previous
+
+
+def get_workload_class():
+    return getattr(_workload, 'name', None) or 'interactive'
+
+
+def _get_percentile(samples, percentile):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * percentile), len(ordered) - 1)]
+
+
+# recent wait and latency samples for one workload class on one connection
+class WorkloadMetrics:
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = deque(maxlen=METRICS_SAMPLE_SIZE)
+        self.latency_seconds = deque(maxlen=METRICS_SAMPLE_SIZE)
+
+    def get_summary(self):
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'wait_seconds_p50': _get_percentile(self.wait_seconds, 0.5),
+            'wait_seconds_p95': _get_percentile(self.wait_seconds, 0.95),
+            'latency_seconds_p50': _get_percentile(self.latency_seconds, 0.5),
+            'latency_seconds_p95': _get_percentile(self.latency_seconds, 0.95),
+        }
+
+
+class AdaptiveLimiter:
+
+    def __init__(self, limit=None, min_limit=None, max_limit=None, queue_depth=None, latency_target=None
+                 , reserved_slots=None):
+        self.min_limit = MIN_CONCURRENCY_LIMIT if min_limit is None else min_limit
+        self.max_limit = MAX_CONCURRENCY_LIMIT if max_limit is None else max_limit
+        self.limit = float(CONCURRENCY_LIMIT if limit is None else limit)
+        self.queue_depth = ADMISSION_QUEUE_DEPTH if queue_depth is None else queue_depth
+        self.latency_target = LATENCY_TARGET_SECONDS if latency_target is None else latency_target
+        self.reserved_slots = INTERACTIVE_RESERVED_SLOTS if reserved_slots is None else reserved_slots
+        self.in_flight = 0
+        self.waiters = {workload: deque() for workload in WORKLOAD_CLASSES}
+        self.metrics = {workload: WorkloadMetrics() for workload in WORKLOAD_CLASSES}
+        self.last_decrease = 0
+        self.condition = threading.Condition()
+
+    # batch work always gets at least one slot, so a small limit can't starve it outright
+    def has_capacity(self, workload):
+        if workload == 'interactive':
+            return self.in_flight < int(self.limit)
+        return self.in_flight < max(int(self.limit) - self.reserved_slots, 1)
+
+    def _is_next(self, workload, waiter=None):
+        for higher_workload in WORKLOAD_CLASSES[:WORKLOAD_CLASSES.index(workload)]:
+            if self.waiters[higher_workload]:
+                return False
+        queue = self.waiters[workload]
+        return (queue[0] is waiter if waiter else not queue) and self.has_capacity(workload)
+
+    # waiters are admitted by class and then arrival order; a full queue is rejected straight away rather than left
+    # to time out
+    def acquire(self, workload='interactive', timeout=None):
+        timeout = ADMISSION_TIMEOUT_SECONDS if timeout is None else timeout
+        metrics = self.metrics[workload]
+        with self.condition:
+            if self._is_next(workload):
+                self.in_flight += 1
+                metrics.admitted += 1
+                metrics.wait_seconds.append(0.0)
+                return
+            if len(self.waiters[workload]) >= self.queue_depth:
+                metrics.rejected += 1
+                raise AdmissionRejected('Too many queries waiting on this connection')
+
+            waiter = object()
+            self.waiters[workload].append(waiter)
+            started = time.monotonic()
+            try:
+                while not self._is_next(workload, waiter):
+                    remaining = started + timeout - time.monotonic()
+                    if remaining <= 0:
+                        metrics.rejected += 1
+                        raise AdmissionRejected('Timed out waiting for this connection')
+                    self.condition.wait(remaining)
+                self.in_flight += 1
+                metrics.admitted += 1
+                metrics.wait_seconds.append(time.monotonic() - started)
+            finally:
+                self.waiters[workload].remove(waiter)
+                self.condition.notify_all()
+
+    # latency is None when the query failed, which leaves the limit alone
+    def release(self, latency=None, workload='interactive'):
+        with self.condition:
+            self.in_flight -= 1
+            if latency is not None:
+                self.metrics[workload].latency_seconds.append(latency)
+                self.adjust_limit(latency)
+            self.condition.notify_all()
+
+    def adjust_limit(self, latency):
+        now = time.monotonic()
+        if latency > self.latency_target:
+            if now - self.last_decrease >= self.latency_target:
+                self.limit = max(float(self.min_limit), self.limit * DECREASE_FACTOR)
+                self.last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def get_status(self):
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'waiting': {workload: len(queue) for workload, queue in self.waiters.items()},
+                'workloads': {workload: metrics.get_summary() for workload, metrics in self.metrics.items()},
+            }
+
+
+# one limiter per connection, shared by every thread in the process
+def get_limiter(conn):
+    with _limiters_lock:
+        if conn.id not in _limiters:
+            _limiters[conn.id] = AdaptiveLimiter()
+        return _limiters[conn.id]
+
+
+def get_admission_status():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {connection_id: limiter.get_status() for connection_id, limiter in limiters.items()}
+
+
+def get_batch_slot_path(connection_id, slot):
+    return os.path.join(ADMISSION_STATE_DIR, 'connection_{}_batch_{}'.format(connection_id, slot))
+
+
+# takes the first free batch slot on the connection, waiting for one up to timeout. The slot is an flock on its file,
+# so a process that dies gives its slot up. Returns the open slot file, which is passed to release_batch_slot
+def acquire_batch_slot(connection_id, slots=None, timeout=None):
+    slots = BATCH_SLOTS_PER_CONNECTION if slots is None else slots
+    timeout = BATCH_SLOT_TIMEOUT_SECONDS if timeout is None else timeout
+    os.makedirs(ADMISSION_STATE_DIR, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        for slot in range(slots):
+            slot_file = open(get_batch_slot_path(connection_id, slot), 'a')
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot_file
+            except BlockingIOError:
+                slot_file.close()
+        if time.monotonic() >= deadline:
+            raise AdmissionRejected('Timed out waiting for a batch slot on this connection')
+        time.sleep(BATCH_SLOT_POLL_SECONDS)
+
+
+def release_batch_slot(slot_file):
+    if slot_file is None:
+        return
+    try:
+        fcntl.flock(slot_file, fcntl.LOCK_UN)
+    finally:
+        slot_file.close()
+
+
+# admits a query on the connection as the workload class: a batch query first takes a batch slot shared by every
+# process, then waits in this process's limiter. Returns the batch slot (None for interactive queries) for release
+def admit(conn, workload='interactive'):
+    slot_file = acquire_batch_slot(conn.id) if workload == 'batch' else None
+    try:
+        get_limiter(conn).acquire(workload)
+    except AdmissionRejected:
+        release_batch_slot(slot_file)
+        raise
+    return slot_file
+
+
+def release(conn, slot_file, latency=None, workload='interactive'):
+    try:
+        get_limiter(conn).release(latency, workload)
+    finally:
+        release_batch_slot(slot_file)
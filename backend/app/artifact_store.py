@@ -0,0 +1,126 @@
+import os
+import uuid
+import time
+import json
+import fcntl
+import hashlib
+from backend.app import config, report_renderer
+
+ARTIFACT_DIR = config.get('flask', 'artifact_dir', fallback='/tmp/narratus/artifacts')
+ARTIFACT_MAX_BYTES = config.getint('flask', 'artifact_max_bytes', fallback=1024 * 1024 * 1024)
+ARTIFACT_MAX_AGE_DAYS = config.getint('flask', 'artifact_max_age_days', fallback=7)
+ARTIFACT_FORMATS = ['html', 'pdf']
+FRAGMENT_MAX_BYTES = config.getint('flask', 'fragment_max_bytes', fallback=256 * 1024 * 1024)
+
+
+def get_parameter_hash(report, parameters=None):
+    return hashlib.sha256(json.dumps([report.parameters, parameters], default=str, sort_keys=True)
+                          .encode('utf-8')).hexdigest()
+
+
+# the data version of a report is the hash of its charts' data hashes, in report order
+def get_data_version(chart_data):
+    return hashlib.sha256('\n'.join(data_hash for _, _, data_hash in chart_data).encode('utf-8')).hexdigest()
+
+
+def get_artifact_key(report, output_format, parameters, chart_data):
+    parts = [str(report.id), output_format, get_parameter_hash(report, parameters), get_data_version(chart_data)]
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+# artifacts fan out over 256 subdirectories so no one directory gets huge
+def get_artifact_path(key, output_format):
+    return os.path.join(ARTIFACT_DIR, key[:2], '{}.{}'.format(key, output_format))
+
+
+def _write_artifact(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temp_path, 'wb') as artifact_file:
+        artifact_file.write(content)
+    os.replace(temp_path, path)
+
+
+# returns path to the rendered artifact, rendering it only if no identical artifact exists. The render
+# happens under an exclusive lock on the key, so concurrent publications of the same report (in this
+# process or another) wait for the first render and then reuse its file
+def get_report_artifact(report, output_format='html', parameters=None, chart_data=None):
+    if output_format not in ARTIFACT_FORMATS:
+        raise AssertionError('Report format not recognized')
+
+    if chart_data is None:
+        chart_data = report_renderer.get_report_chart_data(report, parameters)
+    key = get_artifact_key(report, output_format, parameters, chart_data)
+    path = get_artifact_path(key, output_format)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open('{}.lock'.format(path), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(path):
+                    _write_artifact(path, report_renderer.render_report(report, output_format, chart_data))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # a hit counts as a use, garbage collection evicts least recently used artifacts first
+    os.utime(path)
+    return path
+
+
+def read_artifact(path):
+    with open(path, 'rb') as artifact_file:
+        return artifact_file.read()
+
+
+# deletes artifacts unused for max_age_days, then the least recently used until under max_bytes;
+# returns number of artifacts deleted
+def collect_garbage(max_bytes=None, max_age_days=None, now=None):
+    max_bytes = ARTIFACT_MAX_BYTES if max_bytes is None else max_bytes
+    max_age_days = ARTIFACT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    return _evict(_list_files(ARTIFACT_DIR, ARTIFACT_FORMATS), max_bytes, max_age_days, now, lock_files=True)
+
+
+# same policy for the rendered chart fragments cached by report_renderer, which a cache hit also marks as used
+def collect_fragment_garbage(max_bytes=None, max_age_days=None, now=None):
+    max_bytes = FRAGMENT_MAX_BYTES if max_bytes is None else max_bytes
+    max_age_days = ARTIFACT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    return _evict(_list_files(report_renderer.FRAGMENT_CACHE_DIR, ['html']), max_bytes, max_age_days, now)
+
+
+# returns list of (last used, size, path) for the files under directory with one of the extensions
+def _list_files(root, extensions):
+    files = []
+    for directory, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if file_name.rpartition('.')[2] not in extensions:
+                continue
+            path = os.path.join(directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _evict(files, max_bytes, max_age_days, now=None, lock_files=False):
+    cutoff = (now or time.time()) - max_age_days * 24 * 60 * 60
+    deleted = 0
+    total_bytes = sum(size for _, size, _ in files)
+    for used_on, size, path in sorted(files):
+        if used_on >= cutoff and total_bytes <= max_bytes:
+            break
+        _remove(path)
+        if lock_files:
+            _remove('{}.lock'.format(path))
+        total_bytes -= size
+        deleted += 1
+    return deleted
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
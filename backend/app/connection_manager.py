@@ -1,9 +1,87 @@
+import os
+import json
+import math
+import time
+import fcntl
+import asyncio
+import hashlib
+import threading
 import sqlalchemy
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import exc
 from sqlalchemy.engine import reflection
+from backend.app import config, admission, result_cache, sql_fingerprint
 
+# results stop at whichever limit is reached first. A role's limits replace the defaults (so admins can be given
+# more), a connection's limits always apply on top
+RESULT_ROW_LIMIT = config.getint('flask', 'result_row_limit', fallback=100000)
+RESULT_BYTE_LIMIT = config.getint('flask', 'result_byte_limit', fallback=100 * 1024 * 1024)
+ROLE_RESULT_LIMITS = {role: (config.getint('flask', '{}_result_row_limit'.format(role), fallback=None),
+                             config.getint('flask', '{}_result_byte_limit'.format(role), fallback=None))
+                      for role in ('viewer', 'writer', 'admin', 'superuser')}
+FETCH_SIZE = 1000
 
-def create_engine(conn):
+# identical queries running at the same time share one execution: threads in a worker wait on the leading thread,
+# other workers wait on a lock file per query and then read the result the leading worker published to the cache
+SINGLE_FLIGHT_DIR = config.get('flask', 'single_flight_dir', fallback='/tmp/narratus/single_flight')
+SINGLE_FLIGHT_WAIT_SECONDS = config.getfloat('flask', 'single_flight_wait_seconds', fallback=300)
+SINGLE_FLIGHT_POLL_SECONDS = 0.05
+
+# Engines are kept per connection and reused, so a query doesn't pay engine creation, DNS and authentication, and
+# pooled connections are pinged before they're handed out. A connection that fails a health check (or a connect)
+# is reported unavailable straight away until a check HEALTH_CHECK_SECONDS later, see pool_maintainer
+POOL_SIZE = config.getint('flask', 'connection_pool_size', fallback=5)
+POOL_RECYCLE_SECONDS = config.getint('flask', 'connection_pool_recycle_seconds', fallback=1800)
+HEALTH_CHECK_SECONDS = config.getint('flask', 'connection_health_check_seconds', fallback=60)
+PROBE_WORKERS = config.getint('flask', 'connection_probe_workers', fallback=16)
+PROBE_TIMEOUT_SECONDS = config.getfloat('flask', 'connection_probe_timeout_seconds', fallback=10)
+# opening a connection gives up after CONNECT_TIMEOUT_SECONDS, so a probe or query against an unreachable database
+# fails rather than holding its thread. The driver argument that sets it, by db_type (cx_Oracle has none)
+CONNECT_TIMEOUT_SECONDS = config.getint('flask', 'connection_connect_timeout_seconds', fallback=10)
+CONNECT_TIMEOUT_ARGUMENTS = {'postgresql': 'connect_timeout', 'mysql': 'connect_timeout', 'sqlserver': 'timeout'
+                             , 'sqlite': 'timeout'}
+
+_flights = {}
+_flights_lock = threading.Lock()
+_engines = {}
+_engines_lock = threading.Lock()
+_health = {}
+_health_lock = threading.Lock()
+
+
+class ConnectionUnavailable(Exception):
+    pass
+
+
+def _to_boolean(value):
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    if isinstance(value, (bool, int)):
+        return bool(value)
+    raise ValueError(value)
+
+
+def _to_date(value):
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def _to_datetime(value):
+    return datetime.strptime(value.replace('T', ' ')[:19], '%Y-%m-%d %H:%M:%S')
+
+
+# declared SqlQuery parameter type -> (sqlalchemy type bound to the statement, converter for json values)
+PARAMETER_TYPES = {
+    'string': (sqlalchemy.String, str),
+    'integer': (sqlalchemy.Integer, int),
+    'float': (sqlalchemy.Float, float),
+    'boolean': (sqlalchemy.Boolean, _to_boolean),
+    'date': (sqlalchemy.Date, _to_date),
+    'datetime': (sqlalchemy.DateTime, _to_datetime),
+}
+
+
+def create_engine(conn, **engine_options):
     if conn.db_type.lower() == 'postgresql':
         db_type = 'postgresql'
     elif conn.db_type.lower() == 'mysql':
@@ -22,29 +100,186 @@ def create_engine(conn):
             conn_string = f'sqlite://{conn.host}'
         else:
             conn_string = f'{db_type}://{conn.username}:{conn.password}@{conn.host}:{conn.port}/{conn.database_name}'
-        engine = sqlalchemy.create_engine(conn_string)
+        engine = sqlalchemy.create_engine(conn_string, **engine_options)
         return engine
     except exc.ArgumentError as e:
         raise e
 
 
+def get_engine_options(conn):
+    db_type = conn.db_type.lower()
+    connect_args = {}
+    if db_type in CONNECT_TIMEOUT_ARGUMENTS:
+        connect_args[CONNECT_TIMEOUT_ARGUMENTS[db_type]] = CONNECT_TIMEOUT_SECONDS
+    if db_type == 'sqlite':
+        return {'pool_pre_ping': True, 'connect_args': connect_args}
+    return {'pool_pre_ping': True, 'pool_size': POOL_SIZE, 'pool_recycle': POOL_RECYCLE_SECONDS
+            , 'connect_args': connect_args}
+
+
+def _get_connection_settings(conn):
+    return conn.db_type, conn.host, conn.port, conn.username, conn.password, conn.database_name
+
+
+# one pooled engine per connection per process; editing the connection's settings replaces it. Health checks pass
+# touch=False, so an engine only kept warm by them still counts as unused
+def get_engine(conn, touch=True):
+    settings = _get_connection_settings(conn)
+    with _engines_lock:
+        cached = _engines.get(conn.id)
+        if cached and cached['settings'] == settings:
+            if touch:
+                cached['used_on'] = time.time()
+            return cached['engine']
+        if cached:
+            cached['engine'].dispose()
+        engine = create_engine(conn, **get_engine_options(conn))
+        now = time.time()
+        _engines[conn.id] = {'settings': settings, 'engine': engine, 'created_on': now
+                             , 'used_on': now if touch else None}
+        return engine
+
+
+# returns {connection id: time last used} for connections with an engine in this process, None for an engine that
+# hasn't run a query yet
+def get_engine_usage():
+    with _engines_lock:
+        return {connection_id: cached['used_on'] for connection_id, cached in _engines.items()}
+
+
+# connections whose engine hasn't been used (or, if never used, created) since the given time
+def get_idle_engine_ids(since):
+    with _engines_lock:
+        return [connection_id for connection_id, cached in _engines.items()
+                if (cached['used_on'] or cached['created_on']) < since]
+
+
+def dispose_engine(connection_id):
+    with _engines_lock:
+        cached = _engines.pop(connection_id, None)
+    if cached:
+        cached['engine'].dispose()
+
+
 def create_connection(conn):
-    engine = create_engine(conn)
+    engine = get_engine(conn)
     connection = engine.connect()
     return connection
 
 
-def test_connection(conn):
+def get_health_record(error=None, latency=None):
+    return {
+        'healthy': error is None,
+        'checked_on': time.time(),
+        'latency_seconds': None if latency is None else round(latency, 4),
+        'error': None if error is None else type(error).__name__,
+    }
+
+
+def record_health(connection_id, error=None, latency=None):
+    health = get_health_record(error, latency)
+    with _health_lock:
+        _health[connection_id] = health
+    return health
+
+
+# the connection's last recorded health, or None when it hasn't been checked within max_age seconds
+def get_health(connection_id, max_age=None):
+    max_age = HEALTH_CHECK_SECONDS * 2 if max_age is None else max_age
+    with _health_lock:
+        health = _health.get(connection_id)
+    if health is None or health['checked_on'] + max_age < time.time():
+        return None
+    return dict(health)
+
+
+def get_probe_sql(db_type):
+    return 'select 1 from dual' if db_type == 'oracle' else 'select 1'
+
+
+# runs a trivial query through the connection's pool and records how it went
+def check_health(conn):
+    started = time.monotonic()
     try:
-        connection = create_connection(conn)
-        connection.close()
-        return True
-    except:
-        return False
+        with get_engine(conn, touch=False).connect() as connection:
+            connection.execute(sqlalchemy.sql.text(get_probe_sql(conn.db_type.lower()))).scalar()
+    except Exception as e:
+        return record_health(conn.id, e, time.monotonic() - started)
+    return record_health(conn.id, latency=time.monotonic() - started)
+
+
+# reads the recorded health when it's recent enough, so this is normally instant; refresh checks regardless
+def test_connection(conn, refresh=False):
+    health = None if refresh else get_health(conn.id, max_age=HEALTH_CHECK_SECONDS)
+    return health or check_health(conn)
+
+
+def _mark_started(started):
+    if not started.done():
+        started.set_result(None)
+
+
+def _run_probe(loop, started, conn):
+    try:
+        loop.call_soon_threadsafe(_mark_started, started)
+    except RuntimeError:
+        pass  # test_connections already gave up on this probe and closed the loop
+    return check_health(conn)
+
+
+# the timeout runs from when the probe starts on a thread, not from when it was queued. A probe past its timeout is
+# reported as timed out but not recorded, as the recorded health gates user queries: it finishes on its thread
+# (within the driver's connect timeout) and records its real outcome then. A probe still queued at the deadline is
+# cancelled
+async def _probe_connection(loop, executor, conn, timeout, deadline):
+    started = loop.create_future()
+    future = executor.submit(_run_probe, loop, started, conn)
+    try:
+        await asyncio.wait_for(started, max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        future.cancel()
+        return get_health_record(TimeoutError('Not started in time'))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), timeout)
+    except asyncio.TimeoutError:
+        return get_health_record(TimeoutError('No response in {} seconds'.format(timeout)), timeout)
+
+
+# every probe gets its turn on a thread as long as the ones before it finish within the timeout
+async def _probe_all(loop, executor, conns, workers, timeout):
+    deadline = time.monotonic() + timeout * math.ceil(len(conns) / workers)
+    return await asyncio.gather(*[_probe_connection(loop, executor, conn, timeout, deadline) for conn in conns])
+
+
+# tests many connections at once, at most `workers` at a time; returns {connection id: health}. As with
+# test_connection, recent health is reused unless refresh
+def test_connections(conns, refresh=False, workers=None, timeout=None):
+    workers = PROBE_WORKERS if workers is None else workers
+    timeout = PROBE_TIMEOUT_SECONDS if timeout is None else timeout
+    results = {}
+    to_probe = []
+    for conn in conns:
+        health = None if refresh else get_health(conn.id, max_age=HEALTH_CHECK_SECONDS)
+        if health:
+            results[conn.id] = health
+        else:
+            to_probe.append(conn)
+    if not to_probe:
+        return results
+
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(to_probe)))
+    try:
+        probed = loop.run_until_complete(_probe_all(loop, executor, to_probe, workers, timeout))
+    finally:
+        executor.shutdown(wait=False)
+        loop.close()
+    results.update({conn.id: health for conn, health in zip(to_probe, probed)})
+    return results
 
 
 def get_db_metadata(conn):
-    engine = create_engine(conn)
+    engine = get_engine(conn)
     inspector = reflection.Inspector.from_engine(engine)
     schemas = inspector.get_schema_names()
     metadata = []
@@ -59,23 +294,337 @@ def get_db_metadata(conn):
     return metadata
 
 
-def execute_select_statement(conn, raw_sql):
-    if raw_sql.split()[0].lower() != 'select':
-        raise AssertionError('SQL must begin with "select"')
+# takes a query's parameter declarations and the provided values, returns the values converted to their declared
+# types. Values that were not declared are ignored, declared values fall back to their default
+def get_parameter_values(declarations, values=None):
+    values = values or {}
+    parameter_values = {}
+    for declaration in declarations:
+        name = declaration['name']
+        value = values.get(name, declaration.get('default'))
+        if value is None:
+            raise AssertionError('Parameter {} not provided'.format(name))
+        try:
+            parameter_values[name] = PARAMETER_TYPES[declaration['type']][1](value)
+        except (TypeError, ValueError):
+            raise AssertionError('Parameter {} must be a {}'.format(name, declaration['type']))
+    return parameter_values
 
+
+# binds the declared parameters with their types, so the driver sends them separately from the statement text
+def get_sql_text(raw_sql, declarations=None):
     sql_text = sqlalchemy.sql.text(raw_sql)
+    if declarations:
+        try:
+            sql_text = sql_text.bindparams(*[
+                sqlalchemy.bindparam(declaration['name'], type_=PARAMETER_TYPES[declaration['type']][0]())
+                for declaration in declarations])
+        except exc.ArgumentError as e:
+            raise AssertionError(str(e))
+    return sql_text
+
+
+def _get_lowest_limit(*limits):
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+
+# returns (row limit, byte limit) for results from the connection, either may be None for no limit
+def get_result_limits(conn, role=None):
+    role_row_limit, role_byte_limit = ROLE_RESULT_LIMITS.get(role, (None, None))
+    row_limit = _get_lowest_limit(RESULT_ROW_LIMIT if role_row_limit is None else role_row_limit, conn.row_limit)
+    byte_limit = _get_lowest_limit(RESULT_BYTE_LIMIT if role_byte_limit is None else role_byte_limit, conn.byte_limit)
+    return row_limit, byte_limit
+
+
+# rough size of a row once serialized, cheap enough to compute for every fetched row
+def get_row_bytes(row):
+    return sum(len(str(value)) for value in row.values())
+
+
+# a list of row dictionaries that stops accepting rows once a limit is reached, and records that it did. Rows
+# handed off with take_rows still count towards the limits
+class QueryResult(list):
+
+    def __init__(self, rows=(), row_limit=None, byte_limit=None):
+        super().__init__()
+        self.row_limit = row_limit
+        self.byte_limit = byte_limit
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = False
+        self.cached_on = None
+        self.extend_within_limits(rows)
+
+    # returns False, leaving the row out, once a limit is reached
+    def append_within_limits(self, row):
+        if self.row_limit is not None and self.row_count >= self.row_limit:
+            self.truncated = True
+            return False
+        row_bytes = get_row_bytes(row)
+        if self.byte_limit is not None and self.byte_count + row_bytes > self.byte_limit:
+            self.truncated = True
+            return False
+        self.row_count += 1
+        self.byte_count += row_bytes
+        self.append(row)
+        return True
 
-    connection = create_connection(conn)
-    trans = connection.begin()
+    def extend_within_limits(self, rows):
+        for row in rows:
+            if not self.append_within_limits(row):
+                break
+        return self
 
-    raw_result = connection.execute(sql_text)
-    formatted_result = [dict(row) for row in raw_result]
+    # returns the rows accepted since the last call and empties the list
+    def take_rows(self):
+        rows = list(self)
+        del self[:]
+        return rows
 
-    trans.rollback()
-    connection.close()
+    # cached_on is when a result served from the cache was fetched (UTC), None for a fresh result
+    def get_metadata(self):
+        return {'truncated': self.truncated, 'row_count': self.row_count, 'row_limit': self.row_limit,
+                'byte_limit': self.byte_limit, 'cached_on': self.cached_on}
+
+    @classmethod
+    def from_cache_entry(cls, entry, row_limit=None, byte_limit=None):
+        result = cls(row_limit=row_limit, byte_limit=byte_limit)
+        result.extend(entry['rows'])
+        result.row_count, result.byte_count = entry['row_count'], entry['byte_count']
+        result.truncated = entry['truncated']
+        result.cached_on = datetime.utcfromtimestamp(entry['created_at'])
+        return result
+
+    # a separate list of the same rows, so callers sharing one execution can't disturb each other's results
+    def copy(self):
+        result = QueryResult(row_limit=self.row_limit, byte_limit=self.byte_limit)
+        result.extend(self)
+        result.row_count, result.byte_count, result.truncated = self.row_count, self.byte_count, self.truncated
+        result.cached_on = self.cached_on
+        return result
+
+
+# the row limit is pushed down where the database can apply it without changing what the statement means. Postgres
+# wraps the statement in a LIMIT (its subqueries keep duplicate column names and the inner order). MySQL and SQL
+# Server take a session limit on the rows a select returns, set before the statement and reset after it, as their
+# cursors read every remaining row when closed. SQLite and Oracle fetch rows as they're read, so abandoning the
+# cursor at the limit is enough there
+ROW_LIMIT_SESSION_SQL = {
+    'mysql': ('SET SESSION sql_select_limit = {}', 'SET SESSION sql_select_limit = DEFAULT'),
+    'sqlserver': ('SET ROWCOUNT {}', 'SET ROWCOUNT 0'),
+}
+
+
+# trailing semicolons (and the comments around them) are dropped so the statement can sit in a subquery. The newline
+# keeps a trailing comment from swallowing the closing parenthesis
+def add_row_limit(raw_sql, db_type, row_limit):
+    if db_type != 'postgresql':
+        return raw_sql
+    tokens = sql_fingerprint.tokenize(raw_sql)
+    while tokens and (tokens[-1][0] in sql_fingerprint.IGNORED_KINDS or tokens[-1][1] == ';'):
+        tokens.pop()
+    statement = ''.join(text for _, text in tokens)
+    return 'SELECT * FROM ({}\n) AS narratus_limited LIMIT {}'.format(statement, int(row_limit))
+
+
+# yields the QueryResult after each batch of rows is fetched, stopping at a limit. Callers that don't hold the
+# whole result call take_rows on each batch, so memory is bounded by the batch size
+def fetch_select_statement(conn, raw_sql, parameters=None, declarations=None, role=None):
+    if sql_fingerprint.get_first_keyword(raw_sql) != 'select':
+        raise AssertionError('SQL must begin with "select"')
+
+    # one row past the limit is asked for, so a result that exactly fills the limit isn't reported as truncated
+    row_limit, byte_limit = get_result_limits(conn, role)
+    db_type = conn.db_type.lower()
+    pushed_limit = None if row_limit is None else row_limit + 1
+    if pushed_limit is not None:
+        raw_sql = add_row_limit(raw_sql, db_type, pushed_limit)
+    sql_text = get_sql_text(raw_sql, declarations)
+    session_sql = ROW_LIMIT_SESSION_SQL.get(db_type) if pushed_limit is not None else None
+
+    # waits for a slot on the connection as this thread's workload class (or raises admission.AdmissionRejected).
+    # The time to the first batch is reported back so the connection's concurrency limit can adapt
+    health = get_health(conn.id)
+    if health and not health['healthy']:
+        raise ConnectionUnavailable('Connection failed its last health check')
+
+    workload = admission.get_workload_class()
+    batch_slot = admission.admit(conn, workload)
+    latency = None
+    try:
+        started = time.monotonic()
+        try:
+            connection = create_connection(conn)
+        except exc.DBAPIError as e:
+            record_health(conn.id, e, time.monotonic() - started)
+            raise
+        trans = connection.begin()
 
+        # the cursor is abandoned at a limit, and streamed where the driver supports it (a server-side cursor)
+        try:
+            if session_sql:
+                connection.execute(session_sql[0].format(int(pushed_limit)))
+            raw_result = connection.execution_options(stream_results=True).execute(sql_text, parameters or {})
+            formatted_result = QueryResult(row_limit=row_limit, byte_limit=byte_limit)
+            batch = raw_result.fetchmany(FETCH_SIZE)
+            latency = time.monotonic() - started
+            while batch:
+                formatted_result.extend_within_limits(dict(row) for row in batch)
+                yield formatted_result
+                if formatted_result.truncated:
+                    break
+                batch = raw_result.fetchmany(FETCH_SIZE)
+            raw_result.close()
+        finally:
+            trans.rollback()
+            if session_sql:
+                _reset_session(connection, session_sql[1])
+            connection.close()
+    finally:
+        admission.release(conn, batch_slot, latency, workload)
+
+
+# a pooled connection whose session limit can't be reset is discarded rather than handed to the next query
+def _reset_session(connection, reset_sql):
+    try:
+        connection.execute(reset_sql)
+    except exc.SQLAlchemyError:
+        connection.invalidate()
+
+
+def _execute_select_statement(conn, raw_sql, parameters=None, declarations=None, role=None):
+    row_limit, byte_limit = get_result_limits(conn, role)
+    formatted_result = QueryResult(row_limit=row_limit, byte_limit=byte_limit)
+    for formatted_result in fetch_select_statement(conn, raw_sql, parameters, declarations, role):
+        pass
     return formatted_result
 
 
-def execute_query_object(conn, query):
-    return execute_select_statement(conn=conn, raw_sql=query.raw_sql)
+# identifies a result: the same statement (whatever its comments and layout) and values on the same connection,
+# fetched under the same limits
+def get_result_key(conn, raw_sql, parameters=None, declarations=None, row_limit=None, byte_limit=None):
+    statement_key = sql_fingerprint.get_statement_key(raw_sql)
+    payload = json.dumps([conn.id, statement_key, parameters or {}, declarations or [], row_limit, byte_limit]
+                         , default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# runs execute() unless another worker is already running the same query, in which case that worker's cached
+# result is used. A worker that waits marks the query's .waiting file, and the leader only caches its result when
+# it was asked to (publish) or someone started waiting after it began. A worker that waits past
+# SINGLE_FLIGHT_WAIT_SECONDS, or finds nothing cached (the leader failed, the result was too big to cache, or the
+# worker started waiting just as the leader finished), runs the query itself
+def _run_across_workers(key, execute, row_limit=None, byte_limit=None, publish=False):
+    os.makedirs(SINGLE_FLIGHT_DIR, exist_ok=True)
+    lock_path = os.path.join(SINGLE_FLIGHT_DIR, '{}.lock'.format(key))
+    waiting_path = os.path.join(SINGLE_FLIGHT_DIR, '{}.waiting'.format(key))
+    waiting_since = time.time()
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT_SECONDS
+
+    with open(lock_path, 'a') as lock_file:
+        waited = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return execute()
+                if not waited:
+                    open(waiting_path, 'a').close()
+                    os.utime(waiting_path)
+                    waited = True
+                time.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+        try:
+            if waited:
+                entry = result_cache.read_entry(key, created_since=waiting_since)
+                if entry is not None:
+                    return QueryResult.from_cache_entry(entry, row_limit, byte_limit)
+            os.utime(lock_path)
+            started = time.time()
+            result = execute()
+            if publish or _has_waiter(waiting_path, started):
+                result_cache.publish_entry(key, result, result.row_count, result.byte_count, result.truncated)
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# mtimes may be whole seconds, so a wait in the second the leader started counts
+def _has_waiter(waiting_path, since):
+    try:
+        return os.stat(waiting_path).st_mtime >= int(since)
+    except FileNotFoundError:
+        return False
+
+
+# by default the query always runs, and its result is only handed to workers waiting on the same run. Callers that
+# accept a result up to RESULT_CACHE_TTL_SECONDS old pass use_cache=True: a recent cached result is served (its
+# cached_on says when it was fetched) and a fresh one is cached for later callers
+def execute_select_statement(conn, raw_sql, parameters=None, declarations=None, role=None, use_cache=False):
+    row_limit, byte_limit = get_result_limits(conn, role)
+    key = get_result_key(conn, raw_sql, parameters, declarations, row_limit, byte_limit)
+
+    if use_cache:
+        entry = result_cache.read_entry(key)
+        if entry is not None:
+            return QueryResult.from_cache_entry(entry, row_limit, byte_limit)
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights[key] = _Flight()
+
+    if not is_leader:
+        if flight.done.wait(SINGLE_FLIGHT_WAIT_SECONDS):
+            if flight.error is not None:
+                raise flight.error
+            return flight.result.copy()
+        return _execute_select_statement(conn, raw_sql, parameters, declarations, role)
+
+    try:
+        flight.result = _run_across_workers(
+            key, lambda: _execute_select_statement(conn, raw_sql, parameters, declarations, role)
+            , row_limit, byte_limit, publish=use_cache)
+        return flight.result.copy()
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+# deletes lock files for queries not run in max_age_seconds, returns number deleted
+def collect_single_flight_files(max_age_seconds=3600, now=None):
+    if not os.path.isdir(SINGLE_FLIGHT_DIR):
+        return 0
+    cutoff = (now or time.time()) - max_age_seconds
+    deleted = 0
+    for file_name in os.listdir(SINGLE_FLIGHT_DIR):
+        path = os.path.join(SINGLE_FLIGHT_DIR, file_name)
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.remove(path)
+                deleted += 1
+        except FileNotFoundError:
+            continue
+    return deleted
+
+
+def execute_query_object(conn, query, parameters=None, role=None, use_cache=False):
+    declarations = query.get_parameters()
+    return execute_select_statement(conn=conn, raw_sql=query.raw_sql
+                                    , parameters=get_parameter_values(declarations, parameters)
+                                    , declarations=declarations, role=role, use_cache=use_cache)
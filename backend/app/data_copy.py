@@ -0,0 +1,354 @@
+import io
+import os
+import csv
+import time
+import queue
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import sqlalchemy
+from sqlalchemy import exc
+from backend.app import db, models
+from backend.app import connection_manager as cm
+
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_WORKERS = 4
+CHUNKS_PER_WORKER = 4
+END_OF_DATA = object()
+
+
+# takes 'schema.table' or 'table', returns reflected sqlalchemy Table
+def reflect_table(engine, table_name):
+    schema, _, name = table_name.rpartition('.')
+    return sqlalchemy.Table(name, sqlalchemy.MetaData(), autoload=True, autoload_with=engine, schema=schema or None)
+
+
+def _put(batch_queue, item, stop_event):
+    while not stop_event.is_set():
+        try:
+            batch_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+# producer: streams batches of row tuples from the source onto the bounded queue
+def _read_batches(source_engine, select_statement, batch_size, batch_queue, stop_event):
+    try:
+        with source_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(select_statement)
+            while not stop_event.is_set():
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                if not _put(batch_queue, [tuple(row) for row in rows], stop_event):
+                    return
+        _put(batch_queue, END_OF_DATA, stop_event)
+    except Exception as e:
+        _put(batch_queue, e, stop_event)
+
+
+def _quoted_names(engine, table, column_names):
+    preparer = engine.dialect.identifier_preparer
+    return preparer.format_table(table), ', '.join(preparer.quote(name) for name in column_names)
+
+
+# postgres: COPY FROM STDIN in csv format, with \N marking nulls
+def write_batch_with_copy(engine, table, column_names, batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in batch:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buffer.seek(0)
+
+    table_sql, columns_sql = _quoted_names(engine, table, column_names)
+    copy_sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(table_sql, columns_sql)
+
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.copy_expert(copy_sql, buffer)
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+
+def _mysql_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\')
+    return value
+
+
+# servers that refused LOAD DATA, by engine url; later batches for them go straight to executemany
+_load_data_refused = set()
+
+
+# mysql: LOAD DATA LOCAL INFILE from a temporary csv file; needs local_infile enabled on both ends, see
+# get_target_options for the client
+def write_batch_with_load_data(engine, table, column_names, batch):
+    if str(engine.url) in _load_data_refused:
+        return write_batch_with_executemany(engine, table, column_names, batch)
+    file_descriptor, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(file_descriptor, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file, lineterminator='\n')
+            for row in batch:
+                writer.writerow([_mysql_value(value) for value in row])
+
+        table_sql, columns_sql = _quoted_names(engine, table, column_names)
+        load_sql = ("LOAD DATA LOCAL INFILE '{}' INTO TABLE {} "
+                    "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                    "LINES TERMINATED BY '\\n' ({})").format(path, table_sql, columns_sql)
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.sql.text(load_sql).execution_options(no_parameters=True))
+    except exc.DBAPIError:
+        # server refused LOAD DATA (local_infile disabled), fall back to executemany
+        _load_data_refused.add(str(engine.url))
+        write_batch_with_executemany(engine, table, column_names, batch)
+    finally:
+        os.remove(path)
+
+
+# everything else: one executemany of a multi-row insert per batch
+def write_batch_with_executemany(engine, table, column_names, batch):
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [dict(zip(column_names, row)) for row in batch])
+
+
+BULK_WRITERS = {
+    'postgresql': write_batch_with_copy,
+    'mysql': write_batch_with_load_data,
+}
+
+
+def get_batch_writer(engine):
+    return BULK_WRITERS.get(engine.dialect.name, write_batch_with_executemany)
+
+
+# engine options for a copy's target. The mysql client only sends files for LOAD DATA LOCAL INFILE when
+# local_infile is set, so only engines that copies write through enable it
+def get_target_options(conn, **options):
+    if conn.db_type.lower() == 'mysql':
+        options['connect_args'] = dict(options.get('connect_args', {}), local_infile=1)
+    return options
+
+
+# records that a copy is loading the table, which changes its version for pipeline runs. Copies record it when they
+# start (so a copy that fails part way still counts as a change) and again when they finish
+def record_table_load(conn, table_name):
+    table_name = table_name.lower()
+    table_load = models.TableLoad.query.filter(models.TableLoad.connection_id == conn.id) \
+        .filter(models.TableLoad.table_name == table_name).first()
+    if not table_load:
+        table_load = models.TableLoad(connection_id=conn.id, table_name=table_name)
+        db.session.add(table_load)
+    table_load.loaded_on = datetime.utcnow()
+    db.session.commit()
+
+
+def copy_table(source_conn, target_conn, source_table, target_table=None, truncate_target=False
+               , batch_size=DEFAULT_BATCH_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+    source_engine = cm.create_engine(source_conn)
+    target_engine = cm.create_engine(target_conn, **get_target_options(target_conn))
+    try:
+
+        source = reflect_table(source_engine, source_table)
+        target = reflect_table(target_engine, target_table or source_table)
+        column_names = [column.name for column in source.columns if column.name in target.columns]
+        if not column_names:
+            raise AssertionError('Source and target tables have no columns in common')
+
+        select_statement = sqlalchemy.select([source.columns[name] for name in column_names])
+        record_table_load(target_conn, target_table or source_table)
+        stats = copy_rows(source_engine, target_engine, select_statement, target, column_names
+                          , truncate_target=truncate_target, batch_size=batch_size, queue_size=queue_size)
+        record_table_load(target_conn, target_table or source_table)
+        return stats
+    finally:
+        source_engine.dispose()
+        target_engine.dispose()
+
+
+# reading and writing overlap: a producer thread fills a bounded queue while this thread writes
+def copy_rows(source_engine, target_engine, select_statement, target, column_names, truncate_target=False
+              , batch_size=DEFAULT_BATCH_SIZE, queue_size=DEFAULT_QUEUE_SIZE, write_batch=None):
+    write_batch = write_batch or get_batch_writer(target_engine)
+    batch_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    started = time.time()
+    row_count = 0
+
+    if truncate_target:
+        with target_engine.begin() as connection:
+            connection.execute(target.delete())
+
+    reader = threading.Thread(target=_read_batches, daemon=True
+                              , args=(source_engine, select_statement, batch_size, batch_queue, stop_event))
+    reader.start()
+    try:
+        while True:
+            batch = batch_queue.get()
+            if batch is END_OF_DATA:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            write_batch(target_engine, target, column_names, batch)
+            row_count += len(batch)
+    finally:
+        stop_event.set()
+        reader.join()
+
+    seconds = time.time() - started
+    return {
+        'rows': row_count,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(row_count / seconds, 1) if seconds else None,
+    }
+
+
+def get_partition_column(engine, table):
+    primary_key = list(table.primary_key.columns)
+    if len(primary_key) == 1 and isinstance(primary_key[0].type, sqlalchemy.Integer):
+        return primary_key[0]
+    raise AssertionError('Parallel copy requires a single-column integer primary key')
+
+
+def validate_workers(workers):
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        raise AssertionError('workers must be a positive integer')
+    return workers
+
+
+# splits [min, max] of the partition column into chunk_count half-open ranges
+def get_key_ranges(engine, table, partition_column, chunk_count):
+    with engine.connect() as connection:
+        low, high = connection.execute(sqlalchemy.select([sqlalchemy.func.min(partition_column)
+                                                         , sqlalchemy.func.max(partition_column)])
+                                       .select_from(table)).first()
+    if low is None:
+        return []
+
+    step = max(1, -(-(high - low + 1) // chunk_count))
+    return [(start, min(start + step, high + 1)) for start in range(low, high + 1, step)]
+
+
+def get_job_key(source_conn, target_conn, source_table, target_table):
+    return '{}:{}->{}:{}'.format(source_conn.id, source_table, target_conn.id, target_table)
+
+
+# returns checkpoints for the job, planning new ones unless a previous run left some unfinished
+def get_checkpoints(job_key, engine, table, partition_column, chunk_count):
+    checkpoints = models.CopyCheckpoint.query.filter(models.CopyCheckpoint.job_key == job_key).all()
+    if checkpoints:
+        return checkpoints
+
+    for range_start, range_end in get_key_ranges(engine, table, partition_column, chunk_count):
+        checkpoint = models.CopyCheckpoint(job_key=job_key, range_start=range_start, range_end=range_end)
+        db.session.add(checkpoint)
+        checkpoints.append(checkpoint)
+    db.session.commit()
+    return checkpoints
+
+
+def _copy_chunk(source_engine, target_engine, source, target, column_names, source_key, target_key
+                , range_start, range_end, clear_target, batch_size):
+    if clear_target:
+        # an earlier attempt died part way through this chunk, drop what it wrote
+        with target_engine.begin() as connection:
+            connection.execute(target.delete().where(target_key >= range_start).where(target_key < range_end))
+
+    select_statement = sqlalchemy.select([source.columns[name] for name in column_names]) \
+        .where(source_key >= range_start).where(source_key < range_end)
+    return copy_rows(source_engine, target_engine, select_statement, target, column_names, batch_size=batch_size)
+
+
+def get_pool_options(conn, workers):
+    if conn.db_type.lower() == 'sqlite':
+        return {}
+    return {'pool_size': workers, 'max_overflow': 0}
+
+
+# copies key ranges on a pool of workers, each with its own pooled connection; completed ranges are
+# checkpointed so a failed run resumes where it stopped. Ranges are cleared on the target by the same key column
+# they are read by, so both tables need it. truncate_target only empties the target when a new run starts, never
+# when resuming
+def parallel_copy_table(source_conn, target_conn, source_table, target_table=None, workers=DEFAULT_WORKERS
+                        , chunk_count=None, batch_size=DEFAULT_BATCH_SIZE, truncate_target=False):
+    validate_workers(workers)
+    target_table = target_table or source_table
+    source_engine = cm.create_engine(source_conn, **get_pool_options(source_conn, workers))
+    target_options = get_target_options(target_conn, **get_pool_options(target_conn, workers))
+    target_engine = cm.create_engine(target_conn, **target_options)
+    try:
+
+        source = reflect_table(source_engine, source_table)
+        target = reflect_table(target_engine, target_table)
+        column_names = [column.name for column in source.columns if column.name in target.columns]
+        if not column_names:
+            raise AssertionError('Source and target tables have no columns in common')
+
+        source_key = get_partition_column(source_engine, source)
+        if source_key.name not in target.columns:
+            raise AssertionError('Parallel copy requires the target table to have the source key column {}'
+                                 .format(source_key.name))
+        target_key = target.columns[source_key.name]
+
+        job_key = get_job_key(source_conn, target_conn, source_table, target_table)
+        checkpoints = get_checkpoints(job_key, source_engine, source, source_key
+                                      , chunk_count or workers * CHUNKS_PER_WORKER)
+        pending = [checkpoint for checkpoint in checkpoints if not checkpoint.completed_on]
+        is_new_run = not any(checkpoint.started_on or checkpoint.completed_on for checkpoint in checkpoints)
+        record_table_load(target_conn, target_table)
+        if truncate_target and is_new_run:
+            with target_engine.begin() as connection:
+                connection.execute(target.delete())
+        started = time.time()
+        row_count = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for checkpoint in pending:
+                clear_target = checkpoint.started_on is not None
+                checkpoint.started_on = datetime.utcnow()
+                futures[executor.submit(_copy_chunk, source_engine, target_engine, source, target, column_names
+                                        , source_key, target_key, checkpoint.range_start, checkpoint.range_end
+                                        , clear_target, batch_size)] = checkpoint
+            db.session.commit()
+
+            errors = []
+            for future in as_completed(futures):
+                checkpoint = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                checkpoint.rows = stats['rows']
+                checkpoint.completed_on = datetime.utcnow()
+                db.session.commit()
+                row_count += stats['rows']
+
+        if errors:
+            raise errors[0]
+
+        # every range is done, so the next run of this job starts from a fresh plan
+        models.CopyCheckpoint.query.filter(models.CopyCheckpoint.job_key == job_key).delete()
+        db.session.commit()
+        record_table_load(target_conn, target_table)
+
+        seconds = time.time() - started
+        return {
+            'rows': row_count,
+            'chunks': len(checkpoints),
+            'resumed_chunks': len(checkpoints) - len(pending),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(row_count / seconds, 1) if seconds else None,
+        }
+    finally:
+        source_engine.dispose()
+        target_engine.dispose()
@@ -1,3 +1,4 @@
+import json
 import datetime
 from backend.app import models
 from backend.app import db
@@ -26,6 +27,75 @@ def get_user_from_username(username):
     return models.User.query.filter(models.User.username == username).first()
 
 
+# takes comma separated string from a query parameter, returns list of names or None when not provided
+def get_fields_from_string(fields_string):
+    if fields_string is None:
+        return None
+    return [field.strip() for field in fields_string.split(',') if field.strip()]
+
+
+# takes request args, returns (fields, expand). A missing parameter is None (everything), while an empty
+# `expand=` is an empty list (no nested objects)
+def get_projection(args):
+    fields = get_fields_from_string(args.get('fields', None)) or None
+    expand = get_fields_from_string(args.get('expand', None))
+    return fields, expand
+
+
+def is_expanded(expand, key):
+    return expand is None or key in expand or any(path.startswith(key + '.') for path in expand)
+
+
+# takes 'sql_query.creator' style paths, returns the paths below key
+def get_nested_expand(expand, key):
+    if expand is None:
+        return None
+    return [path[len(key) + 1:] for path in expand if path.startswith(key + '.')]
+
+
+# attribute values may be zero-argument callables for anything that needs a query or decryption, relation values
+# are callables taking the nested expand list; neither is called unless the key is kept, so unrequested relations
+# are never loaded. The id key is always kept.
+def build_dict(id_key, attributes, relations=None, fields=None, expand=None):
+    dict_format = {}
+    for key, value in attributes.items():
+        if fields is None or key in fields or key == id_key:
+            dict_format[key] = value() if callable(value) else value
+    for key, get_relation in (relations or {}).items():
+        if (fields is None or key in fields) and is_expanded(expand, key):
+            dict_format[key] = get_relation(get_nested_expand(expand, key))
+    return dict_format
+
+
+# takes user object, returns compact summaries of every connection, query, chart and report the user can see,
+# one query to resolve the ids and one per type to load them
+def get_home_objects(user, fields=None):
+    authorized_ids = user.get_authorized_ids_by_type()
+    home_models = [('connections', models.Connection), ('queries', models.SqlQuery), ('charts', models.Chart),
+                   ('reports', models.Report)]
+    home_objects = {}
+    for object_type, model in home_models:
+        ids = authorized_ids[object_type]
+        records = model.query.filter(model.id.in_(ids)).order_by(model.label).all() if ids else []
+        home_objects[object_type] = [record.get_summary(fields) for record in records]
+    return home_objects
+
+
+# chart and report parameters are free text; when they are a json object, its "query_parameters" object supplies
+# values for the sql query's declared parameters. Later sources override earlier ones
+def get_query_parameters(*parameter_sources):
+    query_parameters = {}
+    for parameters in parameter_sources:
+        if isinstance(parameters, str):
+            try:
+                parameters = json.loads(parameters)
+            except ValueError:
+                continue
+        if isinstance(parameters, dict):
+            query_parameters.update(parameters.get('query_parameters') or {})
+    return query_parameters
+
+
 def any_args_are_truthy(*args):
     for arg in args:
         if arg:
@@ -185,6 +255,8 @@ def create_connection_from_dict(connection_dict, creator_id):
                                    , username=connection_dict.get('username')
                                    , password=connection_dict.get('password')
                                    , database_name=connection_dict.get('database_name')
+                                   , row_limit=connection_dict.get('row_limit')
+                                   , byte_limit=connection_dict.get('byte_limit')
                                    , creator=creator
                                    )
 
@@ -229,6 +301,12 @@ def edit_connection_from_dict(connection_dict):
     if connection_dict.get('database_name'):
         connection.database_name = connection_dict.get('database_name')
 
+    if connection_dict.get('row_limit'):
+        connection.row_limit = connection_dict.get('row_limit')
+
+    if connection_dict.get('byte_limit'):
+        connection.byte_limit = connection_dict.get('byte_limit')
+
     usergroup_ids = connection_dict.get('usergroup_ids', [])
     if usergroup_ids:
         connection.usergroups = []
@@ -245,6 +323,8 @@ def create_query_from_dict(query_dict, creator_id):
     creator = get_record_from_id(models.User, creator_id)
     query = models.SqlQuery(label=query_dict.get('label')
                             , raw_sql=query_dict.get('raw_sql')
+                            , watermark_column=query_dict.get('watermark_column')
+                            , parameters=query_dict.get('parameters')
                             , creator=creator
                             )
 
@@ -274,6 +354,12 @@ def edit_query_from_dict(query_dict):
     if query_dict.get('raw_sql'):
         query.db_type = query_dict.get('raw_sql')
 
+    if query_dict.get('watermark_column'):
+        query.watermark_column = query_dict.get('watermark_column')
+
+    if query_dict.get('parameters'):
+        query.parameters = query_dict.get('parameters')
+
     usergroup_ids = query_dict.get('usergroup_ids', [])
     if usergroup_ids:
         query.usergroups = []
@@ -291,6 +377,8 @@ def create_chart_from_dict(chart_dict, creator_id):
                          , parameters=chart_dict.get('parameters')
                          , connection_id=chart_dict.get('connection_id')
                          , sql_query_id=chart_dict.get('sql_query_id')
+                         , materialized=chart_dict.get('materialized', False)
+                         , refresh_minutes=chart_dict.get('refresh_minutes', 60)
                          , creator_user_id=creator_id
                          )
 
@@ -330,6 +418,12 @@ def edit_chart_from_dict(chart_dict):
     if chart_dict.get('connection_id'):
         chart.connection_id = chart_dict.get('connection_id')
 
+    if chart_dict.get('materialized') is not None:
+        chart.materialized = chart_dict.get('materialized')
+
+    if chart_dict.get('refresh_minutes'):
+        chart.refresh_minutes = chart_dict.get('refresh_minutes')
+
     usergroup_ids = chart_dict.get('usergroup_ids', [])
     if usergroup_ids:
         chart.usergroups = []
@@ -357,6 +451,10 @@ def create_report_from_dict(report_dict, creator_id):
         usergroup = creator.get_personal_usergroup()
         report.usergroups.append(usergroup)
 
+    for chart_id in report_dict.get('chart_ids', []):
+        chart = get_record_from_id(models.Chart, chart_id)
+        report.charts.append(chart)
+
     db.session.add(report)
     db.session.commit()
     return report
@@ -381,6 +479,13 @@ def edit_report_from_dict(report_dict):
         usergroup = get_record_from_id(models.Usergroup, usergroup_id)
         report.usergroups.append(usergroup)
 
+    chart_ids = report_dict.get('chart_ids', [])
+    if chart_ids:
+        report.charts = []
+    for chart_id in chart_ids:
+        chart = get_record_from_id(models.Chart, chart_id)
+        report.charts.append(chart)
+
     db.session.commit()
     return report
 
@@ -397,6 +502,7 @@ def create_publication_from_dict(publication_dict, creator_id):
                                      , sunday=publication_dict.get('sunday')
                                      , day_of_month=publication_dict.get('day_of_month')
                                      , report_id=publication_dict.get('report_id')
+                                     , always_send=publication_dict.get('always_send', False)
                                      , creator_user_id=creator_id
                                      )
     pub_time_raw = publication_dict.get('pub_time')
@@ -447,6 +553,9 @@ def edit_publication_from_dict(publication_dict):
     if publication_dict.get('report_id'):
         publication.report_id = publication_dict.get('report_id')
 
+    if 'always_send' in publication_dict:
+        publication.always_send = bool(publication_dict.get('always_send'))
+
     contact_ids = publication_dict.get('contact_ids', [])
     if contact_ids:
         publication.recipients = []
@@ -494,3 +603,48 @@ def edit_contact_from_dict(contact_dict):
 
     db.session.commit()
     return contact
+
+
+def create_sync_job_from_dict(sync_job_dict, creator_id):
+    source_connection = get_record_from_id(models.Connection, sync_job_dict.get('source_connection_id'))
+    target_connection = get_record_from_id(models.Connection, sync_job_dict.get('target_connection_id'))
+    if not source_connection or not target_connection:
+        raise AssertionError('Source or target connection not recognized')
+
+    sync_job = models.SyncJob(label=sync_job_dict.get('label')
+                              , source_connection=source_connection
+                              , target_connection=target_connection
+                              , source_table=sync_job_dict.get('source_table')
+                              , target_table=sync_job_dict.get('target_table')
+                              , mode=sync_job_dict.get('mode', 'append')
+                              , watermark_column=sync_job_dict.get('watermark_column')
+                              , key_columns=sync_job_dict.get('key_columns')
+                              , refresh_minutes=sync_job_dict.get('refresh_minutes', 1440)
+                              , creator_user_id=creator_id
+                              )
+
+    db.session.add(sync_job)
+    db.session.commit()
+    return sync_job
+
+
+def create_derived_table_from_dict(derived_table_dict, creator_id):
+    sql_query = get_record_from_id(models.SqlQuery, derived_table_dict.get('sql_query_id'))
+    connection = get_record_from_id(models.Connection, derived_table_dict.get('connection_id'))
+    if not sql_query:
+        raise AssertionError('sql_query_id not recognized')
+    if not connection:
+        raise AssertionError('connection_id not recognized')
+
+    derived_table = models.DerivedTable(label=derived_table_dict.get('label')
+                                        , target_table=derived_table_dict.get('target_table')
+                                        , upstream_tables=derived_table_dict.get('upstream_tables')
+                                        , index_columns=derived_table_dict.get('index_columns')
+                                        , sql_query=sql_query
+                                        , connection=connection
+                                        , creator_user_id=creator_id
+                                        )
+
+    db.session.add(derived_table)
+    db.session.commit()
+    return derived_table
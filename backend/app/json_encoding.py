@@ -0,0 +1,78 @@
+import json
+import base64
+from uuid import UUID
+from decimal import Decimal
+from datetime import date, datetime, time
+from flask.json import JSONEncoder
+from backend.app import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 'orjson' when installed, otherwise 'stdlib'; set json_backend = stdlib in config.ini to opt out
+JSON_BACKEND = config.get('flask', 'json_backend', fallback='orjson' if orjson else 'stdlib')
+
+# flask's encoder is simplejson's when simplejson is installed, which writes bytes out as text without calling
+# default(), so bytes are converted before encoding there
+USES_SIMPLEJSON = not issubclass(JSONEncoder, json.JSONEncoder)
+BYTES_TYPES = (bytes, bytearray, memoryview)
+
+
+# the types database drivers hand back that json can't encode natively. Datetimes are ISO 8601 so both
+# backends produce the same output, Decimals become numbers, bytes become base64
+def encode_value(obj):
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, BYTES_TYPES):
+        return base64.b64encode(bytes(obj)).decode('ascii')
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+# None when the installed orjson lacks an option the output needs, so the standard encoder is used instead
+def get_orjson_options(sort_keys, indent):
+    names = ['OPT_NON_STR_KEYS'] + (['OPT_SORT_KEYS'] if sort_keys else []) + (['OPT_INDENT_2'] if indent else [])
+    options = 0
+    for name in names:
+        if not hasattr(orjson, name):
+            return None
+        options |= getattr(orjson, name)
+    return options
+
+
+def encode_bytes(obj):
+    if isinstance(obj, BYTES_TYPES):
+        return encode_value(obj)
+    if isinstance(obj, dict):
+        return {key: encode_bytes(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [encode_bytes(value) for value in obj]
+    return obj
+
+
+# set as app.json_encoder, so jsonify goes through it. Anything orjson refuses (e.g. integers over 64 bits)
+# falls back to the standard encoder rather than failing the response
+class FastJSONEncoder(JSONEncoder):
+
+    def default(self, obj):
+        try:
+            return encode_value(obj)
+        except TypeError:
+            return JSONEncoder.default(self, obj)
+
+    def encode(self, obj):
+        if JSON_BACKEND == 'orjson' and orjson is not None:
+            options = get_orjson_options(self.sort_keys, self.indent)
+            if options is not None:
+                try:
+                    return orjson.dumps(obj, default=self.default, option=options).decode('utf-8')
+                except TypeError:
+                    pass
+        if USES_SIMPLEJSON:
+            obj = encode_bytes(obj)
+        return super().encode(obj)
@@ -0,0 +1,240 @@
+import time
+import heapq
+import queue
+import smtplib
+import threading
+from contextlib import contextmanager
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.application import MIMEApplication
+from backend.app import config, artifact_store
+
+SMTP_HOST = config.get('flask', 'smtp_host', fallback='localhost')
+SMTP_PORT = config.getint('flask', 'smtp_port', fallback=25)
+SMTP_USER = config.get('flask', 'smtp_user', fallback=None)
+SMTP_PASSWORD = config.get('flask', 'smtp_password', fallback=None)
+SMTP_USE_TLS = config.getboolean('flask', 'smtp_use_tls', fallback=False)
+SMTP_SENDER = config.get('flask', 'smtp_sender', fallback='narratus@localhost')
+SMTP_POOL_SIZE = config.getint('flask', 'smtp_pool_size', fallback=2)
+SMTP_BATCH_SIZE = config.getint('flask', 'smtp_batch_size', fallback=50)
+SMTP_MESSAGES_PER_SECOND = config.getfloat('flask', 'smtp_messages_per_second', fallback=10)
+SMTP_MAX_ATTEMPTS = config.getint('flask', 'smtp_max_attempts', fallback=5)
+SMTP_RETRY_SECONDS = config.getint('flask', 'smtp_retry_seconds', fallback=30)
+SMTP_TIMEOUT = 30
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# token bucket: allows short bursts of up to `burst` messages, then averages `rate` messages a second
+class RateLimiter:
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# persistent, logged-in SMTP sessions shared by every sender in the process; a session that the server
+# dropped is replaced the next time it is checked out
+class SmtpPool:
+
+    def __init__(self, host=None, port=None, user=None, password=None, use_tls=None, size=None):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.user = SMTP_USER if user is None else user
+        self.password = SMTP_PASSWORD if password is None else password
+        self.use_tls = SMTP_USE_TLS if use_tls is None else use_tls
+        self.sessions = queue.LifoQueue()
+        for _ in range(size or SMTP_POOL_SIZE):
+            self.sessions.put(None)
+
+    def open_session(self):
+        session = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if self.use_tls:
+            session.starttls()
+        if self.user:
+            session.login(self.user, self.password)
+        return session
+
+    @staticmethod
+    def _is_alive(session):
+        try:
+            return session.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    @contextmanager
+    def session(self):
+        session = self.sessions.get()
+        try:
+            if session is None or not self._is_alive(session):
+                session = None
+                session = self.open_session()
+            yield session
+        except (smtplib.SMTPServerDisconnected, OSError):
+            session = None
+            raise
+        finally:
+            self.sessions.put(session)
+
+    def close(self):
+        while True:
+            try:
+                session = self.sessions.get_nowait()
+            except queue.Empty:
+                return
+            if session is not None:
+                try:
+                    session.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SmtpPool()
+    return _pool
+
+
+def build_message(subject, html_body, sender=None, to=None, attachment=None, attachment_name=None):
+    message = MIMEMultipart()
+    message['Subject'] = subject
+    message['From'] = sender or SMTP_SENDER
+    message['To'] = to or sender or SMTP_SENDER
+    message.attach(MIMEText(html_body, 'html', 'utf-8'))
+    if attachment is not None:
+        part = MIMEApplication(attachment)
+        part.add_header('Content-Disposition', 'attachment', filename=attachment_name or 'report')
+        message.attach(part)
+    return message
+
+
+# returns list of (message, envelope recipients). In 'bcc' mode recipients go out in groups of batch_size
+# on the envelope only, so nobody sees the distribution list; 'individual' sends each recipient their own copy
+def batch_recipients(message_factory, recipients, mode='bcc', batch_size=None):
+    batch_size = batch_size or SMTP_BATCH_SIZE
+    if mode == 'individual':
+        return [(message_factory(recipient), [recipient]) for recipient in recipients]
+    if mode == 'bcc':
+        return [(message_factory(None), recipients[i:i + batch_size])
+                for i in range(0, len(recipients), batch_size)]
+    raise AssertionError('Recipient batching mode not recognized')
+
+
+def is_permanent_failure(code):
+    return 500 <= code < 600
+
+
+# sends queued messages over the pool, at most `rate` a second. Transient failures (4xx replies, dropped
+# connections) are retried with exponential backoff; recipients the server refuses outright are not
+class MailQueue:
+
+    def __init__(self, pool=None, rate_limiter=None, max_attempts=None, retry_seconds=None):
+        self.pool = pool or get_pool()
+        self.rate_limiter = rate_limiter or RateLimiter(SMTP_MESSAGES_PER_SECOND)
+        self.max_attempts = max_attempts or SMTP_MAX_ATTEMPTS
+        self.retry_seconds = SMTP_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self.pending = []
+        self.sequence = 0
+        self.sent = []
+        self.failed = []
+
+    def put(self, message, recipients, attempts=0, due=None):
+        self.sequence += 1
+        heapq.heappush(self.pending, (due or time.monotonic(), self.sequence, message, list(recipients), attempts))
+
+    def _retry_or_fail(self, message, recipients, attempts, error):
+        if attempts + 1 >= self.max_attempts:
+            self.failed.extend((recipient, error) for recipient in recipients)
+        else:
+            self.put(message, recipients, attempts + 1
+                     , time.monotonic() + self.retry_seconds * 2 ** attempts)
+
+    def send(self, message, recipients, attempts=0):
+        self.rate_limiter.acquire()
+        try:
+            with self.pool.session() as session:
+                refused = session.sendmail(message['From'], recipients, message.as_string())
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except smtplib.SMTPResponseException as e:
+            if is_permanent_failure(e.smtp_code):
+                self.failed.extend((recipient, str(e)) for recipient in recipients)
+            else:
+                self._retry_or_fail(message, recipients, attempts, str(e))
+            return
+        except (smtplib.SMTPException, OSError) as e:
+            self._retry_or_fail(message, recipients, attempts, str(e))
+            return
+
+        self.sent.extend(recipient for recipient in recipients if recipient not in refused)
+        retry = [recipient for recipient, (code, _) in refused.items() if not is_permanent_failure(code)]
+        self.failed.extend((recipient, str(reply)) for recipient, (code, reply) in refused.items()
+                           if is_permanent_failure(code))
+        if retry:
+            self._retry_or_fail(message, retry, attempts, 'recipients temporarily refused')
+
+    # sends everything due now; returns number of messages still waiting for a retry
+    def send_due(self):
+        now = time.monotonic()
+        while self.pending and self.pending[0][0] <= now:
+            _, _, message, recipients, attempts = heapq.heappop(self.pending)
+            self.send(message, recipients, attempts)
+        return len(self.pending)
+
+    # blocks until every message is sent or has run out of attempts; returns (sent, failed)
+    def flush(self):
+        while self.send_due():
+            time.sleep(max(0, self.pending[0][0] - time.monotonic()))
+        return self.sent, self.failed
+
+
+def get_publication_message_factory(publication, subject=None, chart_data=None):
+    report = publication.publication_report
+    subject = subject or report.label
+    if publication.type == 'email_embedded':
+        html_body = artifact_store.read_artifact(
+            artifact_store.get_report_artifact(report, 'html', chart_data=chart_data)).decode('utf-8')
+        return lambda recipient: build_message(subject, html_body, to=recipient)
+    if publication.type == 'email_attachment':
+        pdf = artifact_store.read_artifact(artifact_store.get_report_artifact(report, 'pdf', chart_data=chart_data))
+        html_body = '<p>{} is attached.</p>'.format(report.label)
+        return lambda recipient: build_message(subject, html_body, to=recipient, attachment=pdf
+                                               , attachment_name='{}.pdf'.format(report.label))
+    raise AssertionError('Publication type is not an email')
+
+
+# returns (sent, failed) where failed is a list of (email address, error)
+def send_messages(message_factory, recipients, mode='bcc', mail_queue=None):
+    if not recipients:
+        return [], []
+    mail_queue = mail_queue or MailQueue()
+    for message, envelope in batch_recipients(message_factory, recipients, mode):
+        mail_queue.put(message, envelope)
+    return mail_queue.flush()
+
+
+def send_publication(publication, mode='bcc', mail_queue=None):
+    recipients = [contact.email for contact in publication.recipients]
+    if not recipients:
+        return [], []
+    return send_messages(get_publication_message_factory(publication), recipients, mode, mail_queue)
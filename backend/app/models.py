@@ -1,15 +1,18 @@
 from datetime import datetime, time
 import re
+import json
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm import validates
 from sqlalchemy import func
 from backend.app import db, helper_functions as helpers
+from backend.app import connection_manager as cm
 from backend.app.encrypt import encrypt_with_aws, decrypt_with_aws
 
 user_perms = db.Table('user_perms',
                       db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
                       db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True),
                       db.UniqueConstraint('user_id', 'usergroup_id', name='UC_user_id_usergroup_id'),
+                      db.Index('ix_user_perms_usergroup_id_user_id', 'usergroup_id', 'user_id'),
                       )
 
 
@@ -26,6 +29,8 @@ class User(db.Model):
     reports = db.relationship('Report', backref='creator', lazy='dynamic')
     publications = db.relationship('Publication', backref='creator', lazy='dynamic')
     contacts = db.relationship('Contact', backref='creator', lazy='dynamic')
+    sync_jobs = db.relationship('SyncJob', backref='creator', lazy='dynamic')
+    derived_tables = db.relationship('DerivedTable', backref='creator', lazy='dynamic')
     usergroups = db.relationship("Usergroup", secondary=user_perms, backref="members", cascade="save-update, merge")
 
     @validates('username')
@@ -79,16 +84,17 @@ class User(db.Model):
 
         return usergroups
 
-    def get_dict(self):
-        dict_format = {
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             "user_id": self.id,
             "username": self.username,
             "email": self.email,
             "role": self.role,
-            "usergroups": self.get_dicts_from_usergroups()
-
             }
-        return dict_format
+        relations = {
+            "usergroups": lambda expand: self.get_dicts_from_usergroups(),
+            }
+        return helpers.build_dict('user_id', attributes, relations, fields, expand)
 
     def set_password(self, password):
         if not password:
@@ -116,6 +122,21 @@ class User(db.Model):
         conn_tuple_list = db.session.query(table).filter(table.c.usergroup_id.in_(usergroup_ids)).all()
         return list(set(map(lambda tup: tup[1], conn_tuple_list)))
 
+# returns {'connections': set of ids, 'queries': ..., 'charts': ..., 'reports': ...} from one UNION query
+    def get_authorized_ids_by_type(self):
+        perms_tables = [('connections', connection_perms, connection_perms.c.connection_id),
+                        ('queries', query_perms, query_perms.c.query_id),
+                        ('charts', chart_perms, chart_perms.c.chart_id),
+                        ('reports', report_perms, report_perms.c.report_id)]
+        selects = [db.select([db.literal(object_type).label('object_type'), id_column.label('object_id')])
+                   .select_from(table.join(user_perms, table.c.usergroup_id == user_perms.c.usergroup_id))
+                   .where(user_perms.c.user_id == self.id)
+                   for object_type, table, id_column in perms_tables]
+        authorized_ids = {object_type: set() for object_type, _, _ in perms_tables}
+        for object_type, object_id in db.session.execute(db.union(*selects)):
+            authorized_ids[object_type].add(object_id)
+        return authorized_ids
+
 # returns list of usergroup dictionaries
     def get_dicts_from_usergroups(self):
         usergroup_ids = self.get_usergroup_ids()
@@ -212,32 +233,34 @@ class Usergroup(db.Model):
 
         return reports
 
-    def get_members(self):
-        return list(map(lambda obj: obj.get_dict(), self.members))
+    def get_members(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.members))
 
-    def get_connections(self):
-        return list(map(lambda obj: obj.get_dict(), self.connections))
+    def get_connections(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.connections))
 
-    def get_queries(self):
-        return list(map(lambda obj: obj.get_dict(), self.queries))
+    def get_queries(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.queries))
 
-    def get_charts(self):
-        return list(map(lambda obj: obj.get_dict(), self.charts))
+    def get_charts(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.charts))
 
-    def get_reports(self):
-        return list(map(lambda obj: obj.get_dict(), self.reports))
+    def get_reports(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.reports))
 
-    def get_dict(self):
-        dict_format = {
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'usergroup_id': self.id,
             'label': self.label,
-            'members': self.get_members(),
-            'connections': self.get_connections(),
-            'queries': self.get_queries(),
-            'charts': self.get_charts(),
-            'reports': self.get_reports(),
             }
-        return dict_format
+        relations = {
+            'members': self.get_members,
+            'connections': self.get_connections,
+            'queries': self.get_queries,
+            'charts': self.get_charts,
+            'reports': self.get_reports,
+            }
+        return helpers.build_dict('usergroup_id', attributes, relations, fields, expand)
 
     def __repr__(self):
         return '<Usergroup id:{} label:{}>'.format(self.id, self.label)
@@ -246,7 +269,8 @@ class Usergroup(db.Model):
 connection_perms = \
     db.Table('connection_perms',
              db.Column('connection_id', db.Integer, db.ForeignKey('connection.id'), primary_key=True),
-             db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True)
+             db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True),
+             db.Index('ix_connection_perms_usergroup_id_connection_id', 'usergroup_id', 'connection_id'),
              )
 
 
@@ -259,6 +283,8 @@ class Connection(db.Model):
     username = db.Column(db.String(128))
     password = db.Column(db.String(128))
     database_name = db.Column(db.String(256))
+    row_limit = db.Column(db.Integer)
+    byte_limit = db.Column(db.BigInteger)
     charts = db.relationship('Chart', backref='chart_connection', lazy='dynamic')
     creator_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True, nullable=False)
     usergroups = db.relationship("Usergroup", secondary=connection_perms, backref="connections")
@@ -328,6 +354,15 @@ class Connection(db.Model):
 
         return database_name
 
+    @validates('row_limit', 'byte_limit')
+    def validate_result_limit(self, key, limit):
+        if limit is None:
+            return None
+        if not isinstance(limit, int) or limit < 1:
+            raise AssertionError('{} must be a positive integer'.format(key))
+
+        return limit
+
     @validates('creator')
     def validate_creator(self, key, creator):
         if not isinstance(creator, User):
@@ -342,19 +377,33 @@ class Connection(db.Model):
 
         return usergroups
 
-    def get_dict(self):
-        dict_format = {
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'connection_id': self.id,
             'label': self.label,
             'db_type': self.db_type,
             'host': self.host,
             'port': self.port,
             'username': self.username,
-            'password': decrypt_with_aws(self.password) if self.password else self.password,
+            'password': lambda: decrypt_with_aws(self.password) if self.password else self.password,
             'db_name': self.database_name,
-            'creator': self.creator.get_dict(),
+            'row_limit': self.row_limit,
+            'byte_limit': self.byte_limit,
             }
-        return dict_format
+        relations = {
+            'creator': lambda expand: self.creator.get_dict(expand=expand),
+            }
+        return helpers.build_dict('connection_id', attributes, relations, fields, expand)
+
+    def get_summary(self, fields=None):
+        attributes = {
+            'connection_id': self.id,
+            'label': self.label,
+            'db_type': self.db_type,
+            'host': self.host,
+            'db_name': self.database_name,
+            }
+        return helpers.build_dict('connection_id', attributes, fields=fields)
 
     def get_usergroups(self):
         usergroups = helpers.get_dicts_from_usergroups(self.usergroups)
@@ -371,7 +420,8 @@ class Connection(db.Model):
 query_perms = \
     db.Table('query_perms',
              db.Column('query_id', db.Integer, db.ForeignKey('sql_query.id'), primary_key=True),
-             db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True)
+             db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True),
+             db.Index('ix_query_perms_usergroup_id_query_id', 'usergroup_id', 'query_id'),
              )
 
 
@@ -379,6 +429,8 @@ class SqlQuery(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     label = db.Column(db.String(64), index=True, unique=True)
     raw_sql = db.Column(db.Text)
+    watermark_column = db.Column(db.String(128))
+    parameters = db.Column(db.Text)
     creator_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True, nullable=False)
     charts = db.relationship('Chart', backref='sql_query', lazy='dynamic')
     usergroups = db.relationship("Usergroup", secondary=query_perms, backref="queries")
@@ -401,6 +453,36 @@ class SqlQuery(db.Model):
 
         return raw_sql
 
+    @validates('watermark_column')
+    def validate_watermark_column(self, key, watermark_column):
+        if not watermark_column:
+            return None
+        if not isinstance(watermark_column, str) or not re.match("^[a-zA-Z_][a-zA-Z0-9_]*$", watermark_column):
+            raise AssertionError('watermark_column must be a column name')
+
+        return watermark_column
+
+    # parameters are declared as a list of {"name": ..., "type": ..., "default": ...}, referenced as :name in raw_sql
+    @validates('parameters')
+    def validate_parameters(self, key, parameters):
+        if not parameters:
+            return None
+        if isinstance(parameters, str):
+            try:
+                parameters = json.loads(parameters)
+            except ValueError:
+                raise AssertionError('parameters must be a list of parameter declarations')
+        if not isinstance(parameters, list) or not all(isinstance(parameter, dict) for parameter in parameters):
+            raise AssertionError('parameters must be a list of parameter declarations')
+        for parameter in parameters:
+            if not isinstance(parameter.get('name'), str) \
+                    or not re.match("^[a-zA-Z_][a-zA-Z0-9_]*$", parameter.get('name')):
+                raise AssertionError('parameter name must be an identifier')
+            if parameter.get('type') not in cm.PARAMETER_TYPES:
+                raise AssertionError('parameter type not recognized')
+
+        return json.dumps(parameters)
+
     @validates('usergroups')
     def validate_usergroups(self, key, usergroups):
         if not isinstance(usergroups, Usergroup):
@@ -408,14 +490,29 @@ class SqlQuery(db.Model):
 
         return usergroups
 
-    def get_dict(self):
-        dict_format = {
+    def get_parameters(self):
+        return json.loads(self.parameters) if self.parameters else []
+
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'query_id': self.id,
             'label': self.label,
             'raw_sql': self.raw_sql,
-            'creator': self.creator.get_dict(),
+            'watermark_column': self.watermark_column,
+            'parameters': self.get_parameters(),
         }
-        return dict_format
+        relations = {
+            'creator': lambda expand: self.creator.get_dict(expand=expand),
+        }
+        return helpers.build_dict('query_id', attributes, relations, fields, expand)
+
+    def get_summary(self, fields=None):
+        attributes = {
+            'query_id': self.id,
+            'label': self.label,
+            'raw_sql': self.raw_sql,
+            }
+        return helpers.build_dict('query_id', attributes, fields=fields)
 
     def get_usergroups(self):
         usergroups = helpers.get_dicts_from_usergroups(self.usergroups)
@@ -431,7 +528,8 @@ class SqlQuery(db.Model):
 
 chart_perms = db.Table('chart_perms',
                        db.Column('chart_id', db.Integer, db.ForeignKey('chart.id'), primary_key=True),
-                       db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True)
+                       db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True),
+                       db.Index('ix_chart_perms_usergroup_id_chart_id', 'usergroup_id', 'chart_id'),
                        )
 
 
@@ -441,8 +539,11 @@ class Chart(db.Model):
     type = db.Column(db.String(128))
     parameters = db.Column(db.Text)
     creator_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
-    sql_query_id = db.Column(db.Integer, db.ForeignKey('sql_query.id'))
-    connection_id = db.Column(db.Integer, db.ForeignKey('connection.id'))
+    sql_query_id = db.Column(db.Integer, db.ForeignKey('sql_query.id'), index=True)
+    connection_id = db.Column(db.Integer, db.ForeignKey('connection.id'), index=True)
+    materialized = db.Column(db.Boolean, default=False)
+    refresh_minutes = db.Column(db.Integer, default=60)
+    snapshot_refreshed_on = db.Column(db.DateTime)
     usergroups = db.relationship("Usergroup", secondary=chart_perms, backref="charts")
 
     @validates('label')
@@ -490,6 +591,15 @@ class Chart(db.Model):
 
         return connection_id
 
+    @validates('refresh_minutes')
+    def validate_refresh_minutes(self, key, refresh_minutes):
+        if refresh_minutes is None:
+            return None
+        if not isinstance(refresh_minutes, int) or refresh_minutes < 1:
+            raise AssertionError('refresh_minutes must be a positive integer')
+
+        return refresh_minutes
+
     @validates('usergroups')
     def validate_usergroups(self, key, usergroups):
         if not isinstance(usergroups, Usergroup):
@@ -497,17 +607,35 @@ class Chart(db.Model):
 
         return usergroups
 
-    def get_dict(self):
-        dict_format = {
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'chart_id': self.id,
             'label': self.label,
-            'creator': self.creator.get_dict(),
             'type': self.type,
             'parameters': self.parameters,
-            'sql_query': self.sql_query.get_dict(),
-            'connection': self.chart_connection.get_dict(),
+            'sql_query_id': self.sql_query_id,
+            'connection_id': self.connection_id,
+            'materialized': self.materialized,
+            'refresh_minutes': self.refresh_minutes,
+            'snapshot_refreshed_on': self.snapshot_refreshed_on,
             }
-        return dict_format
+        relations = {
+            'creator': lambda expand: self.creator.get_dict(expand=expand),
+            'sql_query': lambda expand: self.sql_query.get_dict(expand=expand),
+            'connection': lambda expand: self.chart_connection.get_dict(expand=expand),
+            }
+        return helpers.build_dict('chart_id', attributes, relations, fields, expand)
+
+    def get_summary(self, fields=None):
+        attributes = {
+            'chart_id': self.id,
+            'label': self.label,
+            'type': self.type,
+            'sql_query_id': self.sql_query_id,
+            'connection_id': self.connection_id,
+            'materialized': self.materialized,
+            }
+        return helpers.build_dict('chart_id', attributes, fields=fields)
 
     def get_usergroups(self):
         usergroups = helpers.get_dicts_from_usergroups(self.usergroups)
@@ -523,10 +651,17 @@ class Chart(db.Model):
 
 report_perms = db.Table('report_perms',
                         db.Column('report_id', db.Integer, db.ForeignKey('report.id'), primary_key=True),
-                        db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True)
+                        db.Column('usergroup_id', db.Integer, db.ForeignKey('usergroup.id'), primary_key=True),
+                        db.Index('ix_report_perms_usergroup_id_report_id', 'usergroup_id', 'report_id'),
                         )
 
 
+report_charts = db.Table('report_charts',
+                         db.Column('report_id', db.Integer, db.ForeignKey('report.id'), primary_key=True),
+                         db.Column('chart_id', db.Integer, db.ForeignKey('chart.id'), primary_key=True)
+                         )
+
+
 class Report(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     label = db.Column(db.String(64), index=True, unique=True)
@@ -536,6 +671,7 @@ class Report(db.Model):
     parameters = db.Column(db.Text)
     publications = db.relationship('Publication', backref='publication_report', lazy='dynamic')
     usergroups = db.relationship("Usergroup", secondary=report_perms, backref="reports")
+    charts = db.relationship("Chart", secondary=report_charts, backref="reports")
 
     @validates('label')
     def validate_label(self, key, label):
@@ -562,17 +698,35 @@ class Report(db.Model):
 
         return usergroups
 
-    def get_dict(self):
-        dict_format = {
+    @validates('charts')
+    def validate_charts(self, key, charts):
+        if not isinstance(charts, Chart):
+            raise AssertionError('Provided chart is not recognized')
+
+        return charts
+
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'report_id': self.id,
             'label': self.label,
-            'creator': self.creator.get_dict(),
             'created_on': self.created_on,
             'last_published': self.last_published,
             'parameters': self.parameters,
-            'publications': self.get_publications(),
             }
-        return dict_format
+        relations = {
+            'creator': lambda expand: self.creator.get_dict(expand=expand),
+            'publications': self.get_publications,
+            'chart_ids': lambda expand: [chart.id for chart in self.charts],
+            }
+        return helpers.build_dict('report_id', attributes, relations, fields, expand)
+
+    def get_summary(self, fields=None):
+        attributes = {
+            'report_id': self.id,
+            'label': self.label,
+            'last_published': self.last_published,
+            }
+        return helpers.build_dict('report_id', attributes, fields=fields)
 
     def get_usergroups(self):
         usergroups = helpers.get_dicts_from_usergroups(self.usergroups)
@@ -582,8 +736,8 @@ class Report(db.Model):
         users = dict(users=helpers.get_users_from_usergroups(self.usergroups))
         return users
 
-    def get_publications(self):
-        return list(map(lambda obj: obj.get_dict(), self.publications))
+    def get_publications(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.publications))
 
     def __repr__(self):
         return '<Report {}>'.format(self.label)
@@ -612,6 +766,10 @@ class Publication(db.Model):
     day_of_month = db.Column(db.Integer)
     pub_time = db.Column(db.Time, default=time())
     report_id = db.Column(db.Integer, db.ForeignKey('report.id'), index=True)
+    last_run_on = db.Column(db.DateTime)
+    always_send = db.Column(db.Boolean, default=False)
+    last_data_version = db.Column(db.String(64))
+    runs = db.relationship('PublicationRun', backref='publication', lazy='dynamic', cascade='all, delete-orphan')
     # contact_ids = db.relationship("Contact", secondary=publication_recipients, backref="publications")
 
     @validates('recipients')
@@ -650,11 +808,10 @@ class Publication(db.Model):
 
         return report
 
-    def get_dict(self):
-        dict_format = {
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'publication_id': self.id,
             'type': self.type,
-            'creator': self.creator.get_dict(),
             'frequency': self.frequency,
             'monday': self.monday,
             'tuesday': self.tuesday,
@@ -666,23 +823,58 @@ class Publication(db.Model):
             'day_of_month': self.day_of_month,
             'publication_time': self.pub_time.strftime('%l:%M%p'),
             'report_id': self.report_id,
-            'recipients': self.get_recipients()
+            'last_run_on': self.last_run_on,
+            'always_send': self.always_send,
             }
-        return dict_format
+        relations = {
+            'creator': lambda expand: self.creator.get_dict(expand=expand),
+            'recipients': self.get_recipients,
+            'runs': lambda expand: list(map(lambda obj: obj.get_dict(),
+                                            self.runs.order_by(PublicationRun.id.desc()).limit(10))),
+            }
+        return helpers.build_dict('publication_id', attributes, relations, fields, expand)
 
-    def get_recipients(self):
-        return list(map(lambda obj: obj.get_dict(), self.recipients))
+    def get_recipients(self, expand=None):
+        return list(map(lambda obj: obj.get_dict(expand=expand), self.recipients))
 
     def __repr__(self):
         return '<Publication {} for report {}'.format(self.type, self.report_id)
 
 
+class PublicationRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    publication_id = db.Column(db.Integer, db.ForeignKey('publication.id'), index=True)
+    started_on = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_seconds = db.Column(db.Float)
+    status = db.Column(db.Enum('success', 'skipped', 'failed', name='pub_run_status'))
+    data_version = db.Column(db.String(64))
+    sent = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    message = db.Column(db.Text)
+
+    def get_dict(self):
+        dict_format = {
+            'publication_run_id': self.id,
+            'started_on': self.started_on,
+            'duration_seconds': self.duration_seconds,
+            'status': self.status,
+            'data_version': self.data_version,
+            'sent': self.sent,
+            'failed': self.failed,
+            'message': self.message,
+            }
+        return dict_format
+
+    def __repr__(self):
+        return '<PublicationRun {} for publication {}>'.format(self.status, self.publication_id)
+
+
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(64))
     last_name = db.Column(db.String(64))
     email = db.Column(db.String(128))
-    public = db.Column(db.Boolean)
+    public = db.Column(db.Boolean, index=True)
     creator_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     publication_ids = db.relationship("Publication", secondary=publication_recipients, backref="recipients")
 
@@ -742,21 +934,258 @@ class Contact(db.Model):
 
         return publication
 
-    def get_dict(self):
-        dict_format = {
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
             'contact_id': self.id,
             'first_name': self.first_name,
             'last_name': self.last_name,
             'email': self.email,
             'public': self.public,
-            'creator': self.creator.get_dict(),
             }
-        return dict_format
+        relations = {
+            'creator': lambda expand: self.creator.get_dict(expand=expand),
+            }
+        return helpers.build_dict('contact_id', attributes, relations, fields, expand)
 
     def __repr__(self):
         return '<Recipient {}, {}>'.format(self.last_name, self.first_name)
 
 
+class DerivedTable(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(64), index=True, unique=True)
+    target_table = db.Column(db.String(256), nullable=False)
+    upstream_tables = db.Column(db.String(1024))
+    index_columns = db.Column(db.String(1024))
+    sql_query_id = db.Column(db.Integer, db.ForeignKey('sql_query.id'), nullable=False)
+    connection_id = db.Column(db.Integer, db.ForeignKey('connection.id'), index=True, nullable=False)
+    input_signature = db.Column(db.String(64))
+    last_built_on = db.Column(db.DateTime)
+    creator_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    sql_query = db.relationship('SqlQuery', backref=db.backref('derived_tables', lazy='dynamic'))
+    connection = db.relationship('Connection', backref=db.backref('derived_tables', lazy='dynamic'))
+
+    @validates('label')
+    def validate_label(self, key, label):
+        if not label:
+            raise AssertionError('No label provided')
+        if DerivedTable.query.filter(func.lower(DerivedTable.label) == func.lower(label)).first():
+            raise AssertionError('Provided label is already in use')
+
+        return label
+
+    @validates('target_table')
+    def validate_target_table(self, key, target_table):
+        if not target_table or not re.match("^[a-zA-Z_][a-zA-Z0-9_.]*$", target_table):
+            raise AssertionError('target_table must be a table name')
+
+        return target_table
+
+    @validates('upstream_tables')
+    def validate_upstream_tables(self, key, upstream_tables):
+        if not upstream_tables:
+            return None
+        if isinstance(upstream_tables, list):
+            upstream_tables = ','.join(upstream_tables)
+        if not re.match("^[a-zA-Z0-9_.]+(,[a-zA-Z0-9_.]+)*$", upstream_tables):
+            raise AssertionError('upstream_tables must be a list of table names')
+
+        return upstream_tables
+
+    # index_columns holds one index per entry, columns joined with '+', e.g. ['region+day', 'user_id']
+    @validates('index_columns')
+    def validate_index_columns(self, key, index_columns):
+        if not index_columns:
+            return None
+        if isinstance(index_columns, list):
+            index_columns = ','.join(index_columns)
+        if not re.match("^[a-zA-Z0-9_+]+(,[a-zA-Z0-9_+]+)*$", index_columns):
+            raise AssertionError('index_columns must be a list of column names')
+
+        return index_columns
+
+    def get_upstream_tables(self):
+        return self.upstream_tables.split(',') if self.upstream_tables else []
+
+    def get_indexes(self):
+        return [index.split('+') for index in self.index_columns.split(',')] if self.index_columns else []
+
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
+            'derived_table_id': self.id,
+            'label': self.label,
+            'target_table': self.target_table,
+            'upstream_tables': self.get_upstream_tables(),
+            'indexes': self.get_indexes(),
+            'sql_query_id': self.sql_query_id,
+            'connection_id': self.connection_id,
+            'last_built_on': self.last_built_on,
+            }
+        return helpers.build_dict('derived_table_id', attributes, fields=fields, expand=expand)
+
+    def __repr__(self):
+        return '<DerivedTable {}>'.format(self.target_table)
+
+
+class SyncJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(64), index=True, unique=True)
+    source_connection_id = db.Column(db.Integer, db.ForeignKey('connection.id'), nullable=False)
+    target_connection_id = db.Column(db.Integer, db.ForeignKey('connection.id'), nullable=False)
+    source_table = db.Column(db.String(256), nullable=False)
+    target_table = db.Column(db.String(256))
+    mode = db.Column(db.Enum('append', 'upsert', name='sync_mode'), default='append')
+    watermark_column = db.Column(db.String(128), nullable=False)
+    key_columns = db.Column(db.String(512))
+    high_water_mark = db.Column(db.String(64))
+    refresh_minutes = db.Column(db.Integer, default=1440)
+    last_run_on = db.Column(db.DateTime)
+    creator_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    source_connection = db.relationship('Connection', foreign_keys=[source_connection_id])
+    target_connection = db.relationship('Connection', foreign_keys=[target_connection_id])
+    runs = db.relationship('SyncRun', backref='sync_job', lazy='dynamic', cascade='all, delete-orphan')
+
+    @validates('label')
+    def validate_label(self, key, label):
+        if not label:
+            raise AssertionError('No label provided')
+        if SyncJob.query.filter(func.lower(SyncJob.label) == func.lower(label)).first():
+            raise AssertionError('Provided label is already in use')
+
+        return label
+
+    @validates('source_table', 'target_table')
+    def validate_table(self, key, table):
+        if key == 'target_table' and not table:
+            return None
+        if not table or not isinstance(table, str):
+            raise AssertionError('{} must be a table name'.format(key))
+
+        return table
+
+    @validates('mode')
+    def validate_mode(self, key, mode):
+        if mode not in ['append', 'upsert']:
+            raise AssertionError('Sync mode not recognized')
+
+        return mode
+
+    @validates('watermark_column')
+    def validate_watermark_column(self, key, watermark_column):
+        if not watermark_column or not re.match("^[a-zA-Z_][a-zA-Z0-9_]*$", watermark_column):
+            raise AssertionError('watermark_column must be a column name')
+
+        return watermark_column
+
+    @validates('key_columns')
+    def validate_key_columns(self, key, key_columns):
+        if not key_columns:
+            return None
+        if isinstance(key_columns, list):
+            key_columns = ','.join(key_columns)
+        if not re.match("^[a-zA-Z_][a-zA-Z0-9_]*(,[a-zA-Z_][a-zA-Z0-9_]*)*$", key_columns):
+            raise AssertionError('key_columns must be a list of column names')
+
+        return key_columns
+
+    def get_key_columns(self):
+        return self.key_columns.split(',') if self.key_columns else []
+
+    def get_dict(self, fields=None, expand=None):
+        attributes = {
+            'sync_job_id': self.id,
+            'label': self.label,
+            'source_connection_id': self.source_connection_id,
+            'target_connection_id': self.target_connection_id,
+            'source_table': self.source_table,
+            'target_table': self.target_table,
+            'mode': self.mode,
+            'watermark_column': self.watermark_column,
+            'key_columns': self.get_key_columns(),
+            'high_water_mark': self.high_water_mark,
+            'refresh_minutes': self.refresh_minutes,
+            'last_run_on': self.last_run_on,
+            }
+        relations = {
+            'runs': lambda expand: list(map(lambda obj: obj.get_dict(),
+                                            self.runs.order_by(SyncRun.id.desc()).limit(10))),
+            }
+        return helpers.build_dict('sync_job_id', attributes, relations, fields, expand)
+
+    def __repr__(self):
+        return '<SyncJob {}>'.format(self.label)
+
+
+class SyncRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sync_job_id = db.Column(db.Integer, db.ForeignKey('sync_job.id'), index=True)
+    started_on = db.Column(db.DateTime, default=datetime.utcnow)
+    duration_seconds = db.Column(db.Float)
+    rows = db.Column(db.Integer)
+    status = db.Column(db.Enum('success', 'failed', name='sync_status'))
+    message = db.Column(db.Text)
+
+    def get_dict(self):
+        dict_format = {
+            'sync_run_id': self.id,
+            'started_on': self.started_on,
+            'duration_seconds': self.duration_seconds,
+            'rows': self.rows,
+            'status': self.status,
+            'message': self.message,
+            }
+        return dict_format
+
+    def __repr__(self):
+        return '<SyncRun {} for job {}>'.format(self.status, self.sync_job_id)
+
+
+class CopyCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_key = db.Column(db.String(512), index=True, nullable=False)
+    range_start = db.Column(db.BigInteger, nullable=False)
+    range_end = db.Column(db.BigInteger, nullable=False)
+    rows = db.Column(db.Integer)
+    started_on = db.Column(db.DateTime)
+    completed_on = db.Column(db.DateTime)
+
+    def get_dict(self):
+        dict_format = {
+            'copy_checkpoint_id': self.id,
+            'job_key': self.job_key,
+            'range_start': self.range_start,
+            'range_end': self.range_end,
+            'rows': self.rows,
+            'started_on': self.started_on,
+            'completed_on': self.completed_on,
+            }
+        return dict_format
+
+    def __repr__(self):
+        return '<CopyCheckpoint {} [{}, {})>'.format(self.job_key, self.range_start, self.range_end)
+
+
+# when a copy last loaded a warehouse table, which versions the table for pipeline runs
+class TableLoad(db.Model):
+    __table_args__ = (db.UniqueConstraint('connection_id', 'table_name', name='UC_connection_id_table_name'),)
+    id = db.Column(db.Integer, primary_key=True)
+    connection_id = db.Column(db.Integer, db.ForeignKey('connection.id'), nullable=False)
+    table_name = db.Column(db.String(256), nullable=False)
+    loaded_on = db.Column(db.DateTime, nullable=False)
+
+    def get_dict(self):
+        dict_format = {
+            'table_load_id': self.id,
+            'connection_id': self.connection_id,
+            'table_name': self.table_name,
+            'loaded_on': self.loaded_on,
+            }
+        return dict_format
+
+    def __repr__(self):
+        return '<TableLoad {} on connection {}>'.format(self.table_name, self.connection_id)
+
+
 class TokenBlacklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False)
@@ -0,0 +1,165 @@
+import time
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import sqlalchemy
+from backend.app import db, models
+from backend.app import connection_manager as cm, data_copy
+
+DEFAULT_WORKERS = 4
+
+
+# returns {target_table: set of target_tables it depends on}, only counting edges between derived tables
+def build_dag(derived_tables):
+    by_table = {node.target_table.lower(): node for node in derived_tables}
+    return {node.target_table.lower(): {table.lower() for table in node.get_upstream_tables()
+                                        if table.lower() in by_table}
+            for node in derived_tables}
+
+
+# returns target_tables in dependency order, raises when the definitions form a cycle
+def topological_order(dag):
+    remaining = {table: set(upstream) for table, upstream in dag.items()}
+    order = []
+    while remaining:
+        ready = sorted(table for table, upstream in remaining.items() if not upstream)
+        if not ready:
+            raise AssertionError('Derived tables have a circular dependency: {}'.format(', '.join(sorted(remaining))))
+        for table in ready:
+            order.append(table)
+            del remaining[table]
+        for upstream in remaining.values():
+            upstream.difference_update(ready)
+    return order
+
+
+# anything that changes when an upstream table's data changes: build times of derived tables, high water marks of
+# sync jobs feeding it, and load times recorded by copies. A table with none of these (loaded some other way) has
+# no version, and tables reading it are always rebuilt
+def get_upstream_versions(connection, derived_tables):
+    built_on = {node.target_table.lower(): str(node.last_built_on) for node in derived_tables}
+    synced = {(job.target_table or job.source_table).lower(): job.high_water_mark
+              for job in models.SyncJob.query.filter(models.SyncJob.target_connection_id == connection.id)}
+    loaded = {table_load.table_name: str(table_load.loaded_on)
+              for table_load in models.TableLoad.query.filter(models.TableLoad.connection_id == connection.id)}
+
+    versions = {}
+    for node in derived_tables:
+        for table in node.get_upstream_tables():
+            name = table.lower()
+            if name in built_on or name in versions:
+                continue
+            versions[name] = synced.get(name) or loaded.get(name)
+    return versions, built_on
+
+
+# None when an upstream table has no version, so the table is never skipped
+def get_input_signature(node, versions):
+    tables = sorted(node.get_upstream_tables())
+    if any(versions.get(table.lower()) is None for table in tables):
+        return None
+    parts = [node.sql_query.raw_sql] + ['{}={}'.format(table.lower(), versions[table.lower()]) for table in tables]
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def get_create_sql(engine, table_name, raw_sql):
+    if engine.dialect.name == 'mssql':
+        return 'SELECT * INTO {} FROM ({}) narratus_source'.format(table_name, raw_sql)
+    return 'CREATE TABLE {} AS {}'.format(table_name, raw_sql)
+
+
+def get_rename_sql(engine, old_name, new_name):
+    if engine.dialect.name == 'mssql':
+        return "EXEC sp_rename '{}', '{}'".format(old_name, new_name.rpartition('.')[2])
+    if engine.dialect.name == 'mysql':
+        return 'RENAME TABLE {} TO {}'.format(old_name, new_name)
+    return 'ALTER TABLE {} RENAME TO {}'.format(old_name, new_name.rpartition('.')[2])
+
+
+def _table_exists(connection, table_name):
+    schema, _, name = table_name.rpartition('.')
+    return connection.dialect.has_table(connection, name, schema=schema or None)
+
+
+# builds into a staging table, swaps it in, then adds indexes once the data is loaded
+def build_derived_table(engine, target_table, raw_sql, indexes):
+    started = time.time()
+    staging_table = '{}__building'.format(target_table)
+
+    with engine.begin() as connection:
+        if _table_exists(connection, staging_table):
+            connection.execute('DROP TABLE {}'.format(staging_table))
+        connection.execute(get_create_sql(engine, staging_table, raw_sql))
+        if _table_exists(connection, target_table):
+            connection.execute('DROP TABLE {}'.format(target_table))
+        connection.execute(get_rename_sql(engine, staging_table, target_table))
+
+    table = data_copy.reflect_table(engine, target_table)
+    for index_columns in indexes:
+        index_name = 'ix_{}_{}'.format(table.name, '_'.join(index_columns))
+        sqlalchemy.Index(index_name, *[table.columns[column] for column in index_columns]).create(bind=engine)
+
+    return round(time.time() - started, 3)
+
+
+# runs every derived table on the connection; independent tables build in parallel and a table whose
+# inputs are unchanged since its last build is skipped, unless force is set
+def run_pipeline(connection, workers=DEFAULT_WORKERS, force=False):
+    data_copy.validate_workers(workers)
+    derived_tables = connection.derived_tables.all()
+    nodes = {node.target_table.lower(): node for node in derived_tables}
+    dag = build_dag(derived_tables)
+    order = topological_order(dag)
+    engine = cm.create_engine(connection, **data_copy.get_pool_options(connection, workers))
+    try:
+        versions, built_on = get_upstream_versions(connection, derived_tables)
+
+        results = {}
+        signatures = {}
+        done = set()
+        running = {}
+        started = time.time()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while len(done) < len(order):
+                for table in order:
+                    if table in done or table in running.values() or not dag[table] <= done:
+                        continue
+                    node = nodes[table]
+                    signature = get_input_signature(node, dict(versions, **built_on))
+                    if not force and signature is not None and signature == node.input_signature:
+                        results[table] = {'status': 'skipped', 'seconds': 0}
+                        done.add(table)
+                        continue
+                    future = executor.submit(build_derived_table, engine, node.target_table, node.sql_query.raw_sql
+                                             , node.get_indexes())
+                    running[future] = table
+                    signatures[table] = signature
+
+                if not running:
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    table = running.pop(future)
+                    node = nodes[table]
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        for pending in running:
+                            pending.cancel()
+                        db.session.rollback()
+                        raise AssertionError('Building {} failed: {}'.format(node.target_table, e))
+                    node.input_signature = signatures[table]
+                    node.last_built_on = datetime.utcnow()
+                    built_on[table] = str(node.last_built_on)
+                    results[table] = {'status': 'built', 'seconds': seconds}
+                    done.add(table)
+                    db.session.commit()
+
+        return {
+            'tables': [dict(table=nodes[table].target_table, **results[table]) for table in order],
+            'seconds': round(time.time() - started, 3),
+        }
+    finally:
+        engine.dispose()
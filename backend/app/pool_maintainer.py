@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+from backend.app import app, db, config, models
+from backend.app import connection_manager as cm
+
+# A background thread in each worker keeps connection pools warm and their health current. Connections used recently
+# by any worker are recorded as files under POOL_STATE_DIR, so a worker starting after a deploy can warm their pools
+# before the first query arrives. Engines left unused for WARM_UP_WINDOW_SECONDS are disposed of
+POOL_MAINTAINER_ENABLED = config.getboolean('flask', 'pool_maintainer_enabled', fallback=True)
+POOL_STATE_DIR = config.get('flask', 'pool_state_dir', fallback='/tmp/narratus/pools')
+WARM_UP_WINDOW_SECONDS = config.getint('flask', 'pool_warm_up_window_seconds', fallback=24 * 60 * 60)
+
+_maintainer = None
+_maintainer_lock = threading.Lock()
+
+
+def get_usage_path(connection_id):
+    return os.path.join(POOL_STATE_DIR, 'connection_{}'.format(connection_id))
+
+
+# usage is {connection id: time last used}; a file's mtime is the latest use by any worker
+def record_usage(usage):
+    os.makedirs(POOL_STATE_DIR, exist_ok=True)
+    for connection_id, used_on in usage.items():
+        path = get_usage_path(connection_id)
+        try:
+            if os.stat(path).st_mtime >= used_on:
+                continue
+        except FileNotFoundError:
+            open(path, 'a').close()
+        os.utime(path, (used_on, used_on))
+
+
+def get_recently_used_ids(now=None):
+    if not os.path.isdir(POOL_STATE_DIR):
+        return []
+    cutoff = (now or time.time()) - WARM_UP_WINDOW_SECONDS
+    connection_ids = []
+    for file_name in os.listdir(POOL_STATE_DIR):
+        try:
+            if os.stat(os.path.join(POOL_STATE_DIR, file_name)).st_mtime >= cutoff:
+                connection_ids.append(int(file_name.replace('connection_', '')))
+        except (FileNotFoundError, ValueError):
+            continue
+    return connection_ids
+
+
+# checks each connection, which opens a pooled connection for it; returns {connection id: health}. Connections that
+# no longer exist are forgotten
+def check_connections(connection_ids):
+    connections = []
+    if connection_ids:
+        connections = models.Connection.query.filter(models.Connection.id.in_(connection_ids)).all()
+    found_ids = {conn.id for conn in connections}
+    for connection_id in set(connection_ids) - found_ids:
+        cm.dispose_engine(connection_id)
+        try:
+            os.remove(get_usage_path(connection_id))
+        except FileNotFoundError:
+            pass
+    return {conn.id: cm.check_health(conn) for conn in connections}
+
+
+def warm_up(now=None):
+    return check_connections(get_recently_used_ids(now))
+
+
+# one maintenance pass: records this worker's usage, drops idle engines and checks the rest. Health checks don't
+# count as use, so an engine only warmed up here is dropped a window after it was created
+def maintain_pools(now=None):
+    now = now or time.time()
+    usage = cm.get_engine_usage()
+    record_usage({connection_id: used_on for connection_id, used_on in usage.items() if used_on is not None})
+    idle_ids = cm.get_idle_engine_ids(now - WARM_UP_WINDOW_SECONDS)
+    for connection_id in idle_ids:
+        cm.dispose_engine(connection_id)
+    return check_connections([connection_id for connection_id in usage if connection_id not in idle_ids])
+
+
+class PoolMaintainer(threading.Thread):
+
+    def __init__(self, interval=None):
+        super().__init__(name='pool-maintainer', daemon=True)
+        self.interval = cm.HEALTH_CHECK_SECONDS if interval is None else interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        self.run_pass(warm_up)
+        while not self.stopped.wait(self.interval):
+            self.run_pass(maintain_pools)
+
+    # a failed pass (e.g. the app database briefly unreachable) is retried on the next interval
+    def run_pass(self, maintenance):
+        with app.app_context():
+            try:
+                maintenance()
+            except Exception:
+                pass
+            finally:
+                db.session.remove()
+
+    def stop(self):
+        self.stopped.set()
+
+
+# started once per worker process, after the server forks
+def start_maintainer():
+    global _maintainer
+    if not POOL_MAINTAINER_ENABLED or cm.HEALTH_CHECK_SECONDS <= 0:
+        return None
+    with _maintainer_lock:
+        if _maintainer is None or not _maintainer.is_alive():
+            _maintainer = PoolMaintainer()
+            _maintainer.start()
+        return _maintainer
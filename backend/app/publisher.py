@@ -0,0 +1,187 @@
+import time
+import asyncio
+from datetime import datetime, timedelta
+from datetime import time as time_of_day
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from backend.app import db, config, models
+from backend.app import report_renderer, artifact_store, mailer, admission
+
+PUBLISH_WORKERS = config.getint('flask', 'publish_workers', fallback=32)
+PUBLISH_CONNECTION_LIMIT = config.getint('flask', 'publish_connection_limit', fallback=4)
+FREQUENCY_INTERVALS = {
+    'hourly': timedelta(hours=1),
+    'every_ten_min': timedelta(minutes=10),
+}
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def _is_scheduled_on(publication, day):
+    if publication.frequency == 'daily':
+        return True
+    if publication.frequency == 'days_of_week':
+        return bool(getattr(publication, WEEKDAYS[day.weekday()]))
+    if publication.frequency == 'day_of_month':
+        return day.day == publication.day_of_month
+    return False
+
+
+# most recent scheduled time at or before now, None if there isn't one in the last two months
+def get_last_scheduled_time(publication, now):
+    for days_back in range(62):
+        scheduled = datetime.combine(now.date() - timedelta(days=days_back), publication.pub_time or time_of_day())
+        if scheduled <= now and _is_scheduled_on(publication, scheduled):
+            return scheduled
+    return None
+
+
+def publication_is_due(publication, now=None):
+    now = now or datetime.utcnow()
+    if publication.frequency in FREQUENCY_INTERVALS:
+        return not publication.last_run_on or publication.last_run_on + FREQUENCY_INTERVALS[publication.frequency] <= now
+    scheduled = get_last_scheduled_time(publication, now)
+    return scheduled is not None and (not publication.last_run_on or publication.last_run_on < scheduled)
+
+
+# runs on a worker thread in the caller's app context with the thread's own session, as batch work. Hashes the
+# report's data first and, unless the publication always sends, stops there when it matches what the publication
+# last delivered
+def prepare_publication(publication_id, app):
+    with app.app_context(), admission.workload_class('batch'):
+        try:
+            publication = models.Publication.query.get(publication_id)
+            report = publication.publication_report
+            chart_data = report_renderer.get_report_chart_data(report)
+            prepared = {'data_version': artifact_store.get_data_version(chart_data), 'skipped': False
+                        , 'message_factory': None, 'recipients': []}
+
+            if not publication.always_send and prepared['data_version'] == publication.last_data_version:
+                return dict(prepared, skipped=True)
+            if publication.type == 'dashboard':
+                artifact_store.get_report_artifact(report, 'html', chart_data=chart_data)
+                return prepared
+            message_factory = mailer.get_publication_message_factory(publication, chart_data=chart_data)
+            return dict(prepared, message_factory=message_factory
+                        , recipients=[contact.email for contact in publication.recipients])
+        finally:
+            db.session.remove()
+
+
+def _get_semaphore(semaphores, key, limit):
+    if key not in semaphores:
+        semaphores[key] = asyncio.Semaphore(limit)
+    return semaphores[key]
+
+
+# sends whatever is due on the mail queue, holding a slot on the mail server only while sending. Between retries the
+# slot and the thread are given back, so a server's backoff doesn't hold up other publications to it
+async def send_queued_messages(executor, mail_server, mail_queue):
+    loop = asyncio.get_event_loop()
+    while True:
+        async with mail_server:
+            waiting = await loop.run_in_executor(executor, mail_queue.send_due)
+        if not waiting:
+            return mail_queue.sent, mail_queue.failed
+        await asyncio.sleep(max(0, mail_queue.pending[0][0] - time.monotonic()))
+
+
+# rendering holds a slot on every warehouse connection the report reads from (taken in id order, so two
+# publications can't deadlock), sending holds a slot on the mail server; neither holds a thread while waiting
+async def dispatch_publication(executor, semaphores, publication_id, connection_ids
+                               , connection_limit=PUBLISH_CONNECTION_LIMIT, app=None):
+    loop = asyncio.get_event_loop()
+    started = time.time()
+    result = {'publication_id': publication_id, 'data_version': None, 'sent': 0, 'failed': []}
+
+    acquired = []
+    try:
+        for connection_id in sorted(connection_ids):
+            semaphore = _get_semaphore(semaphores, ('connection', connection_id), connection_limit)
+            await semaphore.acquire()
+            acquired.append(semaphore)
+        prepared = await loop.run_in_executor(executor, prepare_publication, publication_id, app)
+    except Exception as e:
+        return dict(result, status='failed', message=str(e), seconds=round(time.time() - started, 3))
+    finally:
+        for semaphore in acquired:
+            semaphore.release()
+
+    result['data_version'] = prepared['data_version']
+    if prepared['skipped']:
+        return dict(result, status='skipped', message='Report data unchanged since last published'
+                    , seconds=round(time.time() - started, 3))
+
+    if prepared['recipients']:
+        mail_server = _get_semaphore(semaphores, ('smtp', mailer.SMTP_HOST, mailer.SMTP_PORT), mailer.SMTP_POOL_SIZE)
+        try:
+            mail_queue = mailer.MailQueue()
+            for message, envelope in mailer.batch_recipients(prepared['message_factory'], prepared['recipients']):
+                mail_queue.put(message, envelope)
+            sent, failed = await send_queued_messages(executor, mail_server, mail_queue)
+        except Exception as e:
+            return dict(result, status='failed', message=str(e), seconds=round(time.time() - started, 3))
+        result.update(sent=len(sent), failed=failed)
+
+    status = 'failed' if result['failed'] and not result['sent'] else 'success'
+    return dict(result, status=status, seconds=round(time.time() - started, 3))
+
+
+async def _dispatch_all(executor, jobs, connection_limit, app=None):
+    semaphores = {}
+    return await asyncio.gather(*[dispatch_publication(executor, semaphores, publication_id, connection_ids
+                                                       , connection_limit, app)
+                                  for publication_id, connection_ids in jobs])
+
+
+# marks each publication as run before anything is sent, unless its last_run_on changed since it was read (another
+# run, e.g. an overlapping cron job, claimed it first). Returns the publications claimed
+def claim_publications(publications, started_on):
+    claimed = []
+    for publication in publications:
+        query = models.Publication.query.filter(models.Publication.id == publication.id)
+        if publication.last_run_on is None:
+            query = query.filter(models.Publication.last_run_on.is_(None))
+        else:
+            query = query.filter(models.Publication.last_run_on == publication.last_run_on)
+        if query.update({'last_run_on': started_on}, synchronize_session=False):
+            claimed.append(publication)
+    db.session.commit()
+    return claimed
+
+
+# one event loop drives every publication; only the blocking calls (warehouse queries, rendering, SMTP)
+# take a thread, and only while they run. Returns one result dict per publication claimed
+def run_publications(publications, workers=PUBLISH_WORKERS, connection_limit=PUBLISH_CONNECTION_LIMIT):
+    started_on = datetime.utcnow()
+    publications = claim_publications(publications, started_on)
+    if not publications:
+        return []
+    jobs = [(publication.id, {chart.connection_id for chart in publication.publication_report.charts})
+            for publication in publications]
+    app = current_app._get_current_object()
+
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        results = loop.run_until_complete(_dispatch_all(executor, jobs, connection_limit, app))
+    finally:
+        executor.shutdown()
+        loop.close()
+
+    for publication, result in zip(publications, results):
+        publication.last_run_on = started_on
+        if result['status'] == 'success':
+            publication.last_data_version = result['data_version']
+            publication.publication_report.last_published = started_on
+        db.session.add(models.PublicationRun(publication=publication, started_on=started_on, status=result['status']
+                                             , duration_seconds=result['seconds'], data_version=result['data_version']
+                                             , sent=result['sent'], failed=len(result['failed'])
+                                             , message=result.get('message')))
+    db.session.commit()
+    return results
+
+
+# called on a schedule (see `flask run_publications`)
+def run_due_publications(now=None):
+    return run_publications([publication for publication in models.Publication.query.all()
+                             if publication_is_due(publication, now)])
@@ -0,0 +1,196 @@
+import os
+import uuid
+import json
+import html
+import hashlib
+import threading
+from numbers import Number
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from backend.app import db, config, models, snapshot, admission, helper_functions as helpers
+
+FRAGMENT_CACHE_DIR = config.get('flask', 'fragment_cache_dir', fallback='/tmp/narratus/fragments')
+RENDER_PROCESSES = config.getint('flask', 'render_processes', fallback=os.cpu_count() or 1)
+CHART_QUERY_WORKERS = config.getint('flask', 'chart_query_workers', fallback=8)
+CHART_QUERIES_PER_CONNECTION = config.getint('flask', 'chart_queries_per_connection', fallback=2)
+CHART_WIDTH = 600
+CHART_HEIGHT = 300
+TABLE_ROW_LIMIT = 500
+
+_executor = None
+
+
+# chart rasterisation is cpu bound, so fragments render in a process pool shared by all requests
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=RENDER_PROCESSES)
+    return _executor
+
+
+def get_data_hash(chart, rows):
+    digest = hashlib.sha256()
+    digest.update('{}\n{}\n'.format(chart.type, chart.parameters).encode('utf-8'))
+    digest.update(json.dumps(rows, default=str, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_fragment_path(chart_id, data_hash):
+    return os.path.join(FRAGMENT_CACHE_DIR, 'chart_{}_{}.html'.format(chart_id, data_hash))
+
+
+# x is the first column, y the first numeric column after it
+def _get_series(rows):
+    if not rows:
+        return [], []
+    names = list(rows[0].keys())
+    numeric = [name for name in names[1:] if all(isinstance(row[name], Number) or row[name] is None for row in rows)]
+    if not numeric:
+        return [], []
+    return [str(row[names[0]]) for row in rows], [row[numeric[0]] or 0 for row in rows]
+
+
+def render_bar_svg(labels, values):
+    peak = max([abs(value) for value in values] + [1])
+    bar_width = CHART_WIDTH / max(len(values), 1)
+    bars = []
+    for i, (label, value) in enumerate(zip(labels, values)):
+        height = abs(value) / peak * (CHART_HEIGHT - 20)
+        bars.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}"><title>{}: {}</title></rect>'.format(
+            i * bar_width + 1, CHART_HEIGHT - 20 - height, max(bar_width - 2, 1), height
+            , html.escape(label), value))
+    return '<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">{}</svg>'.format(
+        CHART_WIDTH, CHART_HEIGHT, ''.join(bars))
+
+
+def render_line_svg(labels, values):
+    low, high = min(values + [0]), max(values + [1])
+    step = CHART_WIDTH / max(len(values) - 1, 1)
+    points = ' '.join('{:.1f},{:.1f}'.format(i * step, (CHART_HEIGHT - 20) * (1 - (value - low) / ((high - low) or 1)))
+                      for i, value in enumerate(values))
+    return ('<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">'
+            '<polyline fill="none" stroke="black" points="{}"/></svg>').format(CHART_WIDTH, CHART_HEIGHT, points)
+
+
+def render_table_html(rows):
+    if not rows:
+        return '<table></table>'
+    names = list(rows[0].keys())
+    header = ''.join('<th>{}</th>'.format(html.escape(str(name))) for name in names)
+    body = ''.join('<tr>{}</tr>'.format(''.join('<td>{}</td>'.format(html.escape(str(row[name]))) for name in names))
+                   for row in rows[:TABLE_ROW_LIMIT])
+    return '<table><thead><tr>{}</tr></thead><tbody>{}</tbody></table>'.format(header, body)
+
+
+# runs in a worker process: only plain values go in and come out
+def render_chart_fragment(chart_id, label, chart_type, rows):
+    labels, values = _get_series(rows)
+    if chart_type == 'bar' and values:
+        figure = render_bar_svg(labels, values)
+    elif chart_type == 'line' and values:
+        figure = render_line_svg(labels, values)
+    else:
+        figure = ''
+    return '<section class="chart" id="chart-{}"><h2>{}</h2>{}{}</section>'.format(
+        chart_id, html.escape(label or ''), figure, render_table_html(rows))
+
+
+# a hit counts as a use, artifact_store.collect_fragment_garbage evicts least recently used fragments first
+def read_cached_fragment(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as fragment_file:
+            fragment = fragment_file.read()
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return fragment
+
+
+def write_cached_fragment(path, fragment):
+    os.makedirs(FRAGMENT_CACHE_DIR, exist_ok=True)
+    temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temp_path, 'w', encoding='utf-8') as fragment_file:
+        fragment_file.write(fragment)
+    os.replace(temp_path, path)
+
+
+# runs on a worker thread in the caller's app context and workload class, with the thread's own session. The
+# semaphore is the chart connection's, so a report never has more than CHART_QUERIES_PER_CONNECTION queries in
+# flight on one warehouse
+def _get_chart_rows(app, workload, semaphore, chart_id, parameters):
+    with app.app_context(), admission.workload_class(workload), semaphore:
+        try:
+            rows, _ = snapshot.get_chart_data(models.Chart.query.get(chart_id), parameters)
+            return rows
+        finally:
+            db.session.remove()
+
+
+# returns list of (chart, rows, data hash) in report order. Query parameter values come from the report's parameters,
+# overridden by any provided, and override those of each chart. Charts are fetched concurrently
+def get_report_chart_data(report, parameters=None):
+    report_parameters = helpers.get_query_parameters(report.parameters)
+    report_parameters.update(parameters or {})
+    charts = list(report.charts)
+    if len(charts) <= 1:
+        all_rows = [snapshot.get_chart_data(chart, report_parameters)[0] for chart in charts]
+    else:
+        app = current_app._get_current_object()
+        workload = admission.get_workload_class()
+        per_connection = {}
+        for chart in charts:
+            per_connection[chart.connection_id] = per_connection.get(chart.connection_id, 0) + 1
+        semaphores = {connection_id: threading.BoundedSemaphore(CHART_QUERIES_PER_CONNECTION)
+                      for connection_id in per_connection}
+        workers = min(CHART_QUERY_WORKERS
+                      , sum(min(count, CHART_QUERIES_PER_CONNECTION) for count in per_connection.values()))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_get_chart_rows, app, workload, semaphores[chart.connection_id], chart.id
+                                       , report_parameters) for chart in charts]
+            all_rows = [future.result() for future in futures]
+    return [(chart, rows, get_data_hash(chart, rows)) for chart, rows in zip(charts, all_rows)]
+
+
+# returns list of (cache path, cached fragment or future), one per chart, in report order
+def submit_fragments(chart_data):
+    pending = []
+    for chart, rows, data_hash in chart_data:
+        path = get_fragment_path(chart.id, data_hash)
+        fragment = read_cached_fragment(path)
+        if fragment is None:
+            fragment = get_executor().submit(render_chart_fragment, chart.id, chart.label, chart.type, rows)
+        pending.append((path, fragment))
+    return pending
+
+
+# yields the document piece by piece; every fragment is already rendering by the time the header goes out
+def stream_report_html(report, chart_data=None):
+    pending = submit_fragments(chart_data or get_report_chart_data(report))
+    yield '<!DOCTYPE html><html><head><meta charset="utf-8"><title>{0}</title></head><body><h1>{0}</h1>'.format(
+        html.escape(report.label or ''))
+    for path, fragment in pending:
+        if not isinstance(fragment, str):
+            fragment = fragment.result()
+            write_cached_fragment(path, fragment)
+        yield fragment
+    yield '</body></html>'
+
+
+def render_report_html(report, chart_data=None):
+    return ''.join(stream_report_html(report, chart_data))
+
+
+def render_report_pdf(report, chart_data=None):
+    try:
+        import weasyprint
+    except ImportError:
+        raise AssertionError('PDF rendering requires the weasyprint package')
+    return weasyprint.HTML(string=render_report_html(report, chart_data)).write_pdf()
+
+
+def render_report(report, output_format='html', chart_data=None):
+    if output_format == 'html':
+        return render_report_html(report, chart_data).encode('utf-8')
+    if output_format == 'pdf':
+        return render_report_pdf(report, chart_data)
+    raise AssertionError('Report format not recognized')
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import zlib
+import base64
+import struct
+from uuid import UUID, uuid4
+from decimal import Decimal
+from datetime import date, datetime, time as time_of_day, timedelta, timezone
+from backend.app import config
+
+# Query results shared by every worker process through files on local disk. An entry is
+#   MAGIC | created_at, row_count, byte_count, truncated | zlib-compressed JSON of [column names, column values]
+# Columns are stored rather than row dictionaries so names aren't repeated per row. Values JSON can't hold are
+# stored tagged, as {"$type": ..., "value": ...}, so driver types (datetimes, Decimals, bytes) come back intact. The
+# format can't run code when read, and the cache directory is private to the user running the app: files owned by
+# anyone else are ignored. Entries are published with an atomic rename, so a reader never sees half of one
+RESULT_CACHE_DIR = config.get('flask', 'result_cache_dir', fallback='/tmp/narratus/result_cache')
+RESULT_CACHE_MAX_BYTES = config.getint('flask', 'result_cache_max_bytes', fallback=256 * 1024 * 1024)
+RESULT_CACHE_MAX_ENTRY_BYTES = config.getint('flask', 'result_cache_max_entry_bytes', fallback=16 * 1024 * 1024)
+RESULT_CACHE_TTL_SECONDS = config.getint('flask', 'result_cache_ttl_seconds', fallback=300)
+EVICTION_INTERVAL_SECONDS = 10
+MAGIC = b'NRCACHE2'
+HEADER_FORMAT = '>dQQ?'
+COMPRESSION_LEVEL = 1
+
+_last_eviction = 0
+
+
+# entries fan out over 256 subdirectories so no one directory gets huge
+def get_entry_path(key):
+    return os.path.join(RESULT_CACHE_DIR, key[:2], '{}.cache'.format(key))
+
+
+def _get_utc_offset(value):
+    offset = value.utcoffset()
+    return None if offset is None else offset.total_seconds()
+
+
+def _get_timezone(offset):
+    return None if offset is None else timezone(timedelta(seconds=offset))
+
+
+# dicts and lists (e.g. json columns) are tagged too, so a value is only ever decoded from a dict this wrote
+def encode_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {'$type': 'datetime', 'value': [value.year, value.month, value.day, value.hour, value.minute
+                                               , value.second, value.microsecond, _get_utc_offset(value)]}
+    if isinstance(value, date):
+        return {'$type': 'date', 'value': value.toordinal()}
+    if isinstance(value, time_of_day):
+        return {'$type': 'time', 'value': [value.hour, value.minute, value.second, value.microsecond
+                                           , _get_utc_offset(value)]}
+    if isinstance(value, timedelta):
+        return {'$type': 'timedelta', 'value': [value.days, value.seconds, value.microseconds]}
+    if isinstance(value, Decimal):
+        return {'$type': 'decimal', 'value': str(value)}
+    if isinstance(value, UUID):
+        return {'$type': 'uuid', 'value': str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'$type': 'bytes', 'value': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, (dict, list, tuple)):
+        return {'$type': 'json', 'value': value}
+    raise AssertionError('Type {} cannot be cached'.format(type(value).__name__))
+
+
+def decode_value(value):
+    if not isinstance(value, dict):
+        return value
+    kind, stored = value['$type'], value['value']
+    if kind == 'datetime':
+        return datetime(*stored[:7], tzinfo=_get_timezone(stored[7]))
+    if kind == 'date':
+        return date.fromordinal(stored)
+    if kind == 'time':
+        return time_of_day(*stored[:4], tzinfo=_get_timezone(stored[4]))
+    if kind == 'timedelta':
+        return timedelta(days=stored[0], seconds=stored[1], microseconds=stored[2])
+    if kind == 'decimal':
+        return Decimal(stored)
+    if kind == 'uuid':
+        return UUID(stored)
+    if kind == 'bytes':
+        return base64.b64decode(stored)
+    if kind == 'json':
+        return stored
+    raise AssertionError('File is not a cached result')
+
+
+def encode_entry(rows, row_count, byte_count, truncated, created_at=None):
+    names = list(rows[0].keys()) if rows else []
+    columns = [[encode_value(row[name]) for row in rows] for name in names]
+    body = zlib.compress(json.dumps([names, columns]).encode('utf-8'), COMPRESSION_LEVEL)
+    header = struct.pack(HEADER_FORMAT, created_at or time.time(), row_count, byte_count, truncated)
+    return MAGIC + header + body
+
+
+def decode_entry(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise AssertionError('File is not a cached result')
+    body_start = len(MAGIC) + struct.calcsize(HEADER_FORMAT)
+    created_at, row_count, byte_count, truncated = struct.unpack(HEADER_FORMAT, data[len(MAGIC):body_start])
+    names, columns = json.loads(zlib.decompress(data[body_start:]).decode('utf-8'))
+    columns = [[decode_value(value) for value in column] for column in columns]
+    rows = [dict(zip(names, values)) for values in zip(*columns)] if names else []
+    return {'created_at': created_at, 'rows': rows, 'row_count': row_count, 'byte_count': byte_count,
+            'truncated': truncated}
+
+
+def _make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+
+# returns the entry as a dictionary, or None when there isn't one younger than max_age seconds (and, if given,
+# created at or after created_since). A hit counts as a use, eviction removes least recently used entries first
+def read_entry(key, max_age=None, created_since=None):
+    max_age = RESULT_CACHE_TTL_SECONDS if max_age is None else max_age
+    path = get_entry_path(key)
+    try:
+        with open(path, 'rb') as entry_file:
+            if os.fstat(entry_file.fileno()).st_uid != os.getuid():
+                return None
+            entry = decode_entry(entry_file.read())
+    except (FileNotFoundError, AssertionError, struct.error, zlib.error, ValueError, TypeError, KeyError
+            , IndexError):
+        return None
+
+    if created_since is not None:
+        if entry['created_at'] < created_since:
+            return None
+    elif entry['created_at'] + max_age < time.time():
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return entry
+
+
+# returns True if the result was cached; results over RESULT_CACHE_MAX_ENTRY_BYTES, or holding a type the format
+# can't store, aren't
+def publish_entry(key, rows, row_count, byte_count, truncated):
+    try:
+        data = encode_entry(rows, row_count, byte_count, truncated)
+    except (AssertionError, TypeError, ValueError):
+        return False
+    if len(data) > RESULT_CACHE_MAX_ENTRY_BYTES:
+        return False
+
+    path = get_entry_path(key)
+    _make_private_dir(RESULT_CACHE_DIR)
+    _make_private_dir(os.path.dirname(path))
+    temp_path = '{}.{}.tmp'.format(path, uuid4().hex)
+    with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as entry_file:
+        entry_file.write(data)
+    os.replace(temp_path, path)
+    evict_if_due()
+    return True
+
+
+# eviction scans the whole cache, so each worker runs it at most once per EVICTION_INTERVAL_SECONDS
+def evict_if_due(now=None):
+    global _last_eviction
+    now = now or time.time()
+    if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+        return 0
+    _last_eviction = now
+    return evict(now=now)
+
+
+# deletes entries unused for the ttl, then the least recently used until under max_bytes; returns number deleted
+def evict(max_bytes=None, now=None):
+    max_bytes = RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    cutoff = (now or time.time()) - RESULT_CACHE_TTL_SECONDS
+
+    entries = []
+    for directory, _, file_names in os.walk(RESULT_CACHE_DIR):
+        for file_name in file_names:
+            if not file_name.endswith('.cache'):
+                continue
+            path = os.path.join(directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    deleted = 0
+    total_bytes = sum(size for _, size, _ in entries)
+    for used_on, size, path in sorted(entries):
+        if used_on >= cutoff and total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        deleted += 1
+    return deleted
@@ -0,0 +1,110 @@
+import os
+import re
+import time
+import uuid
+import math
+from backend.app import config, snapshot
+from backend.app import connection_manager as cm
+
+# Large results are spooled to a local file in the snapshot format as they are fetched, then served a page at a
+# time against a result handle. Handles expire once they go unread for RESULT_IDLE_SECONDS
+RESULT_SPOOL_DIR = config.get('flask', 'result_spool_dir', fallback='/tmp/narratus/results')
+RESULT_IDLE_SECONDS = config.getint('flask', 'result_idle_seconds', fallback=600)
+RESULT_PAGE_SIZE = config.getint('flask', 'result_page_size', fallback=500)
+MAX_PAGE_SIZE = 10000
+
+
+# handles are only found under the id of the user who created them, so one user can't page through another's results
+def get_result_path(user_id, result_handle):
+    if not isinstance(result_handle, str) or not re.match('^[0-9a-f]{32}$', result_handle):
+        raise AssertionError('Result handle not recognized')
+    return os.path.join(RESULT_SPOOL_DIR, 'user_{}_{}.snap'.format(user_id, result_handle))
+
+
+def get_page_size(page_size=None):
+    if page_size is None:
+        return RESULT_PAGE_SIZE
+    if not isinstance(page_size, int) or not 0 < page_size <= MAX_PAGE_SIZE:
+        raise AssertionError('page_size must be an integer from 1 to {}'.format(MAX_PAGE_SIZE))
+    return page_size
+
+
+# returns (result handle, result metadata); each fetched batch is written as a row group and then dropped
+def spool_select_statement(user_id, conn, raw_sql, parameters=None, declarations=None, role=None):
+    result_handle = uuid.uuid4().hex
+    writer = snapshot.SnapshotWriter(get_result_path(user_id, result_handle))
+    row_limit, byte_limit = cm.get_result_limits(conn, role)
+    result = cm.QueryResult(row_limit=row_limit, byte_limit=byte_limit)
+    try:
+        for result in cm.fetch_select_statement(conn, raw_sql, parameters, declarations, role):
+            writer.write_row_group(result.take_rows())
+        writer.close(truncated=result.truncated)
+    except Exception:
+        writer.discard()
+        raise
+    return result_handle, result.get_metadata()
+
+
+def spool_query_object(user_id, conn, query, parameters=None, role=None):
+    declarations = query.get_parameters()
+    return spool_select_statement(user_id, conn, query.raw_sql, cm.get_parameter_values(declarations, parameters)
+                                  , declarations, role)
+
+
+def result_is_expired(path, now=None):
+    return os.stat(path).st_mtime + RESULT_IDLE_SECONDS < (now or time.time())
+
+
+# returns dictionary with one page of rows plus what the client needs to page through the rest; reading a page
+# resets the handle's idle timeout
+def get_result_page(user_id, result_handle, page=1, page_size=None, now=None):
+    path = get_result_path(user_id, result_handle)
+    page_size = get_page_size(page_size)
+    if not isinstance(page, int) or page < 1:
+        raise AssertionError('page must be a positive integer')
+    start = (page - 1) * page_size
+    try:
+        if result_is_expired(path, now):
+            _remove(path)
+            raise AssertionError('Result handle has expired')
+        header = snapshot.read_snapshot_header(path)
+        rows = snapshot.read_snapshot(path, start=start, stop=start + page_size)
+        os.utime(path)
+    except FileNotFoundError:
+        raise AssertionError('Result handle not recognized')
+    return {
+        'result_handle': result_handle,
+        'results': rows,
+        'page': page,
+        'page_size': page_size,
+        'page_count': math.ceil(header['row_count'] / page_size),
+        'row_count': header['row_count'],
+        'truncated': header.get('truncated', False),
+    }
+
+
+def release_result(user_id, result_handle):
+    _remove(get_result_path(user_id, result_handle))
+
+
+# deletes results unread for RESULT_IDLE_SECONDS, returns number deleted
+def collect_expired_results(now=None):
+    if not os.path.isdir(RESULT_SPOOL_DIR):
+        return 0
+    deleted = 0
+    for file_name in os.listdir(RESULT_SPOOL_DIR):
+        path = os.path.join(RESULT_SPOOL_DIR, file_name)
+        try:
+            if result_is_expired(path, now):
+                _remove(path)
+                deleted += 1
+        except FileNotFoundError:
+            continue
+    return deleted
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,11 +1,13 @@
-from flask import request, jsonify
+from flask import request, jsonify, Response
 from flask_jwt_extended import jwt_required, create_access_token, get_raw_jwt, get_jwt_claims
 from sqlalchemy import exc
 from backend.app.models import (
-    User, Usergroup, Connection, SqlQuery, Chart, Report, Publication, Contact, TokenBlacklist
+    User, Usergroup, Connection, SqlQuery, Chart, Report, Publication, Contact, TokenBlacklist, SyncJob,
+    DerivedTable
 )
 from backend.app import app, jwt, db
-from backend.app import helper_functions as helpers, connection_manager as cm
+from backend.app import helper_functions as helpers, connection_manager as cm, snapshot, data_copy, table_sync, pipeline
+from backend.app import artifact_store, publisher, result_spool, admission, pool_maintainer
 
 
 @jwt.user_claims_loader
@@ -31,6 +33,12 @@ def check_if_token_in_blacklist(decrypted_token):
     return jti in blacklist
 
 
+# each worker warms pools for recently used connections and keeps their health current in the background
+@app.before_first_request
+def start_pool_maintainer():
+    pool_maintainer.start_maintainer()
+
+
 @app.route('/', methods=['GET', 'POST'])
 def test():
     if request.method == 'POST':
@@ -82,7 +90,8 @@ def get_all_users():
         return jsonify(msg="User must have admin privileges to view other users", success=0), 401
 
     users_object_list = User.query.all()
-    users_dict_list = list(map(lambda user: user.get_dict(), users_object_list))
+    fields, expand = helpers.get_projection(request.args)
+    users_dict_list = list(map(lambda user: user.get_dict(fields=fields, expand=expand), users_object_list))
     return jsonify(msg="All users provided.", users=users_dict_list, success=1), 200
 
 
@@ -186,7 +195,8 @@ def get_all_usergroups():
         return jsonify(msg="User must have admin privileges to view all usergroups.", success=0), 401
 
     usergroups_raw = Usergroup.query.all()
-    usergroups = list(map(lambda usergroup: usergroup.get_dict(), usergroups_raw))
+    fields, expand = helpers.get_projection(request.args)
+    usergroups = list(map(lambda usergroup: usergroup.get_dict(fields=fields, expand=expand), usergroups_raw))
     return jsonify(msg="All usergroups provided", usergroups=usergroups, success=1), 200
 
 
@@ -279,6 +289,20 @@ def delete_usergroup():
     return jsonify(msg='Usergroup deleted.', success=1), 200
 
 
+@app.route('/api/home', methods=['GET'])
+@jwt_required
+def home():
+    requester = get_jwt_claims()
+    user = helpers.get_record_from_id(User, requester['user_id'])
+
+    if not user:
+        return jsonify(msg='User not recognized.', success=0), 400
+
+    fields, _ = helpers.get_projection(request.args)
+    home_objects = helpers.get_home_objects(user, fields)
+    return jsonify(msg='Home page objects provided.', success=1, **home_objects), 200
+
+
 @app.route('/api/get_all_connections', methods=['GET'])
 @jwt_required
 def get_all_connections():
@@ -288,7 +312,8 @@ def get_all_connections():
         return jsonify(msg='Must be admin to view all connections.', success=0), 401
 
     raw_connections = Connection.query.all()
-    connections = list(map(lambda obj: obj.get_dict(), raw_connections))
+    fields, expand = helpers.get_projection(request.args)
+    connections = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_connections))
     return jsonify(msg='Connections provided.', connections=connections, success=1), 200
 
 
@@ -390,10 +415,215 @@ def test_connection():
     if not connection:
         return jsonify(msg='Connection not recognized.', success=0), 400
 
-    if cm.test_connection(connection):
-        return jsonify(msg='Successfully connected to database.', success=1), 200
+    # answered from the last health check when it's recent, unless refresh is requested
+    health = cm.test_connection(connection, refresh=bool(request_data.get('refresh')))
+    if health['healthy']:
+        return jsonify(msg='Successfully connected to database.', **health, success=1), 200
     else:
-        return jsonify(msg='Failed to connect to database.', success=0), 400
+        return jsonify(msg='Failed to connect to database.', **health, success=0), 400
+
+
+@app.route('/api/test_connections', methods=['POST'])
+@jwt_required
+def test_connections():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+    connection_ids = request_data.get('connection_ids', None)
+    requester = get_jwt_claims()
+
+    # only admin may test connections in bulk
+    if not helpers.requester_has_admin_privileges(requester):
+        return jsonify(msg='Must be admin to test connections in bulk.', success=0), 401
+
+    # every connection is tested when no connection_ids are given
+    if connection_ids is None:
+        connections = Connection.query.all()
+    elif not isinstance(connection_ids, list):
+        return jsonify(msg='connection_ids must be a list.', success=0), 400
+    else:
+        connections = Connection.query.filter(Connection.id.in_(connection_ids)).all()
+        if len(connections) != len(set(connection_ids)):
+            return jsonify(msg='Connection not recognized.', success=0), 400
+
+    health = cm.test_connections(connections, refresh=bool(request_data.get('refresh')))
+    results = [dict(health[connection.id], connection_id=connection.id, label=connection.label)
+               for connection in connections]
+    healthy_count = sum(1 for result in results if result['healthy'])
+    return jsonify(msg='Connections tested.', connections=results, healthy_count=healthy_count
+                   , unhealthy_count=len(results) - healthy_count, success=1), 200
+
+
+@app.route('/api/copy_table', methods=['POST'])
+@jwt_required
+def copy_table():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+    requester = get_jwt_claims()
+    source_connection = helpers.get_record_from_id(Connection, request_data.get('source_connection_id'))
+    target_connection = helpers.get_record_from_id(Connection, request_data.get('target_connection_id'))
+    source_table = request_data.get('source_table')
+
+    # viewer users cannot write to databases
+    if not helpers.requester_has_write_privileges(requester):
+        return jsonify(msg='Current user does not have permission to copy data.', success=0), 401
+
+    if not source_connection or not target_connection:
+        return jsonify(msg='Source or target connection not recognized.', success=0), 400
+    if not source_table:
+        return jsonify(msg='Source table not provided.', success=0), 400
+
+    try:
+        workers = data_copy.validate_workers(request_data.get('workers', 1))
+        if workers > 1:
+            stats = data_copy.parallel_copy_table(source_conn=source_connection, target_conn=target_connection
+                                                  , source_table=source_table
+                                                  , target_table=request_data.get('target_table')
+                                                  , workers=workers
+                                                  , truncate_target=request_data.get('truncate_target', False))
+        else:
+            stats = data_copy.copy_table(source_conn=source_connection, target_conn=target_connection
+                                         , source_table=source_table, target_table=request_data.get('target_table')
+                                         , truncate_target=request_data.get('truncate_target', False))
+        return jsonify(msg='Data copied.', stats=stats, success=1), 200
+    except AssertionError as e:
+        return jsonify(msg='Error: {}. Data not copied'.format(e), success=0), 400
+    except exc.SQLAlchemyError as e:
+        return jsonify(msg='Error: {}. Data not copied'.format(e), success=0), 400
+
+
+@app.route('/api/get_all_sync_jobs', methods=['GET'])
+@jwt_required
+def get_all_sync_jobs():
+    requester = get_jwt_claims()
+
+    if not helpers.requester_has_admin_privileges(requester):
+        return jsonify(msg='Must be admin to view all sync jobs.', success=0), 401
+
+    raw_sync_jobs = SyncJob.query.all()
+    fields, expand = helpers.get_projection(request.args)
+    sync_jobs = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_sync_jobs))
+    return jsonify(msg='Sync jobs provided.', sync_jobs=sync_jobs, success=1), 200
+
+
+@app.route('/api/create_sync_job', methods=['POST'])
+@jwt_required
+def create_sync_job():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+
+    requester = get_jwt_claims()
+    requester_is_active = requester['is_active']
+
+    if not requester_is_active:
+        return jsonify(msg="Your account is no longer active.", success=0), 401
+
+    if not helpers.requester_has_write_privileges(requester):
+        return jsonify(msg="User must have write privileges to create new sync jobs.", success=0), 401
+
+    try:
+        sync_job = helpers.create_sync_job_from_dict(request_data, requester['user_id'])
+        return jsonify(msg='Sync job successfully created.', sync_job=sync_job.get_dict(), success=1), 200
+    except AssertionError as exception_message:
+        return jsonify(msg='Error: {}. Sync job not created'.format(exception_message), success=0), 400
+
+
+@app.route('/api/run_sync_job', methods=['POST'])
+@jwt_required
+def run_sync_job():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+    sync_job_id = request_data.get('sync_job_id', None)
+    requester = get_jwt_claims()
+    sync_job = helpers.get_record_from_id(SyncJob, sync_job_id)
+
+    if not sync_job_id:
+        return jsonify(msg='Sync job ID not provided.', success=0), 400
+    if not sync_job:
+        return jsonify(msg='Sync job not recognized.', success=0), 400
+
+    if not helpers.requester_has_write_privileges(requester):
+        return jsonify(msg='Current user does not have permission to run sync jobs.', success=0), 401
+
+    run = table_sync.run_sync_job(sync_job)
+    if run.status == 'success':
+        return jsonify(msg='Sync job complete.', run=run.get_dict(), success=1), 200
+    return jsonify(msg='Error: {}. Sync job failed'.format(run.message), run=run.get_dict(), success=0), 400
+
+
+@app.route('/api/get_all_derived_tables', methods=['GET'])
+@jwt_required
+def get_all_derived_tables():
+    requester = get_jwt_claims()
+
+    if not helpers.requester_has_admin_privileges(requester):
+        return jsonify(msg='Must be admin to view all derived tables.', success=0), 401
+
+    raw_derived_tables = DerivedTable.query.all()
+    fields, expand = helpers.get_projection(request.args)
+    derived_tables = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_derived_tables))
+    return jsonify(msg='Derived tables provided.', derived_tables=derived_tables, success=1), 200
+
+
+@app.route('/api/create_derived_table', methods=['POST'])
+@jwt_required
+def create_derived_table():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+
+    requester = get_jwt_claims()
+    requester_is_active = requester['is_active']
+
+    if not requester_is_active:
+        return jsonify(msg="Your account is no longer active.", success=0), 401
+
+    if not helpers.requester_has_write_privileges(requester):
+        return jsonify(msg="User must have write privileges to create new derived tables.", success=0), 401
+
+    try:
+        derived_table = helpers.create_derived_table_from_dict(request_data, requester['user_id'])
+        return jsonify(msg='Derived table successfully created.', derived_table=derived_table.get_dict()
+                       , success=1), 200
+    except AssertionError as exception_message:
+        return jsonify(msg='Error: {}. Derived table not created'.format(exception_message), success=0), 400
+
+
+@app.route('/api/run_pipeline', methods=['POST'])
+@jwt_required
+def run_pipeline():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+    connection_id = request_data.get('connection_id', None)
+    requester = get_jwt_claims()
+    connection = helpers.get_record_from_id(Connection, connection_id)
+
+    if not connection_id:
+        return jsonify(msg='Connection ID not provided.', success=0), 400
+    if not connection:
+        return jsonify(msg='Connection not recognized.', success=0), 400
+
+    if not helpers.requester_has_write_privileges(requester):
+        return jsonify(msg='Current user does not have permission to run pipelines.', success=0), 401
+
+    try:
+        results = pipeline.run_pipeline(connection, workers=request_data.get('workers', pipeline.DEFAULT_WORKERS)
+                                        , force=request_data.get('force', False))
+        return jsonify(msg='Pipeline complete.', results=results, success=1), 200
+    except AssertionError as e:
+        return jsonify(msg='Error: {}. Pipeline stopped'.format(e), success=0), 400
+    except exc.SQLAlchemyError as e:
+        return jsonify(msg='Error: {}. Pipeline stopped'.format(e), success=0), 400
 
 
 @app.route('/api/get_all_queries', methods=['GET'])
@@ -405,7 +635,8 @@ def get_all_queries():
         return jsonify(msg='Must be admin to view all queries.', success=0), 401
 
     raw_queries = SqlQuery.query.all()
-    queries = list(map(lambda obj: obj.get_dict(), raw_queries))
+    fields, expand = helpers.get_projection(request.args)
+    queries = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_queries))
     return jsonify(msg='Queries provided.', queries=queries, success=1), 200
 
 
@@ -501,7 +732,8 @@ def get_all_charts():
         return jsonify(msg='Must be admin to view all queries.', success=0), 401
 
     raw_charts = Chart.query.all()
-    charts = list(map(lambda obj: obj.get_dict(), raw_charts))
+    fields, expand = helpers.get_projection(request.args)
+    charts = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_charts))
     return jsonify(msg='Charts provided.', charts=charts, success=1), 200
 
 
@@ -587,6 +819,38 @@ def delete_chart():
     return jsonify(msg='Chart deleted.', success=1), 200
 
 
+@app.route('/api/get_chart_data', methods=['POST'])
+@jwt_required
+def get_chart_data():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    requester = get_jwt_claims()
+    request_data = request.get_json()
+    chart_id = request_data.get('chart_id', None)
+    chart = helpers.get_record_from_id(Chart, chart_id)
+
+    if not chart_id:
+        return jsonify(msg='Chart ID not provided.', success=0), 400
+    if not chart:
+        return jsonify(msg='Chart not recognized.', success=0), 400
+
+    try:
+        results, refreshed_on = snapshot.get_chart_data(chart, request_data.get('parameters', None)
+                                                        , role=requester.get('role')
+                                                        , use_cache=bool(request_data.get('use_cache', False)))
+        return jsonify(msg='Results provided.', results=results, snapshot_refreshed_on=refreshed_on
+                       , **results.get_metadata(), success=1), 200
+    except AssertionError as e:
+        return jsonify(msg='Error: {}. No results'.format(e), success=0), 400
+    except admission.AdmissionRejected as e:
+        return jsonify(msg='Error: {}. Try again shortly'.format(e), success=0), 429, {'Retry-After': '1'}
+    except cm.ConnectionUnavailable as e:
+        return jsonify(msg='Error: {}. Try again later'.format(e), success=0), 503
+    except exc.OperationalError as e:
+        return jsonify(msg='Error: {}. No results'.format(e), success=0), 400
+
+
 @app.route('/api/get_all_reports', methods=['GET'])
 @jwt_required
 def get_all_reports():
@@ -597,7 +861,8 @@ def get_all_reports():
         return jsonify(msg='Must be admin to view all reports.', success=0), 401
 
     raw_reports = Report.query.all()
-    reports = list(map(lambda obj: obj.get_dict(), raw_reports))
+    fields, expand = helpers.get_projection(request.args)
+    reports = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_reports))
     return jsonify(msg='Reports provided.', reports=reports, success=1), 200
 
 
@@ -681,6 +946,37 @@ def delete_report():
     return jsonify(msg='Report deleted.', success=1), 200
 
 
+@app.route('/api/render_report', methods=['POST'])
+@jwt_required
+def render_report():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+    report_id = request_data.get('report_id', None)
+    output_format = request_data.get('format', 'html')
+    report = helpers.get_record_from_id(Report, report_id)
+
+    if not report_id:
+        return jsonify(msg='Report ID not provided.', success=0), 400
+    if not report:
+        return jsonify(msg='Report not recognized.', success=0), 400
+
+    mimetypes = {'html': 'text/html', 'pdf': 'application/pdf'}
+    if output_format not in mimetypes:
+        return jsonify(msg='Report format not recognized.', success=0), 400
+
+    try:
+        path = artifact_store.get_report_artifact(report, output_format, request_data.get('parameters', None))
+        return Response(artifact_store.read_artifact(path), mimetype=mimetypes[output_format]), 200
+    except AssertionError as e:
+        return jsonify(msg='Error: {}. Report not rendered'.format(e), success=0), 400
+    except admission.AdmissionRejected as e:
+        return jsonify(msg='Error: {}. Try again shortly'.format(e), success=0), 429, {'Retry-After': '1'}
+    except cm.ConnectionUnavailable as e:
+        return jsonify(msg='Error: {}. Try again later'.format(e), success=0), 503
+
+
 @app.route('/api/get_all_publications', methods=['GET'])
 @jwt_required
 def get_all_publications():
@@ -691,7 +987,8 @@ def get_all_publications():
         return jsonify(msg='Must be admin to view all publications.', success=0), 401
 
     raw_publications = Publication.query.all()
-    publications = list(map(lambda obj: obj.get_dict(), raw_publications))
+    fields, expand = helpers.get_projection(request.args)
+    publications = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_publications))
     return jsonify(msg='Publications provided.', publications=publications, success=1), 200
 
 
@@ -775,6 +1072,36 @@ def delete_publication():
     return jsonify(msg='Publication deleted.', success=1), 200
 
 
+@app.route('/api/run_publication', methods=['POST'])
+@jwt_required
+def run_publication():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    request_data = request.get_json()
+    publication_id = request_data.get('publication_id', None)
+    requester = get_jwt_claims()
+    publication = helpers.get_record_from_id(Publication, publication_id)
+
+    if not publication_id:
+        return jsonify(msg='Publication ID not provided.', success=0), 400
+    if not publication:
+        return jsonify(msg='Publication not recognized.', success=0), 400
+
+    if not helpers.requester_has_write_privileges(requester):
+        return jsonify(msg='Current user does not have permission to run publications.', success=0), 401
+
+    results = publisher.run_publications([publication])
+    if not results:
+        return jsonify(msg='Publication is already being run.', success=0), 400
+    result = results[0]
+    if result['status'] == 'success':
+        return jsonify(msg='Publication sent.', result=result, success=1), 200
+    if result['status'] == 'skipped':
+        return jsonify(msg='Report data unchanged, publication skipped.', result=result, success=1), 200
+    return jsonify(msg='Error: {}. Publication failed'.format(result.get('message')), result=result, success=0), 400
+
+
 @app.route('/api/get_all_contacts', methods=['GET'])
 @jwt_required
 def get_all_contacts():
@@ -785,7 +1112,8 @@ def get_all_contacts():
         return jsonify(msg='Must have write privileges to view all contacts.', success=0), 401
 
     raw_contacts = Contact.query.all()
-    contacts = list(map(lambda obj: obj.get_dict(), raw_contacts))
+    fields, expand = helpers.get_projection(request.args)
+    contacts = list(map(lambda obj: obj.get_dict(fields=fields, expand=expand), raw_contacts))
     return jsonify(msg='Contacts provided.', contacts=contacts, success=1), 200
 
 
@@ -882,7 +1210,9 @@ def execute_sql():
     connection_id = request_data.get('connection_id', None)
     connection = helpers.get_record_from_id(Connection, connection_id)
 
-    raw_sql = query.raw_sql or request_data.get('raw_sql')
+    parameters = request_data.get('parameters', None)
+
+    raw_sql = query.raw_sql if query else request_data.get('raw_sql')
 
     # viewer users cannot execute arbitrary sql
     if not helpers.requester_has_write_privileges(requester):
@@ -890,11 +1220,91 @@ def execute_sql():
 
     if raw_sql:
         try:
-            results = cm.execute_select_statement(conn=connection, raw_sql=raw_sql)
-            return jsonify(msg='Results provided.', results=results, success=1), 200
+            # a page_size spools the full result and returns its first page with a handle for fetching the rest
+            if request_data.get('page_size'):
+                page_size = result_spool.get_page_size(request_data.get('page_size'))
+                if query:
+                    result_handle, _ = result_spool.spool_query_object(
+                        requester['user_id'], conn=connection, query=query, parameters=parameters
+                        , role=requester.get('role'))
+                else:
+                    result_handle, _ = result_spool.spool_select_statement(
+                        requester['user_id'], conn=connection, raw_sql=raw_sql, parameters=parameters
+                        , role=requester.get('role'))
+                page = result_spool.get_result_page(requester['user_id'], result_handle, page_size=page_size)
+                return jsonify(msg='Results provided.', **page, success=1), 200
+
+            # saved queries bind their declared, typed parameters; ad hoc sql binds the values as given. use_cache
+            # accepts a recently cached result, whose age is reported as cached_on
+            use_cache = bool(request_data.get('use_cache', False))
+            if query:
+                results = cm.execute_query_object(conn=connection, query=query, parameters=parameters
+                                                  , role=requester.get('role'), use_cache=use_cache)
+            else:
+                results = cm.execute_select_statement(conn=connection, raw_sql=raw_sql, parameters=parameters
+                                                      , role=requester.get('role'), use_cache=use_cache)
+            return jsonify(msg='Results provided.', results=results, **results.get_metadata(), success=1), 200
         except AssertionError as e:
             return jsonify(msg='Error: {}. No results'.format(e), success=0), 400
+        except admission.AdmissionRejected as e:
+            return jsonify(msg='Error: {}. Try again shortly'.format(e), success=0), 429, {'Retry-After': '1'}
+        except cm.ConnectionUnavailable as e:
+            return jsonify(msg='Error: {}. Try again later'.format(e), success=0), 503
         except exc.OperationalError as e:
             return jsonify(msg='Error: {}. No results'.format(e), success=0), 400
     else:
         return jsonify(msg='No SQL provided.', success=0), 400
+
+
+@app.route('/api/get_workload_metrics', methods=['GET'])
+@jwt_required
+def get_workload_metrics():
+    requester = get_jwt_claims()
+
+    # only admin may see how connections are loaded
+    if not helpers.requester_has_admin_privileges(requester):
+        return jsonify(msg='Must be admin to view workload metrics.', success=0), 401
+
+    connections = {str(connection_id): status for connection_id, status in admission.get_admission_status().items()}
+    return jsonify(msg='Workload metrics provided.', connections=connections, success=1), 200
+
+
+@app.route('/api/get_result_page', methods=['POST'])
+@jwt_required
+def get_result_page():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    requester = get_jwt_claims()
+    request_data = request.get_json()
+    result_handle = request_data.get('result_handle', None)
+
+    if not result_handle:
+        return jsonify(msg='Result handle not provided.', success=0), 400
+
+    try:
+        page = result_spool.get_result_page(requester['user_id'], result_handle, page=request_data.get('page', 1)
+                                            , page_size=request_data.get('page_size', None))
+        return jsonify(msg='Results provided.', **page, success=1), 200
+    except AssertionError as e:
+        return jsonify(msg='Error: {}. No results'.format(e), success=0), 400
+
+
+@app.route('/api/release_result', methods=['POST'])
+@jwt_required
+def release_result():
+    if not request.is_json:
+        return jsonify(msg="Missing JSON in request", success=0), 400
+
+    requester = get_jwt_claims()
+    request_data = request.get_json()
+    result_handle = request_data.get('result_handle', None)
+
+    if not result_handle:
+        return jsonify(msg='Result handle not provided.', success=0), 400
+
+    try:
+        result_spool.release_result(requester['user_id'], result_handle)
+        return jsonify(msg='Result released.', success=1), 200
+    except AssertionError as e:
+        return jsonify(msg='Error: {}. Result not released'.format(e), success=0), 400
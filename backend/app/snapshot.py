@@ -0,0 +1,323 @@
+import os
+import uuid
+import json
+import mmap
+import zlib
+import struct
+import shutil
+import hashlib
+from datetime import datetime, timedelta
+from backend.app import db, config, models, admission, helper_functions as helpers
+from backend.app import connection_manager as cm
+
+# Snapshot files are laid out column by column so a chart only has to inflate the fields it plots:
+#   MAGIC | header length (8 bytes) | JSON header | zlib block for each column of each row group
+# Incremental refreshes append a row group; compaction folds them back into one.
+SNAPSHOT_DIR = config.get('flask', 'snapshot_dir', fallback='/tmp/narratus/snapshots')
+MAGIC = b'NRSNAP01'
+HEADER_LENGTH_FORMAT = '>Q'
+COMPRESSION_LEVEL = 6
+MAX_ROW_GROUPS = 24
+
+
+# returns the chart's query parameter values, with any provided values overriding those in chart.parameters
+def get_chart_parameters(chart, parameters=None):
+    chart_parameters = helpers.get_query_parameters(chart.parameters)
+    chart_parameters.update(parameters or {})
+    return chart_parameters
+
+
+# each set of parameter values gets its own snapshot, keyed on the values once bound to their declared types
+def get_snapshot_path(chart, parameters=None):
+    file_name = 'query_{}_connection_{}'.format(chart.sql_query_id, chart.connection_id)
+    declarations = chart.sql_query.get_parameters()
+    if declarations:
+        values = cm.get_parameter_values(declarations, get_chart_parameters(chart, parameters))
+        digest = hashlib.sha256(json.dumps(values, default=str, sort_keys=True).encode('utf-8'))
+        file_name += '_' + digest.hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, file_name + '.snap')
+
+
+# takes list of row dictionaries, returns dictionary of column name -> list of values
+def rows_to_columns(rows):
+    column_names = list(rows[0].keys()) if rows else []
+    return {name: [row.get(name) for row in rows] for name in column_names}
+
+
+def columns_to_rows(columns):
+    column_names = list(columns.keys())
+    row_count = len(columns[column_names[0]]) if column_names else 0
+    return [{name: columns[name][i] for name in column_names} for i in range(row_count)]
+
+
+def _compress_row_group(rows, offset):
+    blocks = []
+    row_group = {'row_count': len(rows), 'columns': []}
+    for name, values in rows_to_columns(rows).items():
+        block = zlib.compress(json.dumps(values, default=str).encode('utf-8'), COMPRESSION_LEVEL)
+        row_group['columns'].append({'name': name, 'offset': offset, 'length': len(block)})
+        blocks.append(block)
+        offset += len(block)
+    return row_group, blocks
+
+
+def _write_file(path, header, blocks):
+    header_bytes = json.dumps(header, default=str).encode('utf-8')
+
+    # write to a temporary file and rename so readers never see a half-written snapshot
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(MAGIC)
+        snapshot_file.write(struct.pack(HEADER_LENGTH_FORMAT, len(header_bytes)))
+        snapshot_file.write(header_bytes)
+        for block in blocks:
+            snapshot_file.write(block)
+    os.replace(temp_path, path)
+
+
+def write_snapshot(path, rows, refreshed_on=None, watermark=None):
+    row_group, blocks = _compress_row_group(rows, offset=0)
+    header = {
+        'row_count': len(rows),
+        'refreshed_on': (refreshed_on or datetime.utcnow()).isoformat(),
+        'watermark': watermark,
+        'truncated': getattr(rows, 'truncated', False),
+        'row_groups': [row_group],
+    }
+    _write_file(path, header, blocks)
+    return header
+
+
+# writes a snapshot one row group at a time, for results too large to hold in memory. Blocks go to a scratch file
+# until close, when the header (which needs every block's offset) is known
+class SnapshotWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.blocks_path = '{}.{}.blocks'.format(path, uuid.uuid4().hex)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.blocks_file = open(self.blocks_path, 'w+b')
+        self.row_groups = []
+        self.row_count = 0
+        self.offset = 0
+
+    def write_row_group(self, rows):
+        if not rows:
+            return
+        row_group, blocks = _compress_row_group(rows, offset=self.offset)
+        for block in blocks:
+            self.blocks_file.write(block)
+            self.offset += len(block)
+        self.row_groups.append(row_group)
+        self.row_count += len(rows)
+
+    def close(self, refreshed_on=None, watermark=None, truncated=False):
+        header = {
+            'row_count': self.row_count,
+            'refreshed_on': (refreshed_on or datetime.utcnow()).isoformat(),
+            'watermark': watermark,
+            'truncated': truncated,
+            'row_groups': self.row_groups,
+        }
+        header_bytes = json.dumps(header, default=str).encode('utf-8')
+        temp_path = '{}.{}.tmp'.format(self.path, uuid.uuid4().hex)
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(MAGIC)
+            snapshot_file.write(struct.pack(HEADER_LENGTH_FORMAT, len(header_bytes)))
+            snapshot_file.write(header_bytes)
+            self.blocks_file.seek(0)
+            shutil.copyfileobj(self.blocks_file, snapshot_file)
+        os.replace(temp_path, self.path)
+        self.discard()
+        return header
+
+    def discard(self):
+        self.blocks_file.close()
+        if os.path.exists(self.blocks_path):
+            os.remove(self.blocks_path)
+
+
+# adds rows as a new row group; existing compressed blocks are copied as-is rather than re-encoded
+def append_to_snapshot(path, rows, refreshed_on=None, watermark=None):
+    with open(path, 'rb') as snapshot_file:
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            header = _read_header(buffer)
+            existing_data = buffer[header.pop('data_start'):]
+
+    header['refreshed_on'] = (refreshed_on or datetime.utcnow()).isoformat()
+    # rows cut off from an increment are never fetched by later ones, so the snapshot stays marked truncated
+    header['truncated'] = header.get('truncated', False) or getattr(rows, 'truncated', False)
+    if rows:
+        row_group, blocks = _compress_row_group(rows, offset=len(existing_data))
+        header['row_groups'].append(row_group)
+        header['row_count'] += len(rows)
+        header['watermark'] = watermark
+    else:
+        blocks = []
+
+    _write_file(path, header, [existing_data] + blocks)
+    return header
+
+
+def _read_header(buffer):
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise AssertionError('File is not a snapshot')
+    length_start = len(MAGIC)
+    header_start = length_start + struct.calcsize(HEADER_LENGTH_FORMAT)
+    header_length = struct.unpack(HEADER_LENGTH_FORMAT, buffer[length_start:header_start])[0]
+    header = json.loads(buffer[header_start:header_start + header_length].decode('utf-8'))
+    header['data_start'] = header_start + header_length
+    return header
+
+
+def read_snapshot_header(path):
+    with open(path, 'rb') as snapshot_file:
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return _read_header(buffer)
+
+
+# returns list of row dictionaries, only inflating the requested columns and the row groups overlapping rows
+# start to stop
+def read_snapshot(path, column_names=None, start=0, stop=None):
+    rows = []
+    with open(path, 'rb') as snapshot_file:
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            header = _read_header(buffer)
+            row_group_start = 0
+            for row_group in header['row_groups']:
+                row_group_stop = row_group_start + row_group['row_count']
+                if row_group_stop <= start or (stop is not None and row_group_start >= stop):
+                    row_group_start = row_group_stop
+                    continue
+                columns = {}
+                for column in row_group['columns']:
+                    if column_names and column['name'] not in column_names:
+                        continue
+                    block_start = header['data_start'] + column['offset']
+                    block = buffer[block_start:block_start + column['length']]
+                    columns[column['name']] = json.loads(zlib.decompress(block).decode('utf-8'))
+                group_rows = columns_to_rows(columns)
+                rows.extend(group_rows[max(start - row_group_start, 0):
+                                       None if stop is None else stop - row_group_start])
+                row_group_start = row_group_stop
+    return rows
+
+
+# rewrites all row groups as one, called once incremental appends have fragmented the file
+def compact_snapshot(path):
+    header = read_snapshot_header(path)
+    rows = read_snapshot(path)
+    row_group, blocks = _compress_row_group(rows, offset=0)
+    header.pop('data_start')
+    header['row_groups'] = [row_group]
+    _write_file(path, header, blocks)
+    return header
+
+
+def snapshot_exists(chart, parameters=None):
+    return os.path.exists(get_snapshot_path(chart, parameters))
+
+
+def get_watermark(rows, watermark_column):
+    values = [row[watermark_column] for row in rows if row.get(watermark_column) is not None]
+    return max(values) if values else None
+
+
+def get_incremental_sql(raw_sql, watermark_column):
+    return 'select * from ({}) narratus_source where {} > :watermark'.format(raw_sql, watermark_column)
+
+
+def refresh_chart_snapshot(chart, parameters=None):
+    refreshed_on = datetime.utcnow()
+    path = get_snapshot_path(chart, parameters)
+    query_parameters = get_chart_parameters(chart, parameters)
+    watermark_column = chart.sql_query.watermark_column
+    header = read_snapshot_header(path) if os.path.exists(path) else None
+
+    if watermark_column and header and header.get('watermark') is not None:
+        raw_sql = get_incremental_sql(chart.sql_query.raw_sql, watermark_column)
+        declarations = chart.sql_query.get_parameters()
+        values = cm.get_parameter_values(declarations, query_parameters)
+        values['watermark'] = header['watermark']
+        rows = cm.execute_select_statement(conn=chart.chart_connection, raw_sql=raw_sql
+                                           , parameters=values, declarations=declarations, use_cache=False)
+        watermark = get_watermark(rows, watermark_column)
+        header = append_to_snapshot(path, rows, refreshed_on=refreshed_on, watermark=watermark)
+        if len(header['row_groups']) > MAX_ROW_GROUPS:
+            compact_snapshot(path)
+    else:
+        rows = cm.execute_query_object(conn=chart.chart_connection, query=chart.sql_query
+                                       , parameters=query_parameters, use_cache=False)
+        watermark = get_watermark(rows, watermark_column) if watermark_column else None
+        write_snapshot(path, rows, refreshed_on=refreshed_on, watermark=watermark)
+
+    # snapshot_refreshed_on tracks the chart's own parameter values, which are what the schedule refreshes
+    if not parameters:
+        chart.snapshot_refreshed_on = refreshed_on
+        db.session.commit()
+    return chart
+
+
+def snapshot_is_due(chart, now=None):
+    now = now or datetime.utcnow()
+    if not chart.snapshot_refreshed_on or not snapshot_exists(chart):
+        return True
+    return chart.snapshot_refreshed_on + timedelta(minutes=chart.refresh_minutes or 0) <= now
+
+
+# called on a schedule (see `flask refresh_snapshots`), returns (refreshed charts, [(chart, error message)]). A chart
+# that can't be refreshed (e.g. its query needs a parameter the chart doesn't supply) doesn't stop the others. Runs
+# as batch work, so interactive queries on the same connections go first
+def refresh_due_snapshots():
+    refreshed = []
+    failed = []
+    with admission.workload_class('batch'):
+        for chart in models.Chart.query.filter(models.Chart.materialized.is_(True)).all():
+            try:
+                if snapshot_is_due(chart):
+                    refreshed.append(refresh_chart_snapshot(chart))
+            except Exception as e:
+                db.session.rollback()
+                failed.append((chart, str(e)))
+    return refreshed, failed
+
+
+def get_snapshot_refreshed_on(path):
+    return datetime.strptime(read_snapshot_header(path)['refreshed_on'][:19], '%Y-%m-%dT%H:%M:%S')
+
+
+# snapshots for parameter values other than the chart's own are not refreshed on schedule, so they are checked on read
+def variant_snapshot_is_due(chart, path, now=None):
+    now = now or datetime.utcnow()
+    if not os.path.exists(path):
+        return True
+    return get_snapshot_refreshed_on(path) + timedelta(minutes=chart.refresh_minutes or 0) <= now
+
+
+# snapshots are refreshed under the connection's limits; the requester's role limits are applied when they are read
+def read_limited_snapshot(chart, path, role=None):
+    row_limit, byte_limit = cm.get_result_limits(chart.chart_connection, role)
+    rows = cm.QueryResult(read_snapshot(path), row_limit, byte_limit)
+    rows.truncated = rows.truncated or read_snapshot_header(path).get('truncated', False)
+    return rows
+
+
+# returns (rows, refreshed_on); serves from the snapshot when the chart is materialized. parameters override the
+# query parameter values in chart.parameters. use_cache lets a chart that isn't materialized use a cached result
+def get_chart_data(chart, parameters=None, role=None, use_cache=False):
+    declared_names = [declaration['name'] for declaration in chart.sql_query.get_parameters()]
+    parameters = {name: value for name, value in (parameters or {}).items() if name in declared_names}
+    if chart.materialized and not parameters:
+        if not snapshot_exists(chart):
+            refresh_chart_snapshot(chart)
+        return read_limited_snapshot(chart, get_snapshot_path(chart), role), chart.snapshot_refreshed_on
+    if chart.materialized:
+        path = get_snapshot_path(chart, parameters)
+        if variant_snapshot_is_due(chart, path):
+            refresh_chart_snapshot(chart, parameters)
+        return read_limited_snapshot(chart, path, role), get_snapshot_refreshed_on(path)
+    rows = cm.execute_query_object(conn=chart.chart_connection, query=chart.sql_query
+                                   , parameters=get_chart_parameters(chart, parameters), role=role
+                                   , use_cache=use_cache)
+    return rows, None
@@ -0,0 +1,108 @@
+import re
+import hashlib
+import functools
+from backend.app import config
+
+# Recognizes "the same query" in two senses:
+#   canonical form - comments and layout dropped, everything else exact. Texts with the same canonical form return
+#                    the same result, so it keys result caching and single-flight
+#   normalized form - also lowercased, with literals replaced by ? and IN lists of them collapsed, so every run of a
+#                    query with different values has one fingerprint (for telemetry)
+# Only comments no database runs are dropped: MySQL's executable /*! */ comments and optimizer hints /*+ */ are kept,
+# and -- starts a comment only when followed by whitespace (MySQL reads "select 1--1" as 1 - -1). Texts are
+# tokenized once and the forms memoized, as the same few texts arrive over and over
+FINGERPRINT_CACHE_SIZE = config.getint('flask', 'sql_fingerprint_cache_size', fallback=4096)
+PLACEHOLDER = '?'
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<whitespace>\s+)
+  | (?P<hint>/\*[!+].*?(?:\*/|$))
+  | (?P<comment>--(?=\s|$)[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<string>[nNeEbBxX]?'(?:[^']|'')*'|\$(?P<tag>\w*)\$.*?\$(?P=tag)\$)
+  | (?P<identifier>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[^\W\d][\w$]*)
+  | (?P<operator>::|<=|>=|<>|!=|\|\||:=)
+  | (?P<parameter>:\w+|%\(\w+\)s|%s|\?|@\w+)
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+LITERAL_KINDS = ('string', 'number')
+IGNORED_KINDS = ('whitespace', 'comment')
+
+
+# returns list of (kind, text) for every token, comments and whitespace included
+def tokenize(raw_sql):
+    return [(match.lastgroup, match.group()) for match in TOKEN_PATTERN.finditer(raw_sql)]
+
+
+# "( ? , ? , ? )" -> "( ? )", so an IN list's length doesn't change the fingerprint
+def _collapse_placeholder_lists(texts):
+    collapsed = []
+    i = 0
+    while i < len(texts):
+        if texts[i] == '(':
+            j = i + 1
+            while j + 1 < len(texts) and texts[j] == PLACEHOLDER and texts[j + 1] == ',':
+                j += 2
+            if j > i + 1 and j + 1 < len(texts) and texts[j] == PLACEHOLDER and texts[j + 1] == ')':
+                collapsed.extend(['(', PLACEHOLDER, ')'])
+                i = j + 2
+                continue
+        collapsed.append(texts[i])
+        i += 1
+    return collapsed
+
+
+# returns (canonical text, normalized text, first keyword) for the sql
+@functools.lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def _analyze(raw_sql):
+    canonical = []
+    normalized = []
+    first_keyword = None
+    for kind, text in tokenize(raw_sql):
+        if kind in IGNORED_KINDS:
+            continue
+        if not canonical and kind == 'word':
+            first_keyword = text.lower()
+        canonical.append(text)
+        if kind in LITERAL_KINDS:
+            normalized.append(PLACEHOLDER)
+        elif kind == 'word':
+            normalized.append(text.lower())
+        else:
+            normalized.append(text)
+    while canonical and canonical[-1] == ';':
+        canonical.pop()
+        normalized.pop()
+    return ' '.join(canonical), ' '.join(_collapse_placeholder_lists(normalized)), first_keyword
+
+
+def canonicalize(raw_sql):
+    return _analyze(raw_sql)[0]
+
+
+def normalize(raw_sql):
+    return _analyze(raw_sql)[1]
+
+
+# the statement's first keyword lowercased (comments skipped), or None when it doesn't start with one
+def get_first_keyword(raw_sql):
+    return _analyze(raw_sql)[2]
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# identifies the query's shape, whatever its literal values
+def fingerprint(raw_sql):
+    return _hash(normalize(raw_sql))
+
+
+# identifies the statement exactly, ignoring comments and layout
+def get_statement_key(raw_sql):
+    return _hash(canonicalize(raw_sql))
+
+
+def get_cache_info():
+    return _analyze.cache_info()
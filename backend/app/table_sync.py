@@ -0,0 +1,183 @@
+import time
+from datetime import datetime, date, timedelta
+from functools import partial
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, mysql
+from backend.app import db, models
+from backend.app import connection_manager as cm, data_copy
+
+WATERMARK_FORMATS = ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+
+
+# high water marks are stored as text, convert back to the watermark column's type before binding
+def parse_watermark(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type in (int, float):
+        return python_type(value)
+    if python_type in (datetime, date):
+        for watermark_format in WATERMARK_FORMATS:
+            try:
+                return datetime.strptime(value, watermark_format)
+            except ValueError:
+                continue
+    return value
+
+
+def write_batch_with_on_conflict(key_columns, engine, table, column_names, batch):
+    statement = postgresql.insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={name: statement.excluded[name] for name in column_names if name not in key_columns})
+    with engine.begin() as connection:
+        connection.execute(statement, [dict(zip(column_names, row)) for row in batch])
+
+
+def write_batch_with_on_duplicate_key(key_columns, engine, table, column_names, batch):
+    statement = mysql.insert(table)
+    statement = statement.on_duplicate_key_update(
+        **{name: statement.inserted[name] for name in column_names if name not in key_columns})
+    with engine.begin() as connection:
+        connection.execute(statement, [dict(zip(column_names, row)) for row in batch])
+
+
+def write_batch_with_insert_or_replace(key_columns, engine, table, column_names, batch):
+    with engine.begin() as connection:
+        connection.execute(table.insert().prefix_with('OR REPLACE'), [dict(zip(column_names, row)) for row in batch])
+
+
+def get_merge_sql(engine, table, column_names, key_columns):
+    preparer = engine.dialect.identifier_preparer
+    quoted = {name: preparer.quote(name) for name in column_names}
+    source_columns = ', '.join(':p{} AS {}'.format(i, quoted[name]) for i, name in enumerate(column_names))
+    from_dual = ' FROM dual' if engine.dialect.name == 'oracle' else ''
+    alias = ' ' if engine.dialect.name == 'oracle' else ' AS '
+    on_clause = ' AND '.join('t.{0} = s.{0}'.format(quoted[name]) for name in key_columns)
+    update_clause = ', '.join('t.{0} = s.{0}'.format(quoted[name]) for name in column_names
+                              if name not in key_columns)
+    insert_columns = ', '.join(quoted[name] for name in column_names)
+    insert_values = ', '.join('s.{}'.format(quoted[name]) for name in column_names)
+
+    merge_sql = 'MERGE INTO {table}{alias}t USING (SELECT {source}{dual}){alias}s ON ({on})'.format(
+        table=preparer.format_table(table), alias=alias, source=source_columns, dual=from_dual, on=on_clause)
+    if update_clause:
+        merge_sql += ' WHEN MATCHED THEN UPDATE SET {}'.format(update_clause)
+    merge_sql += ' WHEN NOT MATCHED THEN INSERT ({}) VALUES ({})'.format(insert_columns, insert_values)
+    if engine.dialect.name == 'mssql':
+        merge_sql += ';'
+    return merge_sql
+
+
+# oracle and sql server: MERGE executed once per batch with executemany
+def write_batch_with_merge(key_columns, engine, table, column_names, batch):
+    merge_sql = sqlalchemy.sql.text(get_merge_sql(engine, table, column_names, key_columns))
+    with engine.begin() as connection:
+        connection.execute(merge_sql, [{'p{}'.format(i): value for i, value in enumerate(row)} for row in batch])
+
+
+UPSERT_WRITERS = {
+    'postgresql': write_batch_with_on_conflict,
+    'mysql': write_batch_with_on_duplicate_key,
+    'sqlite': write_batch_with_insert_or_replace,
+    'oracle': write_batch_with_merge,
+    'mssql': write_batch_with_merge,
+}
+
+
+def get_upsert_writer(engine, key_columns):
+    if engine.dialect.name not in UPSERT_WRITERS:
+        raise AssertionError('Upsert is not supported for {}'.format(engine.dialect.name))
+    return partial(UPSERT_WRITERS[engine.dialect.name], key_columns)
+
+
+# copies rows past the job's high water mark and advances it; returns number of rows copied. Batches commit as they
+# are written but the mark only advances once they all have, so an append first deletes the target's rows past the
+# mark: whatever a failed run left there is copied again rather than duplicated. That needs the watermark column
+# on the target too (upserts are idempotent already)
+def sync_table(sync_job, batch_size=data_copy.DEFAULT_BATCH_SIZE):
+    source_engine = cm.create_engine(sync_job.source_connection)
+    target_engine = cm.create_engine(sync_job.target_connection
+                                     , **data_copy.get_target_options(sync_job.target_connection))
+    try:
+        source = data_copy.reflect_table(source_engine, sync_job.source_table)
+        target = data_copy.reflect_table(target_engine, sync_job.target_table or sync_job.source_table)
+        column_names = [column.name for column in source.columns if column.name in target.columns]
+
+        if sync_job.watermark_column not in source.columns:
+            raise AssertionError('watermark_column not found in source table')
+        watermark = source.columns[sync_job.watermark_column]
+        low = parse_watermark(watermark, sync_job.high_water_mark)
+
+        # the upper bound is fixed first so rows inserted mid-sync with a later watermark are left for the next run. A
+        # row that becomes visible only after this (e.g. committed late by a long transaction) with a watermark at or
+        # below high is never picked up, so watermarks should be assigned at commit or only ever increase
+        max_statement = sqlalchemy.select([sqlalchemy.func.max(watermark)])
+        if low is not None:
+            max_statement = max_statement.where(watermark > low)
+        with source_engine.connect() as connection:
+            high = connection.execute(max_statement).scalar()
+        if high is None:
+            return 0
+
+        select_statement = sqlalchemy.select([source.columns[name] for name in column_names]).where(watermark <= high)
+        if low is not None:
+            select_statement = select_statement.where(watermark > low)
+
+        if sync_job.mode == 'upsert':
+            key_columns = sync_job.get_key_columns() or [column.name for column in target.primary_key.columns]
+            if not key_columns:
+                raise AssertionError('Upsert requires key_columns or a primary key on the target table')
+            write_batch = get_upsert_writer(target_engine, key_columns)
+        else:
+            if sync_job.watermark_column not in target.columns:
+                raise AssertionError('Append sync requires the target table to have the watermark column')
+            target_watermark = target.columns[sync_job.watermark_column]
+            clear_statement = target.delete().where(target_watermark <= high)
+            if low is not None:
+                clear_statement = clear_statement.where(target_watermark > low)
+            with target_engine.begin() as connection:
+                connection.execute(clear_statement)
+            write_batch = None
+
+        stats = data_copy.copy_rows(source_engine, target_engine, select_statement, target, column_names
+                                    , batch_size=batch_size, write_batch=write_batch)
+        sync_job.high_water_mark = str(high)
+        return stats['rows']
+    finally:
+        source_engine.dispose()
+        target_engine.dispose()
+
+
+def run_sync_job(sync_job):
+    run = models.SyncRun(sync_job=sync_job, started_on=datetime.utcnow())
+    started = time.time()
+    try:
+        run.rows = sync_table(sync_job)
+        run.status = 'success'
+    except Exception as e:
+        run.rows = 0
+        run.status = 'failed'
+        run.message = str(e)
+
+    run.duration_seconds = round(time.time() - started, 3)
+    sync_job.last_run_on = run.started_on
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def sync_job_is_due(sync_job, now=None):
+    now = now or datetime.utcnow()
+    if not sync_job.last_run_on:
+        return True
+    return sync_job.last_run_on + timedelta(minutes=sync_job.refresh_minutes or 0) <= now
+
+
+# called on a schedule (see `flask run_sync_jobs`), returns list of runs
+def run_due_sync_jobs():
+    return [run_sync_job(sync_job) for sync_job in models.SyncJob.query.all() if sync_job_is_due(sync_job)]
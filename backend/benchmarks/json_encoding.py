@@ -0,0 +1,66 @@
+# Times encoding of query-result-shaped payloads with Flask's default encoder and both backends of
+# FastJSONEncoder. Needs the app config, like the app itself.
+#
+#   python -m backend.benchmarks.json_encoding [--rows 10000 100000 1000000]
+import time
+import uuid
+import argparse
+from decimal import Decimal
+from datetime import datetime, date, timedelta
+from flask import json
+from flask.json import JSONEncoder
+from backend.app import json_encoding
+
+
+def make_rows(row_count):
+    started = datetime(2018, 1, 1)
+    return [{
+        'id': i,
+        'label': 'row {}'.format(i),
+        'amount': Decimal(i) / 100,
+        'ratio': i / 7,
+        'created_on': started + timedelta(seconds=i),
+        'day': date(2018, 1, 1) + timedelta(days=i % 365),
+        'external_id': uuid.UUID(int=i),
+        'active': i % 2 == 0,
+        'note': None,
+    } for i in range(row_count)]
+
+
+def time_encoder(encoder, payload, backend=None):
+    original_backend = json_encoding.JSON_BACKEND
+    json_encoding.JSON_BACKEND = backend or original_backend
+    try:
+        started = time.perf_counter()
+        body = json.dumps(payload, cls=encoder, sort_keys=True)
+        return time.perf_counter() - started, len(body)
+    except TypeError as e:
+        return None, str(e)
+    finally:
+        json_encoding.JSON_BACKEND = original_backend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    encoders = [('flask default', JSONEncoder, None),
+                ('fast, stdlib backend', json_encoding.FastJSONEncoder, 'stdlib')]
+    if json_encoding.orjson is not None:
+        encoders.append(('fast, orjson backend', json_encoding.FastJSONEncoder, 'orjson'))
+
+    for row_count in args.rows:
+        payload = {'msg': 'Query results provided.', 'results': make_rows(row_count), 'success': 1}
+        print('{} rows:'.format(row_count))
+        for label, encoder, backend in encoders:
+            seconds, size = time_encoder(encoder, payload, backend)
+            if seconds is None:
+                print('  {:<22} fails: {}'.format(label, size))
+            else:
+                print('  {:<22} {:>8.3f} s  {:>12,} bytes  {:>10,.0f} rows/s'.format(
+                    label, seconds, size, row_count / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Seeds a large permissions catalog and prints query plans and timings for the lookups done by
+# User.get_authorized_ids, before and after the usergroup_id-first indexes.
+#
+#   python backend/benchmarks/perms_indexes.py [--db-uri sqlite:////tmp/perms.db] [--resources 50000]
+import time
+import random
+import argparse
+import sqlalchemy as sa
+
+RESOURCE_TABLES = [('connection_perms', 'connection_id'), ('query_perms', 'query_id'),
+                   ('chart_perms', 'chart_id'), ('report_perms', 'report_id')]
+EXPLAIN = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN ', 'mysql': 'EXPLAIN '}
+
+
+def create_tables(metadata):
+    tables = {'user_perms': sa.Table('user_perms', metadata,
+                                     sa.Column('user_id', sa.Integer, primary_key=True),
+                                     sa.Column('usergroup_id', sa.Integer, primary_key=True))}
+    for table_name, column_name in RESOURCE_TABLES:
+        tables[table_name] = sa.Table(table_name, metadata,
+                                      sa.Column(column_name, sa.Integer, primary_key=True),
+                                      sa.Column('usergroup_id', sa.Integer, primary_key=True))
+    tables['chart'] = sa.Table('chart', metadata,
+                               sa.Column('id', sa.Integer, primary_key=True),
+                               sa.Column('sql_query_id', sa.Integer),
+                               sa.Column('connection_id', sa.Integer))
+    tables['contact'] = sa.Table('contact', metadata,
+                                 sa.Column('id', sa.Integer, primary_key=True),
+                                 sa.Column('public', sa.Boolean))
+    return tables
+
+
+def get_indexes(tables):
+    indexes = [sa.Index('ix_user_perms_usergroup_id_user_id', tables['user_perms'].c.usergroup_id,
+                        tables['user_perms'].c.user_id)]
+    for table_name, column_name in RESOURCE_TABLES:
+        table = tables[table_name]
+        indexes.append(sa.Index('ix_{}_usergroup_id_{}'.format(table_name, column_name), table.c.usergroup_id,
+                                table.c[column_name]))
+    indexes.append(sa.Index('ix_chart_sql_query_id', tables['chart'].c.sql_query_id))
+    indexes.append(sa.Index('ix_chart_connection_id', tables['chart'].c.connection_id))
+    indexes.append(sa.Index('ix_contact_public', tables['contact'].c.public))
+    return indexes
+
+
+def seed(engine, tables, resources, usergroups, groups_per_resource, batch_size=10000):
+    random.seed(0)
+    with engine.begin() as connection:
+        for table_name, column_name in RESOURCE_TABLES:
+            rows = [{column_name: resource_id, 'usergroup_id': usergroup_id}
+                    for resource_id in range(1, resources + 1)
+                    for usergroup_id in random.sample(range(1, usergroups + 1), groups_per_resource)]
+            for i in range(0, len(rows), batch_size):
+                connection.execute(tables[table_name].insert(), rows[i:i + batch_size])
+        connection.execute(tables['user_perms'].insert(),
+                           [{'user_id': user_id, 'usergroup_id': usergroup_id}
+                            for user_id in range(1, usergroups + 1)
+                            for usergroup_id in {user_id, random.randint(1, usergroups)}])
+        connection.execute(tables['chart'].insert(),
+                           [{'id': i, 'sql_query_id': random.randint(1, resources),
+                             'connection_id': random.randint(1, 50)} for i in range(1, resources + 1)])
+        connection.execute(tables['contact'].insert(),
+                           [{'id': i, 'public': i % 50 == 0} for i in range(1, resources + 1)])
+
+
+def get_lookups(tables, usergroup_ids):
+    lookups = []
+    for table_name, column_name in RESOURCE_TABLES:
+        table = tables[table_name]
+        lookups.append((table_name, sa.select([table]).where(table.c.usergroup_id.in_(usergroup_ids))))
+    lookups.append(('user_perms (members)', sa.select([tables['user_perms']])
+                    .where(tables['user_perms'].c.usergroup_id == usergroup_ids[0])))
+    lookups.append(('chart.sql_query_id', sa.select([tables['chart']]).where(tables['chart'].c.sql_query_id == 1)))
+    lookups.append(('chart.connection_id', sa.select([tables['chart']]).where(tables['chart'].c.connection_id == 1)))
+    lookups.append(('contact.public', sa.select([tables['contact']]).where(tables['contact'].c.public == sa.true())))
+    return lookups
+
+
+def report(engine, lookups, repeat):
+    explain = EXPLAIN.get(engine.dialect.name, 'EXPLAIN ')
+    with engine.connect() as connection:
+        for label, statement in lookups:
+            compiled = statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+            plan = [' | '.join(str(value) for value in row) for row in connection.execute(explain + str(compiled))]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                connection.execute(statement).fetchall()
+            milliseconds = (time.perf_counter() - started) / repeat * 1000
+            print('  {:<24} {:>8.3f} ms  {}'.format(label, milliseconds, '; '.join(plan)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-uri', default='sqlite:////tmp/narratus_perms_benchmark.db')
+    parser.add_argument('--resources', type=int, default=50000)
+    parser.add_argument('--usergroups', type=int, default=2000)
+    parser.add_argument('--groups-per-resource', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.db_uri)
+    metadata = sa.MetaData()
+    tables = create_tables(metadata)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    seed(engine, tables, args.resources, args.usergroups, args.groups_per_resource)
+
+    lookups = get_lookups(tables, list(range(1, 6)))
+    print('before (primary keys only):')
+    report(engine, lookups, args.repeat)
+
+    for index in get_indexes(tables):
+        index.create(bind=engine)
+    if engine.dialect.name in ('sqlite', 'postgresql'):
+        with engine.connect() as connection:
+            connection.execute('ANALYZE')
+
+    print('after (usergroup_id-first covering indexes):')
+    report(engine, lookups, args.repeat)
+    metadata.drop_all(engine)
+
+
+if __name__ == '__main__':
+    main()
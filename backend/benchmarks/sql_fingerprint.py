@@ -0,0 +1,48 @@
+# Times fingerprinting of query texts of a few sizes, uncached (every text new) and memoized (the same text again).
+# Needs the app config, like the app itself.
+#
+#   python -m backend.benchmarks.sql_fingerprint [--iterations 10000]
+import time
+import argparse
+from backend.app import sql_fingerprint
+
+QUERIES = {
+    'short': "select * from orders where id = 42",
+    'medium': """
+        -- daily revenue by region
+        select r.name as region, date(o.created_on) as day, sum(o.amount) as revenue, count(*) as order_count
+        from orders o
+        join customers c on c.id = o.customer_id
+        join regions r on r.id = c.region_id
+        where o.status in ('paid', 'shipped', 'delivered') and o.created_on >= '2018-01-01'
+        group by r.name, date(o.created_on)
+        order by day desc, revenue desc
+    """,
+    'long': 'select * from events where event_id in ({}) and /* batch */ kind = \'click\''.format(
+        ', '.join(str(i) for i in range(500))),
+}
+
+
+def time_fingerprint(raw_sql, iterations, cached):
+    texts = [raw_sql] * iterations if cached else ['{} -- {}'.format(raw_sql, i) for i in range(iterations)]
+    sql_fingerprint.fingerprint(raw_sql)
+    started = time.perf_counter()
+    for text in texts:
+        sql_fingerprint.fingerprint(text)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args()
+
+    for label, raw_sql in QUERIES.items():
+        uncached = time_fingerprint(raw_sql, args.iterations, cached=False)
+        cached = time_fingerprint(raw_sql, args.iterations, cached=True)
+        print('{:<7} {:>6,} chars  uncached {:>9.1f} us  memoized {:>6.2f} us'.format(
+            label, len(raw_sql), uncached * 1e6, cached * 1e6))
+
+
+if __name__ == '__main__':
+    main()
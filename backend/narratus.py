@@ -1,4 +1,5 @@
-from backend.app import app, db
+from backend.app import app, db, snapshot, table_sync, artifact_store, publisher, result_spool, result_cache
+from backend.app import connection_manager as cm
 from backend.app.models import (User, Usergroup, Connection, SqlQuery,
                                 Chart, Report, Publication, Contact, user_perms,
                                 connection_perms)
@@ -11,3 +12,49 @@ def make_shell_context():
             'Report': Report, 'Publication': Publication,
             'Contact': Contact, 'user_perms': user_perms,
             'connection_perms': connection_perms}
+
+
+# run from cron, e.g. every minute: `flask refresh_snapshots`
+@app.cli.command()
+def refresh_snapshots():
+    charts, failed = snapshot.refresh_due_snapshots()
+    print('Refreshed {} snapshot(s).'.format(len(charts)))
+    for chart, message in failed:
+        print('{}: not refreshed ({})'.format(chart.label, message))
+
+
+# run from cron, e.g. every minute: `flask run_sync_jobs`
+@app.cli.command()
+def run_sync_jobs():
+    runs = table_sync.run_due_sync_jobs()
+    for run in runs:
+        print('{}: {} rows in {}s ({})'.format(run.sync_job.label, run.rows, run.duration_seconds, run.status))
+
+
+# run from cron, e.g. hourly: `flask collect_artifacts`
+@app.cli.command()
+def collect_artifacts():
+    deleted = artifact_store.collect_garbage()
+    print('Deleted {} artifact(s).'.format(deleted))
+    deleted = artifact_store.collect_fragment_garbage()
+    print('Deleted {} chart fragment(s).'.format(deleted))
+
+
+# run from cron, e.g. every ten minutes: `flask run_publications`
+@app.cli.command()
+def run_publications():
+    results = publisher.run_due_publications()
+    for result in results:
+        print('Publication {}: {} sent, {} failed in {}s ({})'.format(
+            result['publication_id'], result['sent'], len(result['failed']), result['seconds'], result['status']))
+
+
+# run from cron, e.g. every five minutes: `flask collect_results`
+@app.cli.command()
+def collect_results():
+    deleted = result_spool.collect_expired_results()
+    print('Deleted {} expired result(s).'.format(deleted))
+    deleted = cm.collect_single_flight_files()
+    print('Deleted {} single-flight file(s).'.format(deleted))
+    deleted = result_cache.evict()
+    print('Deleted {} cached result(s).'.format(deleted))
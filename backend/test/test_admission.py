@@ -0,0 +1,122 @@
+import time
+import tempfile
+import threading
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db
+from backend.app import admission
+
+
+class AdmissionTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def test_limiter_caps_concurrency(self):
+        limiter = admission.AdaptiveLimiter(limit=2, queue_depth=10, latency_target=10)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def run_query():
+            limiter.acquire(timeout=5)
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            limiter.release(0.05)
+
+        threads = [threading.Thread(target=run_query) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak) == 2
+
+    def test_full_queue_is_rejected_immediately(self):
+        limiter = admission.AdaptiveLimiter(limit=1, queue_depth=0)
+        limiter.acquire()
+
+        started = time.monotonic()
+        with self.assertRaises(admission.AdmissionRejected):
+            limiter.acquire(timeout=5)
+        assert time.monotonic() - started < 1
+
+    def test_queued_query_times_out(self):
+        limiter = admission.AdaptiveLimiter(limit=1, queue_depth=5)
+        limiter.acquire()
+
+        with self.assertRaises(admission.AdmissionRejected):
+            limiter.acquire(timeout=0.1)
+        assert limiter.get_status()['waiting'] == {'interactive': 0, 'batch': 0}
+
+    def test_limit_grows_when_fast_and_halves_when_slow(self):
+        limiter = admission.AdaptiveLimiter(limit=4, min_limit=1, max_limit=8, latency_target=1)
+
+        for _ in range(8):
+            limiter.acquire()
+            limiter.release(0.1)
+        grown = limiter.limit
+        limiter.acquire()
+        limiter.release(5)
+
+        assert grown > 4
+        assert limiter.limit == grown / 2
+
+    def test_queued_interactive_query_goes_before_queued_batch_query(self):
+        limiter = admission.AdaptiveLimiter(limit=2, reserved_slots=0, latency_target=10)
+        limiter.acquire('interactive')
+        limiter.acquire('interactive')
+        admitted = []
+
+        def run_query(workload):
+            limiter.acquire(workload, timeout=5)
+            admitted.append(workload)
+
+        batch_thread = threading.Thread(target=run_query, args=('batch',))
+        batch_thread.start()
+        time.sleep(0.05)
+        interactive_thread = threading.Thread(target=run_query, args=('interactive',))
+        interactive_thread.start()
+        time.sleep(0.05)
+        limiter.release(0.1, 'interactive')
+        interactive_thread.join()
+        limiter.release(0.1, 'interactive')
+        batch_thread.join()
+
+        assert admitted == ['interactive', 'batch']
+
+    def test_batch_queries_leave_reserved_slots_free(self):
+        limiter = admission.AdaptiveLimiter(limit=3, reserved_slots=1)
+        limiter.acquire('batch')
+        limiter.acquire('batch')
+
+        with self.assertRaises(admission.AdmissionRejected):
+            limiter.acquire('batch', timeout=0.1)
+        limiter.acquire('interactive', timeout=0.1)
+        assert limiter.get_status()['workloads']['batch']['rejected'] == 1
+
+    def test_workload_class_applies_to_current_thread(self):
+        with admission.workload_class('batch'):
+            assert admission.get_workload_class() == 'batch'
+        assert admission.get_workload_class() == 'interactive'
+
+    def test_batch_slots_are_shared_across_processes(self):
+        admission.ADMISSION_STATE_DIR = tempfile.mkdtemp()
+        held = [admission.acquire_batch_slot(1, slots=2, timeout=0.1) for _ in range(2)]
+
+        with self.assertRaises(admission.AdmissionRejected):
+            admission.acquire_batch_slot(1, slots=2, timeout=0.1)
+        other_connection = admission.acquire_batch_slot(2, slots=2, timeout=0.1)
+        admission.release_batch_slot(held.pop())
+        freed = admission.acquire_batch_slot(1, slots=2, timeout=0.1)
+
+        for slot_file in held + [other_connection, freed]:
+            admission.release_batch_slot(slot_file)
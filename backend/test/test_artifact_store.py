@@ -0,0 +1,132 @@
+import os
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, report_renderer, artifact_store, result_cache
+
+
+class ArtifactStoreTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+        report_renderer.FRAGMENT_CACHE_DIR = tempfile.mkdtemp()
+        artifact_store.ARTIFACT_DIR = tempfile.mkdtemp()
+        result_cache.RESULT_CACHE_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_report_with_chart(self):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        connection = cm.create_connection(conn)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (name VARCHAR, total INTEGER);')
+        connection.execute('INSERT INTO "TABLE1" (name, total) VALUES ("raw1", 3), ("raw2", 5)')
+
+        query = test_utils.create_query(label='artifact_query', raw_sql='select * from TABLE1')
+        chart = test_utils.create_chart(label='bar_chart', type='bar', sql_query=query, chart_connection=conn)
+        report = test_utils.create_report(label='artifact_report')
+        report.charts.append(chart)
+        db.session.commit()
+        assert len(report.charts) == 1
+        return report, connection
+
+    def get_artifacts(self):
+        return [name for _, _, names in os.walk(artifact_store.ARTIFACT_DIR) for name in names
+                if name.endswith('.html')]
+
+    def test_get_report_artifact_reuses_identical_render(self):
+        report, _ = self.create_report_with_chart()
+
+        first = artifact_store.get_report_artifact(report)
+        second = artifact_store.get_report_artifact(report)
+
+        assert first == second
+        assert len(self.get_artifacts()) == 1
+
+    def test_get_report_artifact_new_version_when_data_changes(self):
+        report, connection = self.create_report_with_chart()
+        first = artifact_store.get_report_artifact(report)
+
+        connection.execute('INSERT INTO "TABLE1" (name, total) VALUES ("raw3", 7)')
+        second = artifact_store.get_report_artifact(report)
+
+        assert first != second
+        assert b'raw3' in artifact_store.read_artifact(second)
+
+    def test_get_report_artifact_new_version_when_parameters_change(self):
+        report, _ = self.create_report_with_chart()
+
+        first = artifact_store.get_report_artifact(report, parameters={'region': 'east'})
+        second = artifact_store.get_report_artifact(report, parameters={'region': 'west'})
+
+        assert first != second
+
+    def test_concurrent_requests_share_one_render(self):
+        report, _ = self.create_report_with_chart()
+        chart_data = report_renderer.get_report_chart_data(report)
+        renders = []
+
+        def render(report, output_format, chart_data):
+            renders.append(report.id)
+            time.sleep(0.2)
+            return b'<html></html>'
+
+        original_render = report_renderer.render_report
+        original_chart_data = report_renderer.get_report_chart_data
+        report_renderer.render_report = render
+        report_renderer.get_report_chart_data = lambda report, parameters=None: chart_data
+        try:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                paths = list(executor.map(lambda _: artifact_store.get_report_artifact(report), range(4)))
+        finally:
+            report_renderer.render_report = original_render
+            report_renderer.get_report_chart_data = original_chart_data
+
+        assert len(set(paths)) == 1
+        assert len(renders) == 1
+
+    def test_collect_garbage_removes_old_artifacts(self):
+        report, _ = self.create_report_with_chart()
+        path = artifact_store.get_report_artifact(report)
+        os.utime(path, (time.time() - 10 * 24 * 60 * 60,) * 2)
+
+        deleted = artifact_store.collect_garbage(max_age_days=7)
+
+        assert deleted == 1
+        assert not os.path.exists(path)
+
+    def test_collect_garbage_evicts_least_recently_used_over_size_limit(self):
+        report, _ = self.create_report_with_chart()
+        old_path = artifact_store.get_report_artifact(report, parameters={'region': 'east'})
+        os.utime(old_path, (time.time() - 60,) * 2)
+        new_path = artifact_store.get_report_artifact(report, parameters={'region': 'west'})
+
+        artifact_store.collect_garbage(max_bytes=os.path.getsize(new_path))
+
+        assert not os.path.exists(old_path)
+        assert os.path.exists(new_path)
+
+    def test_collect_fragment_garbage_removes_unused_fragments(self):
+        report, _ = self.create_report_with_chart()
+        artifact_store.get_report_artifact(report)
+        [name] = os.listdir(report_renderer.FRAGMENT_CACHE_DIR)
+        path = os.path.join(report_renderer.FRAGMENT_CACHE_DIR, name)
+        os.utime(path, (time.time() - 10 * 24 * 60 * 60,) * 2)
+
+        deleted = artifact_store.collect_fragment_garbage(max_age_days=7)
+
+        assert deleted == 1
+        assert not os.path.exists(path)
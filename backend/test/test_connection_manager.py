@@ -1,9 +1,12 @@
+import time
+import tempfile
+import threading
 from flask import Flask
 from flask_testing import TestCase
 from sqlalchemy import exc
 from backend.test import test_utils
 from backend.app import db, app
-from backend.app import connection_manager as cm
+from backend.app import connection_manager as cm, result_cache
 
 
 class ConnectionManagerTest(TestCase):
@@ -17,6 +20,10 @@ class ConnectionManagerTest(TestCase):
     def setUp(self):
         self.client = app.test_client()
         db.create_all()
+        result_cache.RESULT_CACHE_DIR = tempfile.mkdtemp()
+        for connection_id in list(cm._engines):
+            cm.dispose_engine(connection_id)
+        cm._health.clear()
 
     def tearDown(self):
         db.session.remove()
@@ -99,3 +106,223 @@ class ConnectionManagerTest(TestCase):
         result = cm.execute_query_object(conn=conn, query=query)
         assert isinstance(result, list)
 
+
+    def test_execute_query_object_binds_typed_parameters(self):
+        conn = self.create_db_with_test_data()
+        query = test_utils.create_query(label='testQ', raw_sql='select * from TABLE1 where id > :min_id')
+        query.parameters = [{'name': 'min_id', 'type': 'integer', 'default': 3}]
+        db.session.commit()
+
+        assert [row['id'] for row in cm.execute_query_object(conn=conn, query=query)] == [4]
+        assert len(cm.execute_query_object(conn=conn, query=query, parameters={'min_id': '1'})) == 3
+
+    def test_get_parameter_values_rejects_wrong_type(self):
+        declarations = [{'name': 'day', 'type': 'date'}]
+
+        assert str(cm.get_parameter_values(declarations, {'day': '2018-05-01'})['day']) == '2018-05-01'
+        try:
+            cm.get_parameter_values(declarations, {'day': 'tuesday'})
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'Parameter day must be a date'
+
+    def test_execute_select_statement_stops_at_connection_row_limit(self):
+        conn = self.create_db_with_test_data()
+        conn.row_limit = 3
+        db.session.commit()
+
+        result = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1')
+
+        assert len(result) == 3
+        assert result.get_metadata()['truncated']
+
+    def test_execute_select_statement_not_truncated_when_result_fits_limit(self):
+        conn = self.create_db_with_test_data()
+        conn.row_limit = 4
+        db.session.commit()
+
+        result = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1')
+
+        assert len(result) == 4
+        assert not result.truncated
+
+    def test_add_row_limit_wraps_only_postgres_statements(self):
+        limited = cm.add_row_limit('select 1 as a; -- done\n', 'postgresql', 5)
+        assert limited == 'SELECT * FROM (select 1 as a\n) AS narratus_limited LIMIT 5'
+        assert cm.add_row_limit('select 1 as a, 2 as a', 'sqlserver', 5) == 'select 1 as a, 2 as a'
+
+    def test_role_limit_replaces_default_row_limit(self):
+        conn = self.create_db_with_test_data()
+        original_limits = cm.ROLE_RESULT_LIMITS
+        cm.ROLE_RESULT_LIMITS = {'viewer': (2, None)}
+        try:
+            result = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1', role='viewer')
+        finally:
+            cm.ROLE_RESULT_LIMITS = original_limits
+
+        assert len(result) == 2
+        assert result.row_limit == 2
+
+    def test_query_result_stops_at_byte_limit(self):
+        result = cm.QueryResult([{'name': 'abcde'}] * 10, byte_limit=12)
+
+        assert len(result) == 2
+        assert result.truncated
+
+    def test_concurrent_identical_queries_share_one_execution(self):
+        conn = self.create_db_with_test_data()
+        cm.SINGLE_FLIGHT_DIR = tempfile.mkdtemp()
+        executions = []
+        original_execute = cm._execute_select_statement
+
+        def slow_execute(*args):
+            executions.append(1)
+            time.sleep(0.2)
+            return original_execute(*args)
+
+        cm._execute_select_statement = slow_execute
+        results = []
+        try:
+            threads = [threading.Thread(target=lambda: results.append(
+                cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1'))) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            cm._execute_select_statement = original_execute
+
+        assert len(executions) == 1
+        assert [len(result) for result in results] == [4] * 5
+        assert len({id(result) for result in results}) == 5
+
+    def test_result_is_handed_off_only_to_waiting_workers(self):
+        cm.SINGLE_FLIGHT_DIR = tempfile.mkdtemp()
+
+        def slow_execute():
+            time.sleep(0.2)
+            return cm.QueryResult([{'id': 1}])
+
+        cm._run_across_workers('ab12', slow_execute)
+        assert result_cache.read_entry('ab12') is None
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cm._run_across_workers('cd34', slow_execute)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        assert results == [[{'id': 1}]] * 2
+        assert result_cache.read_entry('cd34') is not None
+
+    def test_repeated_query_is_served_from_result_cache(self):
+        conn = self.create_db_with_test_data()
+        first = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1', use_cache=True)
+        executions = []
+        original_execute = cm._execute_select_statement
+
+        def counted_execute(*args):
+            executions.append(1)
+            return original_execute(*args)
+
+        cm._execute_select_statement = counted_execute
+        try:
+            cached = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1', use_cache=True)
+            assert executions == []
+            fresh = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1')
+            assert executions == [1]
+        finally:
+            cm._execute_select_statement = original_execute
+
+        assert cached == first == fresh
+        assert cached.row_count == 4
+        assert not cached.truncated
+        assert cached.get_metadata()['cached_on'] is not None
+        assert fresh.get_metadata()['cached_on'] is None
+
+    def test_get_engine_reuses_engine_until_settings_change(self):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        engine = cm.get_engine(conn)
+        assert cm.get_engine(conn) is engine
+
+        conn.host = '/tmp/other'
+        assert cm.get_engine(conn) is not engine
+
+    def test_unhealthy_connection_fails_fast(self):
+        conn = self.create_db_with_test_data()
+        cm.record_health(conn.id, exc.OperationalError('select 1', {}, Exception('unreachable')))
+        try:
+            cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1', use_cache=False)
+            assert False
+        except cm.ConnectionUnavailable:
+            pass
+        finally:
+            cm.record_health(conn.id)
+
+    def test_test_connection_reads_recent_health(self):
+        conn = self.create_db_with_test_data()
+        health = cm.test_connection(conn, refresh=True)
+        assert health['healthy']
+        assert health['error'] is None
+
+        assert cm.test_connection(conn)['checked_on'] == health['checked_on']
+
+    def test_test_connections_times_out_slow_probes(self):
+        conn = self.create_db_with_test_data()
+        slow_conn = test_utils.create_connection(label='slow_conn', db_type='sqlite', host='/tmp')
+        original_check_health = cm.check_health
+
+        def check_health(conn):
+            if conn.id == slow_conn.id:
+                time.sleep(1)
+            return original_check_health(conn)
+
+        cm.check_health = check_health
+        try:
+            results = cm.test_connections([conn, slow_conn], refresh=True, workers=2, timeout=0.2)
+        finally:
+            cm.check_health = original_check_health
+
+        assert results[conn.id]['healthy']
+        assert not results[slow_conn.id]['healthy']
+        assert results[slow_conn.id]['error'] == 'TimeoutError'
+        assert cm.get_health(slow_conn.id) is None
+
+    def test_test_connections_times_probes_from_when_they_start(self):
+        conns = [self.create_db_with_test_data()]
+        conns.append(test_utils.create_connection(label='other_conn', db_type='sqlite', host='/tmp'))
+        original_check_health = cm.check_health
+
+        def check_health(conn):
+            time.sleep(0.3)
+            return original_check_health(conn)
+
+        cm.check_health = check_health
+        try:
+            results = cm.test_connections(conns, refresh=True, workers=1, timeout=0.5)
+        finally:
+            cm.check_health = original_check_health
+
+        assert all(health['healthy'] for health in results.values())
+
+    def test_reformatted_query_shares_cached_result(self):
+        conn = self.create_db_with_test_data()
+        first = cm.execute_select_statement(conn=conn, raw_sql='select * from TABLE1', use_cache=True)
+        executions = []
+        original_execute = cm._execute_select_statement
+
+        def counted_execute(*args):
+            executions.append(1)
+            return original_execute(*args)
+
+        cm._execute_select_statement = counted_execute
+        try:
+            reformatted = cm.execute_select_statement(conn=conn, raw_sql='-- all rows\nselect *\n  from TABLE1;'
+                                                      , use_cache=True)
+        finally:
+            cm._execute_select_statement = original_execute
+
+        assert executions == []
+        assert reformatted == first
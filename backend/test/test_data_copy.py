@@ -0,0 +1,174 @@
+from datetime import datetime
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, data_copy
+from backend.app.models import CopyCheckpoint
+
+
+class DataCopyTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_source_and_target(self, row_count=25):
+        source = test_utils.create_connection(label='source_conn', db_type='sqlite', host='//tmp/narratus_source.db')
+        connection = cm.create_connection(source)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));')
+        values = ', '.join('({}, "raw{}")'.format(i, i) for i in range(1, row_count + 1))
+        connection.execute('INSERT INTO "TABLE1" (id, name) VALUES {}'.format(values))
+
+        target = test_utils.create_connection(label='target_conn', db_type='sqlite', host='//tmp/narratus_target.db')
+        connection = cm.create_connection(target)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));')
+        return source, target
+
+    def count_target_rows(self, target):
+        connection = cm.create_connection(target)
+        return connection.execute('SELECT COUNT(*) FROM "TABLE1"').scalar()
+
+    def test_copy_table_copies_all_rows_in_batches(self):
+        source, target = self.create_source_and_target(row_count=25)
+
+        stats = data_copy.copy_table(source_conn=source, target_conn=target, source_table='TABLE1', batch_size=10)
+
+        assert stats['rows'] == 25
+        assert self.count_target_rows(target) == 25
+
+    def test_copy_table_with_truncate_replaces_rows(self):
+        source, target = self.create_source_and_target(row_count=5)
+        data_copy.copy_table(source_conn=source, target_conn=target, source_table='TABLE1')
+
+        data_copy.copy_table(source_conn=source, target_conn=target, source_table='TABLE1', truncate_target=True)
+
+        assert self.count_target_rows(target) == 5
+
+    def test_copy_table_reports_throughput(self):
+        source, target = self.create_source_and_target()
+
+        stats = data_copy.copy_table(source_conn=source, target_conn=target, source_table='TABLE1')
+
+        assert 'rows_per_second' in stats
+
+    def test_get_batch_writer_uses_executemany_for_sqlite(self):
+        source, target = self.create_source_and_target()
+        engine = cm.create_engine(target)
+
+        assert data_copy.get_batch_writer(engine) == data_copy.write_batch_with_executemany
+
+    def test_get_target_options_enables_local_infile_for_mysql_only(self):
+        mysql_conn = test_utils.create_connection(label='mysql_conn', db_type='mysql')
+        sqlite_conn = test_utils.create_connection(label='sqlite_conn', db_type='sqlite')
+
+        options = data_copy.get_target_options(mysql_conn, pool_size=2)
+
+        assert options == {'pool_size': 2, 'connect_args': {'local_infile': 1}}
+        assert data_copy.get_target_options(sqlite_conn) == {}
+
+    def test_copy_table_disposes_its_engines(self):
+        source, target = self.create_source_and_target()
+        disposed = []
+        original_create_engine = cm.create_engine
+
+        def create_engine(conn, **engine_options):
+            engine = original_create_engine(conn, **engine_options)
+            engine.dispose = lambda: disposed.append(conn.label)
+            return engine
+
+        cm.create_engine = create_engine
+        try:
+            data_copy.copy_table(source_conn=source, target_conn=target, source_table='TABLE1')
+        finally:
+            cm.create_engine = original_create_engine
+
+        assert sorted(disposed) == ['source_conn', 'target_conn']
+
+    def test_get_key_ranges_covers_whole_key_space(self):
+        source, target = self.create_source_and_target(row_count=25)
+        engine = cm.create_engine(source)
+        table = data_copy.reflect_table(engine, 'TABLE1')
+        key = data_copy.get_partition_column(engine, table)
+
+        ranges = data_copy.get_key_ranges(engine, table, key, chunk_count=4)
+
+        assert ranges[0][0] == 1
+        assert ranges[-1][1] == 26
+        assert all(ranges[i][1] == ranges[i + 1][0] for i in range(len(ranges) - 1))
+
+    def test_parallel_copy_table_copies_all_rows(self):
+        source, target = self.create_source_and_target(row_count=25)
+
+        stats = data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1'
+                                              , workers=2, chunk_count=5)
+
+        assert stats['rows'] == 25
+        assert stats['chunks'] == 5
+        assert self.count_target_rows(target) == 25
+
+    def test_parallel_copy_table_clears_checkpoints_when_done(self):
+        source, target = self.create_source_and_target()
+
+        data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1', workers=2)
+
+        assert not CopyCheckpoint.query.all()
+
+    def test_parallel_copy_table_resumes_from_checkpoints(self):
+        source, target = self.create_source_and_target(row_count=20)
+        job_key = data_copy.get_job_key(source, target, 'TABLE1', 'TABLE1')
+        db.session.add(CopyCheckpoint(job_key=job_key, range_start=1, range_end=11, rows=10
+                                      , completed_on=datetime.utcnow()))
+        db.session.add(CopyCheckpoint(job_key=job_key, range_start=11, range_end=21, started_on=datetime.utcnow()))
+        db.session.commit()
+
+        stats = data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1'
+                                              , workers=2)
+
+        assert stats['resumed_chunks'] == 1
+        assert stats['rows'] == 10
+        assert self.count_target_rows(target) == 10
+
+    def test_parallel_copy_table_with_truncate_replaces_rows(self):
+        source, target = self.create_source_and_target(row_count=10)
+        data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1', workers=2)
+
+        data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1', workers=2
+                                      , truncate_target=True)
+
+        assert self.count_target_rows(target) == 10
+
+    def test_parallel_copy_table_rejects_invalid_workers(self):
+        source, target = self.create_source_and_target()
+
+        for workers in ['4', 0, -1]:
+            try:
+                data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1'
+                                              , workers=workers)
+                assert False
+            except AssertionError as e:
+                assert str(e) == 'workers must be a positive integer'
+
+    def test_parallel_copy_table_requires_key_on_both_tables(self):
+        source, target = self.create_source_and_target()
+        connection = cm.create_connection(target)
+        connection.execute('DROP TABLE "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (code INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (code));')
+
+        try:
+            data_copy.parallel_copy_table(source_conn=source, target_conn=target, source_table='TABLE1', workers=2)
+            assert False
+        except AssertionError as e:
+            assert 'source key column id' in str(e)
@@ -0,0 +1,55 @@
+import json
+from uuid import UUID
+from decimal import Decimal
+from datetime import datetime, date, time
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, json_encoding
+
+
+class JsonEncodingTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.original_backend = json_encoding.JSON_BACKEND
+        self.payload = {'amount': Decimal('12.50'), 'created_on': datetime(2018, 5, 1, 9, 30), 'day': date(2018, 5, 1)
+                        , 'at': time(9, 30), 'external_id': UUID(int=1), 'raw': b'narratus', 'note': None}
+
+    def tearDown(self):
+        json_encoding.JSON_BACKEND = self.original_backend
+
+    def encode(self, backend):
+        json_encoding.JSON_BACKEND = backend
+        return json_encoding.FastJSONEncoder(sort_keys=True).encode(self.payload)
+
+    def test_encodes_driver_types(self):
+        encoded = json.loads(self.encode('stdlib'))
+
+        assert encoded == {'amount': 12.5, 'created_on': '2018-05-01T09:30:00', 'day': '2018-05-01', 'at': '09:30:00'
+                           , 'external_id': '00000000-0000-0000-0000-000000000001', 'raw': 'bmFycmF0dXM='
+                           , 'note': None}
+
+    def test_backends_produce_same_output(self):
+        if json_encoding.orjson is None:
+            self.skipTest('orjson is not installed')
+
+        assert json.loads(self.encode('orjson')) == json.loads(self.encode('stdlib'))
+
+    def test_unknown_types_still_raise(self):
+        self.payload = {'value': object()}
+
+        with self.assertRaises(TypeError):
+            self.encode('stdlib')
+
+    def test_nested_bytes_are_base64_encoded(self):
+        self.payload = {'rows': [{'raw': b'narratus'}, {'raw': bytearray(b'narratus')}]}
+
+        encoded = json.loads(self.encode('stdlib'))
+
+        assert encoded == {'rows': [{'raw': 'bmFycmF0dXM='}, {'raw': 'bmFycmF0dXM='}]}
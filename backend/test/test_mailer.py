@@ -0,0 +1,111 @@
+import time
+from flask import Flask
+from flask_testing import TestCase
+from aiosmtpd.controller import Controller
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import mailer
+
+
+class RecordingHandler:
+
+    def __init__(self, temporary_failures=0):
+        self.envelopes = []
+        self.sessions = set()
+        self.temporary_failures = temporary_failures
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.temporary_failures:
+            self.temporary_failures -= 1
+            return '451 Try again later'
+        self.envelopes.append(envelope)
+        self.sessions.add(id(session))
+        return '250 OK'
+
+
+class MailerTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def start_server(self, handler):
+        controller = Controller(handler, hostname='127.0.0.1', port=8025)
+        controller.start()
+        self.addCleanup(controller.stop)
+        pool = mailer.SmtpPool(host='127.0.0.1', port=8025, user='', size=2)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_batch_recipients_groups_bcc_recipients(self):
+        recipients = ['user{}@example.com'.format(i) for i in range(5)]
+
+        batches = mailer.batch_recipients(lambda to: mailer.build_message('s', 'b', to=to), recipients
+                                          , mode='bcc', batch_size=2)
+
+        assert [envelope for _, envelope in batches] == [recipients[0:2], recipients[2:4], recipients[4:]]
+        assert all(message['To'] == mailer.SMTP_SENDER for message, _ in batches)
+
+    def test_batch_recipients_individual_addresses_each_recipient(self):
+        recipients = ['a@example.com', 'b@example.com']
+
+        batches = mailer.batch_recipients(lambda to: mailer.build_message('s', 'b', to=to), recipients
+                                          , mode='individual')
+
+        assert [message['To'] for message, _ in batches] == recipients
+
+    def test_rate_limiter_spaces_out_messages(self):
+        rate_limiter = mailer.RateLimiter(rate=20, burst=1)
+        started = time.monotonic()
+
+        for _ in range(5):
+            rate_limiter.acquire()
+
+        assert time.monotonic() - started >= 0.19
+
+    def test_mail_queue_reuses_pooled_session(self):
+        handler = RecordingHandler()
+        pool = self.start_server(handler)
+        mail_queue = mailer.MailQueue(pool=pool, rate_limiter=mailer.RateLimiter(1000))
+
+        for i in range(3):
+            mail_queue.put(mailer.build_message('s', 'b'), ['user{}@example.com'.format(i)])
+        sent, failed = mail_queue.flush()
+
+        assert len(sent) == 3
+        assert not failed
+        assert len(handler.envelopes) == 3
+        assert len(handler.sessions) == 1
+
+    def test_mail_queue_retries_temporary_failures(self):
+        handler = RecordingHandler(temporary_failures=1)
+        pool = self.start_server(handler)
+        mail_queue = mailer.MailQueue(pool=pool, rate_limiter=mailer.RateLimiter(1000), retry_seconds=0)
+
+        mail_queue.put(mailer.build_message('s', 'b'), ['a@example.com', 'b@example.com'])
+        sent, failed = mail_queue.flush()
+
+        assert sent == ['a@example.com', 'b@example.com']
+        assert len(handler.envelopes) == 1
+
+    def test_mail_queue_gives_up_after_max_attempts(self):
+        handler = RecordingHandler(temporary_failures=10)
+        pool = self.start_server(handler)
+        mail_queue = mailer.MailQueue(pool=pool, rate_limiter=mailer.RateLimiter(1000), max_attempts=2
+                                      , retry_seconds=0)
+
+        mail_queue.put(mailer.build_message('s', 'b'), ['a@example.com'])
+        sent, failed = mail_queue.flush()
+
+        assert not sent
+        assert [recipient for recipient, _ in failed] == ['a@example.com']
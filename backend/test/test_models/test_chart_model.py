@@ -38,3 +38,28 @@ class UserModelTest(TestCase):
         assert chart_dict['creator']['username'] == 'samson'
         assert chart_dict['sql_query']['label'] == 'q1'
         assert chart_dict['connection']['label'] == 'con1'
+
+    def test_get_dict_only_returns_requested_fields(self):
+        chart = test_utils.create_chart(label='chart1')
+
+        chart_dict = chart.get_dict(fields=['label'])
+
+        assert chart_dict == {'chart_id': chart.id, 'label': 'chart1'}
+
+    def test_get_dict_only_expands_requested_relations(self):
+        chart = test_utils.create_chart(label='chart1')
+
+        chart_dict = chart.get_dict(expand=['sql_query'])
+
+        assert chart_dict['sql_query']['label'] == 'query_chart1'
+        assert 'creator' not in chart_dict['sql_query']
+        assert 'creator' not in chart_dict
+        assert 'connection' not in chart_dict
+        assert chart_dict['connection_id'] == chart.connection_id
+
+    def test_get_dict_expands_nested_paths(self):
+        chart = test_utils.create_chart(label='chart1')
+
+        chart_dict = chart.get_dict(expand=['sql_query.creator'])
+
+        assert chart_dict['sql_query']['creator']['username'] == 'user_query_chart1'
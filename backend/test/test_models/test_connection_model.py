@@ -58,3 +58,10 @@ class UserModelTest(TestCase):
 
         assert connection.password != password
         assert connection_dict['password'] == password
+
+    def test_row_limit_must_be_positive_integer(self):
+        try:
+            Connection(label='con1', row_limit=0)
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'row_limit must be a positive integer'
@@ -47,3 +47,13 @@ class UserModelTest(TestCase):
         assert isinstance(pub_list[0], dict)
         assert pub_list[0]['type'] == pub_type
         assert pub_list[0]['creator']['username'] == 'samson'
+
+    def test_get_dict_lists_chart_ids(self):
+        chart = test_utils.create_chart(label='chart1')
+        report = test_utils.create_report(label='report1')
+        report.charts.append(chart)
+        db.session.commit()
+
+        report_dict = report.get_dict()
+
+        assert report_dict['chart_ids'] == [chart.id]
@@ -33,3 +33,20 @@ class UserModelTest(TestCase):
         assert query_dict['query_id']
         assert query_dict['label'] == "q1"
         assert query_dict['creator']['username'] == 'samson'
+
+    def test_watermark_column_must_be_column_name(self):
+        try:
+            SqlQuery(label='q1', watermark_column='id; drop table users')
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'watermark_column must be a column name'
+
+    def test_parameters_must_be_declarations(self):
+        query = SqlQuery(label='q1', parameters='[{"name": "region", "type": "string"}]')
+
+        assert query.get_parameters() == [{'name': 'region', 'type': 'string'}]
+        try:
+            SqlQuery(label='q2', parameters=[{'name': 'region', 'type': 'varchar'}])
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'parameter type not recognized'
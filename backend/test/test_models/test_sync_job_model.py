@@ -0,0 +1,51 @@
+from flask import Flask
+from flask_testing import TestCase
+from backend.app.models import SyncJob, SyncRun
+from backend.app import db
+from backend.test import test_utils
+
+
+class SyncJobModelTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_get_dict_returns_dict(self):
+        source = test_utils.create_connection(label='source_conn')
+        target = test_utils.create_connection(label='target_conn')
+        sync_job = SyncJob(label='sync1', source_connection=source, target_connection=target, source_table='t1'
+                           , watermark_column='updated_at', key_columns=['id', 'region'])
+        sync_job.runs.append(SyncRun(rows=10, status='success'))
+        db.session.add(sync_job)
+        db.session.commit()
+
+        sync_job_dict = sync_job.get_dict()
+
+        assert isinstance(sync_job_dict, dict)
+        assert sync_job_dict['sync_job_id']
+        assert sync_job_dict['key_columns'] == ['id', 'region']
+        assert sync_job_dict['runs'][0]['rows'] == 10
+
+    def test_mode_must_be_recognized(self):
+        try:
+            SyncJob(mode='replace')
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'Sync mode not recognized'
+
+    def test_key_columns_must_be_column_names(self):
+        try:
+            SyncJob(key_columns='id; drop table user')
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'key_columns must be a list of column names'
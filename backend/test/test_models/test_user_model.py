@@ -97,6 +97,26 @@ class UserModelTest(TestCase):
         assert len(authorized_ids) == 1
         assert isinstance(authorized_ids[0], int)
 
+    def test_get_authorized_ids_by_type(self):
+        usergroup1 = test_utils.create_usergroup(label='group1')
+        usergroup2 = test_utils.create_usergroup(label='group2')
+        user = test_utils.create_user(username='samson')
+        connection = Connection(label='con1', creator=user)
+        chart = test_utils.create_chart(label='chart1')
+        connection.usergroups.append(usergroup1)
+        chart.usergroups.append(usergroup1)
+        chart.usergroups.append(usergroup2)
+        user.usergroups.append(usergroup1)
+        user.usergroups.append(usergroup2)
+        db.session.add(connection)
+        db.session.commit()
+
+        authorized_ids = user.get_authorized_ids_by_type()
+
+        assert authorized_ids['connections'] == {connection.id}
+        assert authorized_ids['charts'] == {chart.id}
+        assert authorized_ids['reports'] == set()
+
     def test_get_dicts_from_usergroups(self):
         user = test_utils.create_user(username='samson')
         starting_usergroups_count = len(user.get_dicts_from_usergroups())
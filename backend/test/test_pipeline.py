@@ -0,0 +1,121 @@
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, pipeline, data_copy
+from backend.app.models import DerivedTable
+
+
+class PipelineTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_warehouse(self):
+        conn = test_utils.create_connection(label='warehouse', db_type='sqlite', host='//tmp/narratus_warehouse.db')
+        connection = cm.create_connection(conn)
+        for table in ('by_region', 'by_region__building', 'region_count', 'EVENTS'):
+            connection.execute('DROP TABLE IF EXISTS "{}"'.format(table))
+        connection.execute('CREATE TABLE "EVENTS" (id INTEGER NOT NULL, region VARCHAR, PRIMARY KEY (id));')
+        connection.execute('INSERT INTO "EVENTS" (id, region) VALUES (1,"east"), (2,"west"), (3,"east")')
+        return conn
+
+    def create_derived_table(self, conn, label, target_table, raw_sql, upstream_tables, index_columns=None):
+        query = test_utils.create_query(label='query_{}'.format(label), raw_sql=raw_sql)
+        derived_table = DerivedTable(label=label, target_table=target_table, upstream_tables=upstream_tables
+                                     , index_columns=index_columns, sql_query=query, connection=conn)
+        db.session.add(derived_table)
+        db.session.commit()
+        return derived_table
+
+    def create_pipeline(self, record_load=True):
+        conn = self.create_warehouse()
+        if record_load:
+            data_copy.record_table_load(conn, 'EVENTS')
+        self.create_derived_table(conn, 'd1', 'by_region', 'select region, count(*) as n from EVENTS group by region'
+                                  , ['EVENTS'], index_columns=['region'])
+        self.create_derived_table(conn, 'd2', 'region_count', 'select count(*) as regions from by_region'
+                                  , ['by_region'])
+        return conn
+
+    def test_topological_order_puts_upstream_first(self):
+        dag = {'c': {'a', 'b'}, 'b': {'a'}, 'a': set()}
+
+        assert pipeline.topological_order(dag) == ['a', 'b', 'c']
+
+    def test_topological_order_rejects_cycles(self):
+        try:
+            pipeline.topological_order({'a': {'b'}, 'b': {'a'}})
+            assert False
+        except AssertionError as e:
+            assert 'circular dependency' in str(e)
+
+    def test_run_pipeline_builds_tables_in_dependency_order(self):
+        conn = self.create_pipeline()
+
+        results = pipeline.run_pipeline(conn, workers=2)
+
+        connection = cm.create_connection(conn)
+        assert [table['status'] for table in results['tables']] == ['built', 'built']
+        assert connection.execute('SELECT regions FROM region_count').scalar() == 2
+
+    def test_run_pipeline_skips_unchanged_tables(self):
+        conn = self.create_pipeline()
+        pipeline.run_pipeline(conn, workers=2)
+
+        results = pipeline.run_pipeline(conn, workers=2)
+
+        assert [table['status'] for table in results['tables']] == ['skipped', 'skipped']
+
+    def test_run_pipeline_rebuilds_downstream_of_changed_input(self):
+        conn = self.create_pipeline()
+        pipeline.run_pipeline(conn, workers=2)
+        connection = cm.create_connection(conn)
+        connection.execute('INSERT INTO "EVENTS" (id, region) VALUES (4,"north")')
+        data_copy.record_table_load(conn, 'EVENTS')
+
+        results = pipeline.run_pipeline(conn, workers=2)
+
+        assert [table['status'] for table in results['tables']] == ['built', 'built']
+        assert connection.execute('SELECT regions FROM region_count').scalar() == 3
+
+    def test_build_derived_table_creates_indexes(self):
+        conn = self.create_warehouse()
+        engine = cm.create_engine(conn)
+
+        pipeline.build_derived_table(engine, 'by_region', 'select region from EVENTS', [['region']])
+
+        indexes = engine.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        assert ('ix_by_region_region',) in indexes
+
+    def test_run_pipeline_always_rebuilds_tables_reading_unversioned_inputs(self):
+        conn = self.create_pipeline(record_load=False)
+        pipeline.run_pipeline(conn, workers=2)
+        connection = cm.create_connection(conn)
+        connection.execute('UPDATE "EVENTS" SET region = "north" WHERE id = 2')
+
+        results = pipeline.run_pipeline(conn, workers=2)
+
+        assert [table['status'] for table in results['tables']] == ['built', 'built']
+        assert connection.execute('SELECT n FROM by_region WHERE region = "north"').scalar() == 1
+
+    def test_run_pipeline_rejects_invalid_workers(self):
+        conn = self.create_pipeline()
+
+        for workers in ('4', 0):
+            try:
+                pipeline.run_pipeline(conn, workers=workers)
+                assert False
+            except AssertionError as e:
+                assert 'workers' in str(e)
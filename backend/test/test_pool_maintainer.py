@@ -0,0 +1,68 @@
+import time
+import tempfile
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, pool_maintainer
+
+
+class PoolMaintainerTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+        pool_maintainer.POOL_STATE_DIR = tempfile.mkdtemp()
+        for connection_id in list(cm._engines):
+            cm.dispose_engine(connection_id)
+        cm._health.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_warm_up_checks_recently_used_connections(self):
+        recent = test_utils.create_connection(label='recent_conn', db_type='sqlite', host='/tmp')
+        stale = test_utils.create_connection(label='stale_conn', db_type='sqlite', host='/tmp')
+        pool_maintainer.record_usage({recent.id: time.time(),
+                                      stale.id: time.time() - pool_maintainer.WARM_UP_WINDOW_SECONDS - 60})
+
+        checked = pool_maintainer.warm_up()
+
+        assert list(checked) == [recent.id]
+        assert checked[recent.id]['healthy']
+        assert cm.get_health(recent.id)['healthy']
+
+    def test_warm_up_forgets_deleted_connections(self):
+        pool_maintainer.record_usage({99999: time.time()})
+
+        assert pool_maintainer.warm_up() == {}
+        assert pool_maintainer.get_recently_used_ids() == []
+
+    def test_maintain_pools_disposes_idle_engines(self):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        cm.get_engine(conn)
+
+        checked = pool_maintainer.maintain_pools(now=time.time() + pool_maintainer.WARM_UP_WINDOW_SECONDS + 60)
+
+        assert checked == {}
+        assert conn.id not in cm.get_engine_usage()
+        assert pool_maintainer.get_recently_used_ids() == [conn.id]
+
+    def test_health_checks_do_not_keep_engines_warm(self):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        cm.check_health(conn)
+        assert cm.get_engine_usage() == {conn.id: None}
+
+        checked = pool_maintainer.maintain_pools()
+        assert list(checked) == [conn.id]
+        assert pool_maintainer.get_recently_used_ids() == []
+
+        pool_maintainer.maintain_pools(now=time.time() + pool_maintainer.WARM_UP_WINDOW_SECONDS + 60)
+        assert cm.get_engine_usage() == {}
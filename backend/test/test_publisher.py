@@ -0,0 +1,152 @@
+import time
+import asyncio
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from datetime import time as time_of_day
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import report_renderer, artifact_store, publisher
+from backend.app.models import Publication
+
+
+class PublisherTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+        report_renderer.FRAGMENT_CACHE_DIR = tempfile.mkdtemp()
+        artifact_store.ARTIFACT_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_daily_publication_is_due_once_per_day(self):
+        publication = test_utils.create_publication(frequency='daily', pub_time=time_of_day(9, 0))
+        now = datetime(2018, 5, 1, 10, 0)
+
+        assert publisher.publication_is_due(publication, now)
+        publication.last_run_on = datetime(2018, 5, 1, 9, 0)
+        assert not publisher.publication_is_due(publication, now)
+        assert publisher.publication_is_due(publication, now + timedelta(days=1))
+
+    def test_days_of_week_publication_only_due_on_its_days(self):
+        publication = test_utils.create_publication(frequency='days_of_week', monday=True, pub_time=time_of_day(9, 0))
+        publication.last_run_on = datetime(2018, 4, 30, 9, 0)  # a monday
+
+        assert not publisher.publication_is_due(publication, datetime(2018, 5, 4, 10, 0))
+        assert publisher.publication_is_due(publication, datetime(2018, 5, 7, 10, 0))
+
+    def test_hourly_publication_is_due_after_an_hour(self):
+        publication = test_utils.create_publication(frequency='hourly')
+        publication.last_run_on = datetime(2018, 5, 1, 9, 0)
+
+        assert not publisher.publication_is_due(publication, datetime(2018, 5, 1, 9, 30))
+        assert publisher.publication_is_due(publication, datetime(2018, 5, 1, 10, 0))
+
+    def test_manual_publication_is_never_due(self):
+        publication = test_utils.create_publication(frequency='manual')
+
+        assert not publisher.publication_is_due(publication)
+
+    def test_dispatch_limits_concurrency_per_connection(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def prepare(publication_id, app=None):
+            with lock:
+                running.append(publication_id)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(publication_id)
+            return {'data_version': 'v1', 'skipped': False, 'message_factory': None, 'recipients': []}
+
+        original_prepare = publisher.prepare_publication
+        publisher.prepare_publication = prepare
+        loop = asyncio.new_event_loop()
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = loop.run_until_complete(
+                    publisher._dispatch_all(executor, [(i, {1}) for i in range(6)], connection_limit=2))
+        finally:
+            publisher.prepare_publication = original_prepare
+            loop.close()
+
+        assert all(result['status'] == 'success' for result in results)
+        assert max(peak) == 2
+
+    def test_run_publications_renders_dashboard_and_records_run(self):
+        publication = test_utils.create_publication(type='dashboard')
+
+        results = publisher.run_publications([publication])
+
+        assert results[0]['status'] == 'success'
+        assert publication.last_run_on
+        assert publication.publication_report.last_published == publication.last_run_on
+
+    def test_run_publications_skips_unchanged_report(self):
+        publication = test_utils.create_publication(type='dashboard')
+        publisher.run_publications([publication])
+
+        results = publisher.run_publications([publication])
+
+        assert results[0]['status'] == 'skipped'
+        assert [run.status for run in publication.runs.order_by('id')] == ['success', 'skipped']
+
+    def test_run_publications_always_send_ignores_unchanged_report(self):
+        publication = test_utils.create_publication(type='dashboard')
+        publication.always_send = True
+        db.session.commit()
+        publisher.run_publications([publication])
+
+        results = publisher.run_publications([publication])
+
+        assert results[0]['status'] == 'success'
+
+    def test_run_publications_skips_publication_claimed_by_another_run(self):
+        publication = test_utils.create_publication(type='dashboard')
+        Publication.query.filter(Publication.id == publication.id).update({'last_run_on': datetime.utcnow()}
+                                                                          , synchronize_session=False)
+
+        assert publisher.run_publications([publication]) == []
+
+    def test_send_queued_messages_frees_mail_server_between_retries(self):
+        class RetryingQueue:
+            def __init__(self):
+                self.pending, self.sent, self.failed, self.attempts = [], [], [], 0
+
+            def send_due(self):
+                self.attempts += 1
+                if self.attempts == 1:
+                    self.pending = [(time.monotonic() + 0.2,)]
+                    return 1
+                self.pending, self.sent = [], ['a@example.com']
+                return 0
+
+        async def send(executor):
+            mail_server = asyncio.Semaphore(1)
+            sending = asyncio.ensure_future(publisher.send_queued_messages(executor, mail_server, RetryingQueue()))
+            await asyncio.sleep(0.1)
+            return mail_server.locked(), await sending
+
+        loop = asyncio.new_event_loop()
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                locked_during_backoff, (sent, failed) = loop.run_until_complete(send(executor))
+        finally:
+            loop.close()
+
+        assert not locked_during_backoff
+        assert sent == ['a@example.com'] and failed == []
@@ -0,0 +1,106 @@
+import os
+import time
+import tempfile
+import threading
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, report_renderer, result_cache, snapshot
+
+
+class ReportRendererTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+        report_renderer.FRAGMENT_CACHE_DIR = tempfile.mkdtemp()
+        result_cache.RESULT_CACHE_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_report_with_charts(self):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        connection = cm.create_connection(conn)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (name VARCHAR, total INTEGER);')
+        connection.execute('INSERT INTO "TABLE1" (name, total) VALUES ("raw1", 3), ("raw2", 5)')
+
+        query = test_utils.create_query(label='render_query', raw_sql='select * from TABLE1')
+        report = test_utils.create_report(label='render_report')
+        for chart_type in ('bar', 'line'):
+            chart = test_utils.create_chart(label='{}_chart'.format(chart_type), type=chart_type, sql_query=query
+                                            , chart_connection=conn)
+            report.charts.append(chart)
+        db.session.commit()
+        return report
+
+    def test_render_chart_fragment_draws_bar_chart(self):
+        rows = [{'name': 'a', 'total': 1}, {'name': 'b', 'total': 2}]
+
+        fragment = report_renderer.render_chart_fragment(1, 'My Chart', 'bar', rows)
+
+        assert fragment.count('<rect') == 2
+        assert '<table>' in fragment
+
+    def test_render_table_html_escapes_values(self):
+        table = report_renderer.render_table_html([{'name': '<script>'}])
+
+        assert '&lt;script&gt;' in table
+
+    def test_render_report_html_includes_every_chart(self):
+        report = self.create_report_with_charts()
+
+        document = report_renderer.render_report_html(report)
+
+        assert document.startswith('<!DOCTYPE html>')
+        assert document.count('<section class="chart"') == 2
+
+    def test_render_report_html_caches_fragments(self):
+        report = self.create_report_with_charts()
+
+        first = report_renderer.render_report_html(report)
+        second = report_renderer.render_report_html(report)
+
+        assert len(os.listdir(report_renderer.FRAGMENT_CACHE_DIR)) == 2
+        assert first == second
+
+    def test_get_report_chart_data_fetches_charts_concurrently_within_connection_limit(self):
+        report = self.create_report_with_charts()
+        query = report.charts[0].sql_query
+        for label in ('third_chart', 'fourth_chart'):
+            report.charts.append(test_utils.create_chart(label=label, type='bar', sql_query=query
+                                                         , chart_connection=report.charts[0].chart_connection))
+        db.session.commit()
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def get_chart_data(chart, parameters=None):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.1)
+            with lock:
+                in_flight[0] -= 1
+            return [{'label': chart.label}], None
+
+        original_limit = report_renderer.CHART_QUERIES_PER_CONNECTION
+        original_get_chart_data = snapshot.get_chart_data
+        report_renderer.CHART_QUERIES_PER_CONNECTION = 2
+        snapshot.get_chart_data = get_chart_data
+        try:
+            chart_data = report_renderer.get_report_chart_data(report)
+        finally:
+            report_renderer.CHART_QUERIES_PER_CONNECTION = original_limit
+            snapshot.get_chart_data = original_get_chart_data
+
+        assert in_flight[1] == 2
+        assert [rows[0]['label'] for _, rows, _ in chart_data] == [chart.label for chart in report.charts]
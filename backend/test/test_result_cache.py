@@ -0,0 +1,103 @@
+import os
+import time
+import tempfile
+from uuid import UUID
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from datetime import date, datetime, timedelta, timezone
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db
+from backend.app import result_cache
+
+
+class ResultCacheTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        result_cache.RESULT_CACHE_DIR = tempfile.mkdtemp()
+
+    def make_rows(self, row_count):
+        return [{'id': i, 'amount': Decimal(i) / 100, 'created_on': datetime(2018, 1, 1, 0, 0, i % 60)}
+                for i in range(row_count)]
+
+    def test_published_entry_round_trips(self):
+        rows = self.make_rows(100)
+        assert result_cache.publish_entry('ab12', rows, 100, 4000, True)
+        entry = result_cache.read_entry('ab12')
+        assert entry['rows'] == rows
+        assert entry['row_count'] == 100
+        assert entry['byte_count'] == 4000
+        assert entry['truncated']
+
+    def test_concurrent_publishes_of_one_entry_from_threads_do_not_collide(self):
+        rows = self.make_rows(2000)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            published = list(executor.map(lambda _: result_cache.publish_entry('ab12', rows, 2000, 80000, False)
+                                          , range(16)))
+
+        assert all(published)
+        assert result_cache.read_entry('ab12')['rows'] == rows
+        assert not [name for _, _, names in os.walk(result_cache.RESULT_CACHE_DIR) for name in names
+                    if name.endswith('.tmp')]
+
+    def test_driver_types_round_trip(self):
+        rows = [{'day': date(2018, 1, 1), 'created_on': datetime(2018, 1, 1, 12, 30, tzinfo=timezone.utc)
+                 , 'duration': timedelta(seconds=90), 'id': UUID(int=1), 'payload': b'\x00\xff'
+                 , 'details': {'$type': 'date', 'value': 1}, 'tags': ['a', 'b'], 'amount': None}]
+        assert result_cache.publish_entry('ab12', rows, 1, 100, False)
+        assert result_cache.read_entry('ab12')['rows'] == rows
+
+    def test_entry_with_unsupported_type_is_not_published(self):
+        assert not result_cache.publish_entry('ab12', [{'value': object()}], 1, 100, False)
+        assert result_cache.read_entry('ab12') is None
+
+    def test_cache_files_are_private(self):
+        result_cache.publish_entry('ab12', self.make_rows(5), 5, 200, False)
+        assert os.stat(result_cache.RESULT_CACHE_DIR).st_mode & 0o077 == 0
+        assert os.stat(result_cache.get_entry_path('ab12')).st_mode & 0o077 == 0
+
+    def test_read_entry_misses_unknown_key(self):
+        assert result_cache.read_entry('cd34') is None
+
+    def test_read_entry_ignores_expired_entry(self):
+        result_cache.publish_entry('ab12', self.make_rows(5), 5, 200, False)
+        assert result_cache.read_entry('ab12', max_age=0.5) is not None
+        time.sleep(0.6)
+        assert result_cache.read_entry('ab12', max_age=0.5) is None
+
+    def test_read_entry_ignores_entry_created_before_created_since(self):
+        result_cache.publish_entry('ab12', self.make_rows(5), 5, 200, False)
+        assert result_cache.read_entry('ab12', created_since=time.time() + 1) is None
+
+    def test_entry_over_max_size_is_not_published(self):
+        original_max_entry_bytes = result_cache.RESULT_CACHE_MAX_ENTRY_BYTES
+        result_cache.RESULT_CACHE_MAX_ENTRY_BYTES = 100
+        try:
+            assert not result_cache.publish_entry('ab12', self.make_rows(1000), 1000, 40000, False)
+        finally:
+            result_cache.RESULT_CACHE_MAX_ENTRY_BYTES = original_max_entry_bytes
+        assert result_cache.read_entry('ab12') is None
+
+    def test_evict_removes_least_recently_used_first(self):
+        for i, key in enumerate(['aa01', 'bb02', 'cc03']):
+            result_cache.publish_entry(key, self.make_rows(50), 50, 2000, False)
+            os.utime(result_cache.get_entry_path(key), (time.time() - 100 + i, time.time() - 100 + i))
+        result_cache.read_entry('aa01')
+        entry_bytes = os.path.getsize(result_cache.get_entry_path('aa01'))
+
+        assert result_cache.evict(max_bytes=entry_bytes * 2) == 1
+        assert result_cache.read_entry('bb02') is None
+        assert result_cache.read_entry('aa01') is not None
+        assert result_cache.read_entry('cc03') is not None
+
+    def test_evict_removes_entries_unused_for_ttl(self):
+        result_cache.publish_entry('ab12', self.make_rows(5), 5, 200, False)
+        assert result_cache.evict(now=time.time() + result_cache.RESULT_CACHE_TTL_SECONDS + 1) == 1
+        assert result_cache.read_entry('ab12') is None
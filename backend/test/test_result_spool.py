@@ -0,0 +1,83 @@
+import time
+import tempfile
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, result_spool
+
+
+class ResultSpoolTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+        result_spool.RESULT_SPOOL_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_db_with_test_data(self, row_count=25):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        connection = cm.create_connection(conn)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" ('
+                           'id INTEGER NOT NULL,'
+                           'name VARCHAR, '
+                           'PRIMARY KEY (id));')
+        for i in range(1, row_count + 1):
+            connection.execute('INSERT INTO "TABLE1" (id, name) VALUES ({0}, "raw{0}")'.format(i))
+        return conn
+
+    def test_pages_cover_the_whole_result(self):
+        conn = self.create_db_with_test_data()
+        result_handle, metadata = result_spool.spool_select_statement(1, conn, 'select * from TABLE1 order by id')
+
+        pages = [result_spool.get_result_page(1, result_handle, page=page, page_size=10) for page in (1, 2, 3)]
+
+        assert metadata['row_count'] == 25
+        assert pages[0]['page_count'] == 3
+        assert [len(page['results']) for page in pages] == [10, 10, 5]
+        assert pages[2]['results'][-1]['id'] == 25
+
+    def test_spooled_result_spans_fetch_batches(self):
+        conn = self.create_db_with_test_data()
+        original_fetch_size = cm.FETCH_SIZE
+        cm.FETCH_SIZE = 4
+        try:
+            result_handle, _ = result_spool.spool_select_statement(1, conn, 'select * from TABLE1 order by id')
+        finally:
+            cm.FETCH_SIZE = original_fetch_size
+
+        page = result_spool.get_result_page(1, result_handle, page=2, page_size=7)
+
+        assert [row['id'] for row in page['results']] == list(range(8, 15))
+
+    def test_handle_is_private_to_its_user(self):
+        conn = self.create_db_with_test_data()
+        result_handle, _ = result_spool.spool_select_statement(1, conn, 'select * from TABLE1')
+
+        try:
+            result_spool.get_result_page(2, result_handle)
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'Result handle not recognized'
+
+    def test_idle_results_expire(self):
+        conn = self.create_db_with_test_data()
+        result_handle, _ = result_spool.spool_select_statement(1, conn, 'select * from TABLE1')
+        later = time.time() + result_spool.RESULT_IDLE_SECONDS + 1
+
+        assert result_spool.collect_expired_results(now=later) == 1
+        try:
+            result_spool.get_result_page(1, result_handle)
+            assert False
+        except AssertionError as e:
+            assert str(e) == 'Result handle not recognized'
@@ -0,0 +1,181 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, snapshot, result_cache
+
+
+class SnapshotTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+        self.snapshot_dir = tempfile.mkdtemp()
+        snapshot.SNAPSHOT_DIR = self.snapshot_dir
+        result_cache.RESULT_CACHE_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_db_with_test_data(self):
+        conn = test_utils.create_connection(label='test_conn', db_type='sqlite', host='/tmp')
+        connection = cm.create_connection(conn)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" ('
+                           'id INTEGER NOT NULL,'
+                           'name VARCHAR, '
+                           'PRIMARY KEY (id));')
+
+        connection.execute('INSERT INTO "TABLE1" '
+                           '(id, name) '
+                           'VALUES (1,"raw1"), (2,"raw2"), (3,"raw3"), (4,"raw4")')
+        return conn
+
+    def create_materialized_chart(self):
+        conn = self.create_db_with_test_data()
+        query = test_utils.create_query(label='snap_query', raw_sql='select * from TABLE1')
+        chart = test_utils.create_chart(label='snap_chart', sql_query=query, chart_connection=conn)
+        chart.materialized = True
+        db.session.commit()
+        return chart
+
+    def test_write_and_read_snapshot_round_trip(self):
+        path = os.path.join(self.snapshot_dir, 'round_trip.snap')
+        rows = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+
+        snapshot.write_snapshot(path, rows)
+
+        assert snapshot.read_snapshot(path) == rows
+
+    def test_read_snapshot_only_returns_requested_columns(self):
+        path = os.path.join(self.snapshot_dir, 'columns.snap')
+        snapshot.write_snapshot(path, [{'id': 1, 'name': 'a'}])
+
+        assert snapshot.read_snapshot(path, column_names=['name']) == [{'name': 'a'}]
+
+    def test_read_snapshot_header_reports_refresh_time(self):
+        path = os.path.join(self.snapshot_dir, 'header.snap')
+        refreshed_on = datetime(2018, 4, 21, 12, 0)
+        snapshot.write_snapshot(path, [{'id': 1}], refreshed_on=refreshed_on)
+
+        header = snapshot.read_snapshot_header(path)
+
+        assert header['row_count'] == 1
+        assert header['refreshed_on'] == refreshed_on.isoformat()
+
+    def test_write_snapshot_with_no_rows(self):
+        path = os.path.join(self.snapshot_dir, 'empty.snap')
+        snapshot.write_snapshot(path, [])
+
+        assert snapshot.read_snapshot(path) == []
+
+    def test_refresh_chart_snapshot_sets_refresh_time(self):
+        chart = self.create_materialized_chart()
+
+        snapshot.refresh_chart_snapshot(chart)
+
+        assert chart.snapshot_refreshed_on
+        assert snapshot.snapshot_exists(chart)
+
+    def test_get_chart_data_serves_from_snapshot(self):
+        chart = self.create_materialized_chart()
+        snapshot.refresh_chart_snapshot(chart)
+        snapshot.write_snapshot(snapshot.get_snapshot_path(chart), [{'id': 42}])
+
+        rows, refreshed_on = snapshot.get_chart_data(chart)
+
+        assert rows == [{'id': 42}]
+        assert refreshed_on == chart.snapshot_refreshed_on
+
+    def test_snapshot_is_due_after_refresh_interval(self):
+        chart = self.create_materialized_chart()
+        snapshot.refresh_chart_snapshot(chart)
+        chart.refresh_minutes = 10
+
+        assert not snapshot.snapshot_is_due(chart)
+        assert snapshot.snapshot_is_due(chart, now=datetime.utcnow() + timedelta(minutes=11))
+
+    def test_append_to_snapshot_adds_row_group(self):
+        path = os.path.join(self.snapshot_dir, 'append.snap')
+        snapshot.write_snapshot(path, [{'id': 1}], watermark=1)
+
+        header = snapshot.append_to_snapshot(path, [{'id': 2}], watermark=2)
+
+        assert len(header['row_groups']) == 2
+        assert header['watermark'] == 2
+        assert snapshot.read_snapshot(path) == [{'id': 1}, {'id': 2}]
+
+    def test_compact_snapshot_merges_row_groups(self):
+        path = os.path.join(self.snapshot_dir, 'compact.snap')
+        snapshot.write_snapshot(path, [{'id': 1}], watermark=1)
+        snapshot.append_to_snapshot(path, [{'id': 2}], watermark=2)
+
+        header = snapshot.compact_snapshot(path)
+
+        assert len(header['row_groups']) == 1
+        assert snapshot.read_snapshot(path) == [{'id': 1}, {'id': 2}]
+
+    def test_incremental_refresh_only_appends_new_rows(self):
+        chart = self.create_materialized_chart()
+        chart.sql_query.watermark_column = 'id'
+        db.session.commit()
+        snapshot.refresh_chart_snapshot(chart)
+
+        connection = cm.create_connection(chart.chart_connection)
+        connection.execute('INSERT INTO "TABLE1" (id, name) VALUES (5,"raw5")')
+        snapshot.refresh_chart_snapshot(chart)
+
+        header = snapshot.read_snapshot_header(snapshot.get_snapshot_path(chart))
+        rows = snapshot.read_snapshot(snapshot.get_snapshot_path(chart))
+
+        assert header['watermark'] == 5
+        assert len(header['row_groups']) == 2
+        assert len(rows) == 5
+
+    def test_parameter_values_get_their_own_snapshot(self):
+        chart = self.create_materialized_chart()
+        chart.sql_query.raw_sql = 'select * from TABLE1 where id > :min_id'
+        chart.sql_query.parameters = [{'name': 'min_id', 'type': 'integer', 'default': 0}]
+        db.session.commit()
+
+        default_rows, _ = snapshot.get_chart_data(chart)
+        rows, refreshed_on = snapshot.get_chart_data(chart, {'min_id': 2, 'unrelated': 'ignored'})
+
+        assert len(default_rows) == 4
+        assert [row['id'] for row in rows] == [3, 4]
+        assert refreshed_on
+        assert snapshot.get_snapshot_path(chart) != snapshot.get_snapshot_path(chart, {'min_id': 2})
+
+    def test_refresh_due_snapshots_skips_charts_that_fail(self):
+        chart = self.create_materialized_chart()
+        query = test_utils.create_query(label='needs_parameter', raw_sql='select * from TABLE1 where id > :min_id')
+        query.parameters = [{'name': 'min_id', 'type': 'integer'}]
+        broken_chart = test_utils.create_chart(label='broken_chart', sql_query=query
+                                               , chart_connection=chart.chart_connection)
+        broken_chart.materialized = True
+        db.session.commit()
+
+        refreshed, failed = snapshot.refresh_due_snapshots()
+
+        assert [refreshed_chart.id for refreshed_chart in refreshed] == [chart.id]
+        assert [(failed_chart.id, message) for failed_chart, message in failed] \
+            == [(broken_chart.id, 'Parameter min_id not provided')]
+
+    def test_read_snapshot_returns_row_range_across_row_groups(self):
+        path = os.path.join(self.snapshot_dir, 'range.snap')
+        writer = snapshot.SnapshotWriter(path)
+        writer.write_row_group([{'id': i} for i in range(0, 5)])
+        writer.write_row_group([{'id': i} for i in range(5, 10)])
+        writer.close()
+
+        assert snapshot.read_snapshot(path, start=3, stop=7) == [{'id': i} for i in range(3, 7)]
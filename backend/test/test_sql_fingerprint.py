@@ -0,0 +1,61 @@
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db
+from backend.app import sql_fingerprint
+
+
+class SqlFingerprintTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def test_normalize_ignores_comments_layout_and_case(self):
+        sql = "/* report */ SELECT id,\n  Name FROM t -- trailing\n;"
+        assert sql_fingerprint.normalize(sql) == 'select id , name from t'
+
+    def test_normalize_replaces_literals_and_collapses_in_lists(self):
+        sql = "select * from t where id in (1, 2, 3) and name = 'it''s' and amount > 1.5e3"
+        assert sql_fingerprint.normalize(sql) == 'select * from t where id in ( ? ) and name = ? and amount > ?'
+
+    def test_fingerprint_is_shared_by_runs_with_different_values(self):
+        first = sql_fingerprint.fingerprint("select * from t where id in (1, 2) and name = 'a'")
+        second = sql_fingerprint.fingerprint("SELECT * FROM t WHERE id IN (7) AND name = 'b'")
+        other = sql_fingerprint.fingerprint("select * from t where id in (1, 2) or name = 'a'")
+        assert first == second
+        assert first != other
+
+    def test_statement_key_keeps_literals_and_case(self):
+        key = sql_fingerprint.get_statement_key("select Name from t where id = 1")
+        assert key == sql_fingerprint.get_statement_key("select Name\nfrom t -- one row\nwhere id = 1;")
+        assert key != sql_fingerprint.get_statement_key("select Name from t where id = 2")
+        assert key != sql_fingerprint.get_statement_key("select name from t where id = 1")
+
+    def test_comment_markers_inside_strings_are_kept(self):
+        sql = "select '-- not a comment', \"/* nor this */\" from t"
+        assert sql_fingerprint.canonicalize(sql) == sql.replace(',', ' ,')
+
+    def test_statement_key_keeps_comments_the_database_runs(self):
+        key = sql_fingerprint.get_statement_key('select 1')
+        assert key != sql_fingerprint.get_statement_key('select 1--1')
+        assert key != sql_fingerprint.get_statement_key('select /*! STRAIGHT_JOIN */ 1')
+        assert key != sql_fingerprint.get_statement_key('select /*+ INDEX(t) */ 1')
+        assert key == sql_fingerprint.get_statement_key('select 1 --\n')
+
+    def test_get_first_keyword_does_not_skip_executable_comments(self):
+        assert sql_fingerprint.get_first_keyword('/*!50000 delete from t */ select 1') is None
+
+    def test_get_first_keyword_skips_comments(self):
+        assert sql_fingerprint.get_first_keyword('-- latest\n  SELECT 1') == 'select'
+        assert sql_fingerprint.get_first_keyword('delete from t') == 'delete'
+        assert sql_fingerprint.get_first_keyword('') is None
+
+    def test_repeated_text_is_memoized(self):
+        sql = 'select count(*) from memoized_table'
+        sql_fingerprint.fingerprint(sql)
+        hits = sql_fingerprint.get_cache_info().hits
+        sql_fingerprint.fingerprint(sql)
+        assert sql_fingerprint.get_cache_info().hits == hits + 1
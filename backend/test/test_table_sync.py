@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from flask import Flask
+from flask_testing import TestCase
+from backend.test import test_utils
+from backend.app import db, app
+from backend.app import connection_manager as cm, table_sync
+from backend.app.models import SyncJob
+
+
+class TableSyncTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def create_sync_job(self, mode='append'):
+        source = test_utils.create_connection(label='source_conn', db_type='sqlite', host='//tmp/narratus_source.db')
+        connection = cm.create_connection(source)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));')
+        connection.execute('INSERT INTO "TABLE1" (id, name) VALUES (1,"raw1"), (2,"raw2"), (3,"raw3")')
+
+        target = test_utils.create_connection(label='target_conn', db_type='sqlite', host='//tmp/narratus_target.db')
+        connection = cm.create_connection(target)
+        connection.execute('DROP TABLE IF EXISTS "TABLE1"')
+        connection.execute('CREATE TABLE "TABLE1" (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id));')
+
+        sync_job = SyncJob(label='sync1', source_connection=source, target_connection=target, source_table='TABLE1'
+                           , mode=mode, watermark_column='id')
+        db.session.add(sync_job)
+        db.session.commit()
+        return sync_job
+
+    def get_target_rows(self, sync_job):
+        connection = cm.create_connection(sync_job.target_connection)
+        return connection.execute('SELECT id, name FROM "TABLE1" ORDER BY id').fetchall()
+
+    def test_sync_table_copies_rows_and_sets_high_water_mark(self):
+        sync_job = self.create_sync_job()
+
+        rows = table_sync.sync_table(sync_job)
+
+        assert rows == 3
+        assert sync_job.high_water_mark == '3'
+        assert len(self.get_target_rows(sync_job)) == 3
+
+    def test_sync_table_only_pulls_new_rows(self):
+        sync_job = self.create_sync_job()
+        table_sync.sync_table(sync_job)
+        connection = cm.create_connection(sync_job.source_connection)
+        connection.execute('INSERT INTO "TABLE1" (id, name) VALUES (4,"raw4")')
+
+        rows = table_sync.sync_table(sync_job)
+
+        assert rows == 1
+        assert len(self.get_target_rows(sync_job)) == 4
+
+    def test_sync_table_append_replaces_rows_left_by_failed_run(self):
+        sync_job = self.create_sync_job()
+        connection = cm.create_connection(sync_job.target_connection)
+        connection.execute('INSERT INTO "TABLE1" (id, name) VALUES (1,"raw1"), (2,"raw2")')
+
+        rows = table_sync.sync_table(sync_job)
+
+        assert rows == 3
+        assert self.get_target_rows(sync_job) == [(1, 'raw1'), (2, 'raw2'), (3, 'raw3')]
+
+    def test_sync_table_upsert_overwrites_existing_keys(self):
+        sync_job = self.create_sync_job(mode='upsert')
+        connection = cm.create_connection(sync_job.target_connection)
+        connection.execute('INSERT INTO "TABLE1" (id, name) VALUES (1,"stale")')
+
+        table_sync.sync_table(sync_job)
+
+        assert self.get_target_rows(sync_job)[0] == (1, 'raw1')
+
+    def test_run_sync_job_records_run(self):
+        sync_job = self.create_sync_job()
+
+        run = table_sync.run_sync_job(sync_job)
+
+        assert run.status == 'success'
+        assert run.rows == 3
+        assert run.duration_seconds is not None
+        assert sync_job.last_run_on
+
+    def test_run_sync_job_records_failure(self):
+        sync_job = self.create_sync_job()
+        sync_job.source_table = 'NOT_A_TABLE'
+
+        run = table_sync.run_sync_job(sync_job)
+
+        assert run.status == 'failed'
+        assert run.message
+
+    def test_sync_job_is_due_after_refresh_interval(self):
+        sync_job = self.create_sync_job()
+        sync_job.refresh_minutes = 60
+        sync_job.last_run_on = datetime.utcnow()
+
+        assert not table_sync.sync_job_is_due(sync_job)
+        assert table_sync.sync_job_is_due(sync_job, now=datetime.utcnow() + timedelta(minutes=61))
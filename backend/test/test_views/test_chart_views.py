@@ -41,12 +41,12 @@ class ChartViewTest(TestCase):
         db.session.remove()
         db.drop_all()
 
-    def get_to_get_all_charts(self, token_type='admin'):
+    def get_to_get_all_charts(self, token_type='admin', query_string=''):
         if token_type == 'writer':
             token = self.writer_token
         else:
             token = self.admin_token
-        response = self.client.get('/api/get_all_charts', content_type='application/json'
+        response = self.client.get('/api/get_all_charts{}'.format(query_string), content_type='application/json'
                                    , headers={'Authorization': 'Bearer {}'.format(token)})
         return response
 
@@ -102,6 +102,17 @@ class ChartViewTest(TestCase):
         assert response.status_code == 200
         assert chart_count == response_count
 
+    def test_get_all_charts_with_fields_and_expand(self):
+        chart = test_utils.create_chart(label='ug101')
+
+        response = self.get_to_get_all_charts(query_string='?fields=label,connection&expand=connection')
+        response_dict = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert set(response_dict['charts'][0].keys()) == {'chart_id', 'label', 'connection'}
+        assert response_dict['charts'][0]['connection']['connection_id'] == chart.connection_id
+        assert 'creator' not in response_dict['charts'][0]['connection']
+
     def test_get_all_charts_requires_admin_privileges(self):
         response = self.get_to_get_all_charts(token_type='writer')
 
@@ -259,3 +259,38 @@ class ConnectionViewTest(TestCase):
                                     , headers={'Authorization': 'Bearer {}'.format(token)})
 
         assert response.status_code == 400
+
+    def test_test_connections_with_valid_data(self):
+        self.create_db_with_test_data(connection_id=42)
+        test_utils.create_connection(label='other_conn', db_type='sqlite', host='/tmp', connection_id=43)
+
+        token = self.admin_token
+        data = dict(connection_ids=[42, 43], refresh=True)
+        response = self.client.post('/api/test_connections', data=json.dumps(data), content_type='application/json'
+                                    , headers={'Authorization': 'Bearer {}'.format(token)})
+        response_dict = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert [result['connection_id'] for result in response_dict['connections']] == [42, 43]
+        assert response_dict['healthy_count'] == 2
+        assert all('latency_seconds' in result for result in response_dict['connections'])
+
+    def test_test_connections_with_bad_connection_id(self):
+        self.create_db_with_test_data(connection_id=42)
+
+        token = self.admin_token
+        data = dict(connection_ids=[42, 99999])
+        response = self.client.post('/api/test_connections', data=json.dumps(data), content_type='application/json'
+                                    , headers={'Authorization': 'Bearer {}'.format(token)})
+
+        assert response.status_code == 400
+
+    def test_test_connections_as_viewer(self):
+        self.create_db_with_test_data(connection_id=42)
+
+        token = self.viewer_token
+        data = dict(connection_ids=[42])
+        response = self.client.post('/api/test_connections', data=json.dumps(data), content_type='application/json'
+                                    , headers={'Authorization': 'Bearer {}'.format(token)})
+
+        assert response.status_code == 401
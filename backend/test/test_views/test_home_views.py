@@ -0,0 +1,74 @@
+import json
+from flask import Flask
+from flask_testing import TestCase
+from backend.app.models import User
+from backend.test import test_utils
+from backend.app import db, app
+
+
+class HomeViewTest(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(test_utils.Config())
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        self.client = app.test_client()
+        db.create_all()
+
+        # log in as viewer
+        login_response = test_utils.create_user_and_login(username='viewer', password='Secret123', role='viewer'
+                                                          , client=self.client)
+        login_response_dict = json.loads(login_response.data)
+        self.viewer_token = login_response_dict['access_token']
+        self.viewer = User.query.filter(User.username == 'viewer').first()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def get_to_home(self, fields=None):
+        url = '/api/home?fields={}'.format(fields) if fields else '/api/home'
+        response = self.client.get(url, content_type='application/json'
+                                   , headers={'Authorization': 'Bearer {}'.format(self.viewer_token)})
+        return response
+
+    def create_shared_chart(self):
+        usergroup = test_utils.create_usergroup(label='shared')
+        chart = test_utils.create_chart(label='shared_chart')
+        chart.usergroups.append(usergroup)
+        chart.chart_connection.usergroups.append(usergroup)
+        self.viewer.usergroups.append(usergroup)
+        db.session.commit()
+        return chart
+
+    def test_home_returns_accessible_objects(self):
+        chart = self.create_shared_chart()
+        test_utils.create_chart(label='private_chart')
+
+        response = self.get_to_home()
+        response_dict = json.loads(response.data)
+
+        assert response.status_code == 200
+        assert [obj['chart_id'] for obj in response_dict['charts']] == [chart.id]
+        assert len(response_dict['connections']) == 1
+        assert response_dict['reports'] == []
+
+    def test_home_summaries_do_not_embed_creator(self):
+        self.create_shared_chart()
+
+        response = self.get_to_home()
+        response_dict = json.loads(response.data)
+
+        assert 'creator' not in response_dict['charts'][0]
+        assert 'password' not in response_dict['connections'][0]
+
+    def test_home_projects_requested_fields(self):
+        self.create_shared_chart()
+
+        response = self.get_to_home(fields='label')
+        response_dict = json.loads(response.data)
+
+        assert response_dict['charts'] == [{'chart_id': response_dict['charts'][0]['chart_id'], 'label': 'shared_chart'}]